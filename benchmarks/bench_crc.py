@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark the CRC of serial frames against the former implementation, for a
+receipt line and for a file transfer block.
+
+Run from the repository root: python -m benchmarks.bench_crc
+"""
+from timeit import timeit
+
+from ecrterm.crc import CRC16, TABLE_XMODEM16, crc_xmodem16
+from ecrterm.transmission.signals import ETX
+from ecrterm.transmission.transport_serial import SerialMessage
+
+FRAMES = {
+    'receipt line': bytes.fromhex('06d12b') + b'  Betrag                  EUR 12,34',
+    'file transfer': bytes.fromhex('0614ffffff') + bytes(range(256)) * 250,
+}
+
+
+def former_crc_xmodem16(data: bytes):
+    crc_table = TABLE_XMODEM16
+    crc = 0
+    for i in data:
+        hb = int(crc / 256.0)
+        lb = crc - (256 * hb)
+        crc = crc_table[lb ^ i] ^ hb
+    return crc
+
+
+def former_serial_message_crc(apdu: bytes) -> bytes:
+    # crc_l and crc_h each computed the CRC of apdu + ETX
+    return bytes([former_crc_xmodem16(apdu + bytes([ETX])) & 0xff, former_crc_xmodem16(apdu + bytes([ETX])) >> 8])
+
+
+def measure(fun, data: bytes) -> float:
+    rounds = max(10, 200000 // len(data))
+    return timeit(lambda: fun(data), number=rounds) * 1e6 / rounds
+
+
+def main():
+    print('microseconds per frame:')
+    for name, apdu in FRAMES.items():
+        assert former_crc_xmodem16(apdu) == crc_xmodem16(apdu)
+        former = measure(former_crc_xmodem16, apdu)
+        table = measure(lambda data: CRC16(data, poly=0xa001).value, apdu)
+        current = measure(crc_xmodem16, apdu)
+        former_message = measure(former_serial_message_crc, apdu)
+        message = measure(lambda data: SerialMessage(data).crc(), apdu)
+        print('  {} ({} bytes)'.format(name, len(apdu)))
+        print('    crc_xmodem16    former {:10.1f}  now {:8.1f}  speedup {:6.1f}x'.format(
+            former, current, former / current))
+        print('    SerialMessage   former {:10.1f}  now {:8.1f}  speedup {:6.1f}x'.format(
+            former_message, message, former_message / message))
+        print('    CRC16 with a table, for other polynomials {:8.1f}'.format(table))
+
+
+if __name__ == '__main__':
+    main()
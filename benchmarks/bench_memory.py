@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+Measure the memory retained by parsed packets, in bytes per packet.
+
+Run from the repository root: python -m benchmarks.bench_memory
+"""
+import gc
+import tracemalloc
+
+from ecrterm.conv import toBytes
+from ecrterm.packets.base_packets import Packet
+from ecrterm.tests.test_parsing import TestParsingMechanisms
+
+COUNT = 2000
+
+FRAMES = {
+    'Completion': '06 0F 11 19 00 29 52 00 12 33 49 09 78 06 05 27 03 14 01 FF',
+    'StatusInformation': TestParsingMechanisms.PACKET_LIST[1],
+    'StatusInformation with TLV': TestParsingMechanisms.PACKET_LIST[7],
+}
+
+
+def retained(frame: bytes) -> float:
+    Packet.parse(frame)  # Warm up class level caches
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    packets = [Packet.parse(frame) for _ in range(COUNT)]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del packets
+    return size / COUNT
+
+
+def main():
+    print('bytes retained per parsed packet:')
+    for label, packet in FRAMES.items():
+        print('  {:<28} {:8.0f}'.format(label, retained(bytes(toBytes(packet)))))
+
+
+if __name__ == '__main__':
+    main()
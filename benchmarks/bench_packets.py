@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark APDU.serialize on the packets of the test corpus, with the generic
+serializer and with the compiled per-class plans. Packet.parse has no plans,
+its time is shown for comparison.
+
+Run from the repository root: python -m benchmarks.bench_packets
+"""
+from timeit import repeat
+
+from ecrterm.conv import toBytes
+from ecrterm.packets import plans
+from ecrterm.packets.base_packets import Packet
+from ecrterm.tests.test_parsing import TestParsingMechanisms
+
+ROUNDS = 200
+REPEAT = 5
+
+FRAMES = [bytes(toBytes(packet)) for packet in TestParsingMechanisms.PACKET_LIST]
+
+
+def best(function, frames) -> float:
+    """Microseconds per frame of the fastest of REPEAT runs."""
+    return min(repeat(function, number=ROUNDS, repeat=REPEAT)) * 1e6 / ROUNDS / len(frames)
+
+
+def measure_parse(frames):
+    def parse():
+        for frame in frames:
+            Packet.parse(frame)
+
+    return best(parse, frames)
+
+
+def measure_serialize(frames):
+    packets = [Packet.parse(frame) for frame in frames]
+
+    def serialize():
+        for packet in packets:
+            packet._serialized = None  # Measure the serializer, not the cache
+            packet.serialize()
+
+    return best(serialize, frames)
+
+
+def main():
+    corpora = {
+        'all packets': FRAMES,
+        'packets without TLV': [frame for frame in FRAMES if 'tlv' not in Packet.parse(frame).as_dict()],
+    }
+    for label, frames in corpora.items():
+        print('{} ({} frames), microseconds per frame:'.format(label, len(frames)))
+        print('  parse              {:8.1f}'.format(measure_parse(frames)))
+        results = {}
+        for enabled in (False, True):
+            plans.ENABLED = enabled
+            results[enabled] = measure_serialize(frames)
+            print('  serialize {:>8} {:8.1f}'.format('compiled' if enabled else 'generic', results[enabled]))
+        print('  speedup            {:7.1f}x'.format(results[False] / results[True]))
+
+
+if __name__ == '__main__':
+    main()
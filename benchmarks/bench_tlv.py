@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark parsing a large TLV container and reading a single tag from it,
+as done for status information with device information and receipt data,
+and selecting the tag with a path from the encoded container instead.
+
+Run from the repository root: python -m benchmarks.bench_tlv
+"""
+from timeit import timeit
+
+from ecrterm.packets.context import enter_context
+from ecrterm.packets.fields import TLVField
+from ecrterm.packets.tlv import TLV
+from ecrterm.packets.tlv_path import TLVPath
+
+ROUNDS = 2000
+
+
+def sample() -> bytes:
+    lines = TLV(tag_=0x24, value_=[(0x07, 'Receipt line {:02d}'.format(i).encode()) for i in range(30)])
+    device = TLV(tag_=0xe4, value_=[(0x1f60 + i, bytes(range(i + 1))) for i in range(12)])
+    container = TLV(value_=[device, lines] + [TLV(tag_=0x1f70 + i, value_=bytes(4)) for i in range(16)])
+    return container.serialize()
+
+
+def measure(data: bytes) -> dict:
+    field = TLVField()
+
+    def parse():
+        field.parse(data)
+
+    def read_tag():
+        field.parse(data)[0].xe4.x1f6b
+
+    def serialize():
+        field.parse(data)[0].serialize()
+
+    per_round = 1e6 / ROUNDS
+    return {name: timeit(fun, number=ROUNDS) * per_round
+            for name, fun in (('parse', parse), ('parse + read tag', read_tag), ('parse + serialize', serialize))}
+
+
+def main():
+    data = sample()
+    print('TLV container with {} bytes, microseconds per round:'.format(len(data)))
+    eager = measure(data)
+    with enter_context(lazy_tlv=True):
+        lazy = measure(data)
+    for name in eager:
+        print('  {:<18} eager {:8.1f}  lazy {:8.1f}  speedup {:5.1f}x'.format(
+            name, eager[name], lazy[name], eager[name] / lazy[name]))
+    path = TLVPath('E4/1F6B')
+    selected = timeit(lambda: path.select(data, empty_tag=True), number=ROUNDS) * 1e6 / ROUNDS
+    print('  {:<18} {:8.1f}'.format('select from bytes', selected))
+
+
+if __name__ == '__main__':
+    main()
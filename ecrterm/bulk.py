@@ -0,0 +1,158 @@
+"""
+Bulk parsing of captured ZVT traffic.
+
+parse_frames() takes raw frames and returns one ParseResult per frame, in
+input order. A frame that cannot be parsed is reported in the result's error
+instead of stopping the run. With processes set the frames are parsed in a
+process pool.
+
+Frames can be given as
+ - an iterable of frames, each bytes or a hex string like '06 0F 00',
+ - a text file with one hex frame per line,
+ - a binary file with the raw byte stream as captured, which needs framing.
+
+Serial frames (DLE STX ... DLE ETX CRC) are unwrapped, ACK and NAK bytes are
+skipped. A serial frame with a wrong CRC is reported as error, with its APDU
+as the result's frame.
+"""
+import io
+from functools import partial
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from ecrterm.conv import toBytes
+from ecrterm.packets.base_packets import Packet
+from ecrterm.packets.tlv import TLV
+from ecrterm.transmission.framing import Frame, FramingError, SerialFrameDecoder, TCPFrameDecoder
+from ecrterm.transmission.signals import ACK, DLE, NAK, STX
+
+SERIAL = 'serial'
+TCP = 'tcp'
+
+#: Bytes read from binary files at once
+READ_SIZE = 65536
+
+
+class ParseResult(NamedTuple):
+    index: int
+    frame: bytes
+    packet: Optional[Union[Packet, Dict[str, Any]]]
+    error: Optional[str]
+
+
+def _decode(decoder, chunks: Iterable[bytes]) -> Iterator[Union[bytes, FramingError]]:
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            if isinstance(event, Frame):
+                yield event.apdu if event.crc_ok else FramingError('CRC mismatch', event.apdu)
+            elif isinstance(event, FramingError):
+                yield event
+    if decoder.in_frame:
+        yield FramingError('Incomplete frame at the end of the data')
+
+
+def iter_frames(source: Union[Iterable[Union[bytes, str]], io.IOBase], framing: Optional[str] = None) \
+        -> Iterator[Union[bytes, FramingError]]:
+    """
+    Yield the APDUs in source, and FramingError events for data that could not
+    be unframed. For binary files framing must be SERIAL or TCP.
+    """
+    if isinstance(source, io.IOBase) and not isinstance(source, io.TextIOBase):
+        if framing not in (SERIAL, TCP):
+            raise ValueError("Need framing={!r} or framing={!r} for binary files".format(SERIAL, TCP))
+        decoder = SerialFrameDecoder() if framing == SERIAL else TCPFrameDecoder()
+        yield from _decode(decoder, iter(lambda: source.read(READ_SIZE), b''))
+        return
+
+    for frame in source:
+        if isinstance(frame, str):
+            frame = frame.strip()
+            if not frame:
+                continue
+            frame = toBytes(frame)
+        frame = bytes(frame)
+        if frame[:2] == bytes([DLE, STX]):
+            yield from _decode(SerialFrameDecoder(), [frame])
+        elif frame not in (bytes([ACK]), bytes([NAK])):
+            yield frame
+
+
+def _flatten(prefix: str, value: Any, record: Dict[str, Any]):
+    if isinstance(value, TLV):
+        if value.constructed_:
+            for item in value.value_:
+                _flatten('{}.{}'.format(prefix, item.name_), item if item.constructed_ else item.value_, record)
+            return
+        value = value.value_
+    if prefix in record:
+        previous = record[prefix]
+        record[prefix] = (previous if isinstance(previous, list) else [previous]) + [value]
+    else:
+        record[prefix] = value
+
+
+def as_record(packet: Packet) -> Dict[str, Any]:
+    """
+    Return the packet as a flat dictionary: the packet type and its fields and
+    bitmaps, with TLV containers flattened into dotted names like
+    'tlv.receipt-numbers.receipt'. Repeated TLV tags give a list of values.
+    """
+    record = {'type': packet.__class__.__name__}
+    for name, value in packet.items():
+        if value is not None:
+            _flatten(name, value, record)
+    return record
+
+
+def _parse_one(index: int, frame: Union[bytes, FramingError], records: bool,
+               context: Optional[Dict[str, Any]]) -> ParseResult:
+    if isinstance(frame, FramingError):
+        return ParseResult(index, frame.data, None, 'FramingError: {}'.format(frame.message))
+    try:
+        packet = Packet.parse(frame, context=context)
+        if records:
+            packet = as_record(packet)
+    except Exception as e:
+        return ParseResult(index, frame, None, '{}: {}'.format(e.__class__.__name__, e))
+    return ParseResult(index, frame, packet, None)
+
+
+def _parse_chunk(items: List[Tuple[int, Union[bytes, FramingError]]], records: bool,
+                 context: Optional[Dict[str, Any]]) -> List[ParseResult]:
+    return [_parse_one(index, frame, records, context) for index, frame in items]
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_frames(source: Union[Iterable[Union[bytes, str]], io.IOBase], framing: Optional[str] = None,
+                 records: bool = False, processes: Optional[int] = None, chunksize: int = 256,
+                 context: Optional[Dict[str, Any]] = None) -> Iterator[ParseResult]:
+    """
+    Parse all frames in source, see iter_frames(), and yield a ParseResult for
+    each, in input order. With records=True the results hold as_record()
+    dictionaries instead of packets.
+
+    With processes > 1, chunks of chunksize frames are parsed in a pool of that
+    many processes. context is passed to each parse, e.g.
+    context={'vendor_quirks': {VendorQuirks.FEIG_CVEND}}, because the context of
+    the calling thread is not visible in the pool.
+    """
+    items = enumerate(iter_frames(source, framing))
+
+    if not processes or processes < 2:
+        for index, frame in items:
+            yield _parse_one(index, frame, records, context)
+        return
+
+    with Pool(processes) as pool:
+        for results in pool.imap(partial(_parse_chunk, records=records, context=context), _chunks(items, chunksize)):
+            yield from results
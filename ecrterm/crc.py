@@ -2,8 +2,22 @@
 """
     CRC Funktionen
 
+    The ZVT serial framing uses the reflected CRC-16 with polynomial 0x8408
+    and initial value 0 (also known as CRC-16/KERMIT). CRC16 computes it
+    incrementally with update() and digest(). For this polynomial the work
+    is done by binascii.crc_hqx(), the non-reflected variant implemented in C,
+    on bit reversed data. Other polynomials use a table, built once per
+    polynomial.
 """
-from six.moves import range
+import binascii
+from typing import Dict, List, Tuple, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+POLY_XMODEM16 = 0x8408
+
+#: Every byte value with its bits in reverse order
+REVERSED_BITS = bytes(int('{:08b}'.format(b)[::-1], 2) for b in range(256))
 
 
 def build_codetable(poly):
@@ -14,27 +28,84 @@ def build_codetable(poly):
     crc_table = []
     for i in range(256):
         crc = i
-        for j in range(1, 9):
-            if (crc & 1) == 1:
-                crc = int(crc / 2.0) ^ poly
+        for j in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ poly
             else:
-                crc = int(crc / 2.0)
-        crc_table += [crc]
+                crc >>= 1
+        crc_table.append(crc)
     return crc_table
 
 
+_codetables: Dict[int, Tuple[int, ...]] = {}
+
+
+def codetable(poly: int) -> Tuple[int, ...]:
+    """Return the codetable for a polynome, built on first use."""
+    table = _codetables.get(poly)
+    if table is None:
+        table = _codetables[poly] = tuple(build_codetable(poly))
+    return table
+
+
 def crc_checksum(something, poly=33800):
     """
-        makes a crc checksum with any given polynome, building the table
-        every time.
+        makes a crc checksum with any given polynome, from a string or
+        bytes.
     """
-    crc_table = build_codetable(poly)
-    crc = 0
-    for i in something:
-        hb = int(crc / 256.0)
-        lb = crc - (256 * hb)
-        crc = crc_table[lb ^ ord(i)] ^ hb
-    return crc
+    if isinstance(something, str):
+        something = [ord(c) for c in something]
+    return CRC16(something, poly).value
+
+
+class CRC16:
+    """
+    Incremental reflected CRC-16 with initial value 0.
+
+    crc = CRC16(apdu)
+    crc.update(bytes([ETX]))
+    crc.digest()  # CRC-L CRC-H, as sent on the serial line
+    """
+    __slots__ = ('poly', '_table', '_crc')
+
+    def __init__(self, data: Union[BytesLike, List[int]] = b'', poly: int = POLY_XMODEM16):
+        self.poly = poly
+        # For POLY_XMODEM16 the state is kept non-reflected, for binascii.crc_hqx()
+        self._table = None if poly == POLY_XMODEM16 else codetable(poly)
+        self._crc = 0
+        if data:
+            self.update(data)
+
+    def update(self, data: Union[BytesLike, List[int]]) -> 'CRC16':
+        """Add data to the checksum, return self."""
+        table = self._table
+        if table is None:
+            if not isinstance(data, (bytes, bytearray)):
+                data = bytes(data)
+            self._crc = binascii.crc_hqx(data.translate(REVERSED_BITS), self._crc)
+        else:
+            crc = self._crc
+            for b in data:
+                crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+            self._crc = crc
+        return self
+
+    @property
+    def value(self) -> int:
+        crc = self._crc
+        if self._table is None:
+            return REVERSED_BITS[crc & 0xff] << 8 | REVERSED_BITS[crc >> 8]
+        return crc
+
+    def digest(self) -> bytes:
+        """Return the checksum, low byte first."""
+        value = self.value
+        return bytes([value & 0xff, value >> 8])
+
+    def copy(self) -> 'CRC16':
+        retval = CRC16(poly=self.poly)
+        retval._crc = self._crc
+        return retval
 
 
 #: poly = 0x8408
@@ -72,13 +143,6 @@ TABLE_XMODEM16 = [
 
 def crc_xmodem16(data: bytes):
     """
-        short for hardcoded 0x8408 (XMODEM-16) crc checksum from a predefined
-        codetable.
+        short for hardcoded 0x8408 (XMODEM-16) crc checksum.
     """
-    crc_table = TABLE_XMODEM16
-    crc = 0
-    for i in data:
-        hb = int(crc / 256.0)
-        lb = crc - (256 * hb)
-        crc = crc_table[lb ^ i] ^ hb
-    return crc
+    return CRC16(data).value
@@ -8,7 +8,6 @@ Maybe create a small console program which allows us to:
 """
 import logging
 import string
-from time import sleep
 from typing import Optional
 
 from ecrterm.common import TERMINAL_STATUS_CODES
@@ -16,14 +15,16 @@ from ecrterm.conv import toBytes
 from ecrterm.exceptions import (
     TransportConnectionFailed, TransportLayerException)
 from ecrterm.packets.base_packets import (
-    Authorisation, CloseCardSession, Completion, DisplayText, EndOfDay, Initialisation, Packet,
-    PrintLine, ReadCard, Registration, ReservationBookTotal, ReservationPartialReversal,
+    Authorisation, ChangeBaudrate, CloseCardSession, Completion, DisplayText, EndOfDay, Initialisation, Packet,
+    PacketReceived, PrintLine, ReadCard, Registration, ReservationBookTotal, ReservationPartialReversal,
     ReservationRequest, ResetTerminal, SetTerminalID, StatusEnquiry, StatusInformation, WriteFiles,
     OpenReservationsEnquiry)
-from ecrterm.packets.types import (ConfigByte, CurrencyCode, ServiceByte)
+from ecrterm.packets.types import (BaudRate, ConfigByte, CurrencyCode, ServiceByte)
 from ecrterm.transmission._transmission import Transmission
-from ecrterm.transmission.signals import ACK, DLE, ETX, NAK, STX, TRANSMIT_OK
-from ecrterm.transmission.transport_serial import SerialTransport
+from ecrterm.transmission.framing import Frame, FramingError, SerialFrameDecoder
+from ecrterm.transmission.pacing import AdaptivePacing, Pacing
+from ecrterm.transmission.signals import ACK, DLE, NAK, TRANSMIT_OK
+from ecrterm.transmission.transport_serial import DEFAULT_BAUDRATE, SerialTransport
 from ecrterm.transmission.transport_socket import SocketTransport
 from ecrterm.utils import detect_pt_serial, is_stringlike
 
@@ -31,43 +32,21 @@ logger = logging.getLogger('ecrterm.ecr')
 
 
 def dismantle_serial_packet(data):
-    apdu = []
-    crc = None
-    i = 2
-    header = data[:i]
-    # header = bs2hl(header)
-    # test if there was a transmission:
-    if header == []:
+    """Return the CRC and the APDU of the serial frame in data, bytes or a list of bytes."""
+    decoder = SerialFrameDecoder()
+    events = decoder.feed(bytes(data))
+    if events:
+        event = events[0]
+        if isinstance(event, Frame):
+            return event.crc, event.apdu
+        if isinstance(event, FramingError):
+            raise TransportLayerException(event.message)
         raise TransportLayerException('No Header')
-    # test our header to be valid
-    if header != [DLE, STX]:
-        raise TransportLayerException('Header Error: %s' % header)
-    # read until DLE, ETX is reached.
-    dle = False
-    while not crc and i < len(data):
-        b = data[i]  # read a byte.
-        if b == ETX and dle:
-            # dle was set, and this is ETX, so we are at the end.
-            # we read the CRC now.
-            crc = [data[i + 1], data[i + 2]]
-            # and break
-            continue
-        elif b == DLE:
-            if not dle:
-                # this is a dle
-                dle = True
-                continue
-            else:
-                # this is the second dle. we take it.
-                dle = False
-        elif dle:
-            # dle was set, but we got no etx here.
-            # this seems to be an error.
-            raise Exception('DLE without sense detected.')
-        # we add this byte to our apdu.
-        apdu += [b]
-        i += 1
-    return crc, apdu
+    if decoder.awaiting_crc:
+        raise TransportLayerException('Frame without CRC')
+    if decoder.in_frame:
+        raise TransportLayerException('Frame without DLE ETX')
+    raise TransportLayerException('No Header')
 
 
 def parse_represented_data(data):
@@ -103,7 +82,7 @@ class ECR(object):
     _state_connected = None
     _status = None
 
-    def __init__(self, device='/dev/ttyUSB0', password='123456'):
+    def __init__(self, device='/dev/ttyUSB0', password='123456', pacing: Optional[Pacing] = None):
         """
         Initializes an ECR object and connects to the serial device
         given. Fails if Serial Device is not found.
@@ -114,6 +93,16 @@ class ECR(object):
 
         Pass `socket://` prefixed IP address and port for TCP/IP
         transport: `socket://192.168.1.163:20007`
+
+        A serial device can carry the baud rate of the PT:
+        `/dev/ttyUSB0?baudrate=115200`, see also change_baudrate().
+
+        `pacing` spaces out the commands, see
+        ecrterm.transmission.pacing. By default transports with
+        `insert_delays` get an AdaptivePacing, others none. It starts
+        with the delays of former versions and shortens the gap between
+        commands while the PT accepts them. Pass a FixedPacing to keep
+        the fixed delays.
         """
         if device.startswith('/') or device.startswith('COM'):
             self.transport = SerialTransport(device)
@@ -128,6 +117,9 @@ class ECR(object):
         self._state_registered = False
         self._state_connected = False
         self.password = password
+        if pacing is None:
+            pacing = AdaptivePacing() if self.transport.insert_delays else Pacing()
+        self.pacing = pacing
 
         if self.transport.connect():
             self.transmitter = Transmission(self.transport)
@@ -268,11 +260,9 @@ class ECR(object):
         - restarts pt: @see self.restart()
         """
         self.transport.reset()
-        if self.transport.insert_delays:
-            sleep(1)
+        self.pacing.after_reset()
         ret = self.restart()
-        if self.transport.insert_delays:
-            sleep(1)
+        self.pacing.after_reset()
         return ret
 
     def show_text(self, lines=None, duration=5, beeps=0):
@@ -330,11 +320,17 @@ class ECR(object):
         since the whole ECR Object uses this function to transmit.
 
         use `last` property to access last packet transmitted.
+
+        NAKs, missing ACKs and timeouts tell the pacing that the PT
+        needs more time between commands.
         """
-        if self.transport.insert_delays:
-            # we actually make a small sleep, allowing better flow.
-            sleep(0.2)
-        transmission = self.transmitter.transmit(packet)
+        self.pacing.before_command()
+        try:
+            transmission = self.transmitter.transmit(packet)
+        except TransportLayerException:
+            self.pacing.after_command(False)
+            raise
+        self.pacing.after_command(True)
         return transmission
 
     def request_reservation(self, amount_cent=50, timeout=10, tlv=[], listener=None):
@@ -422,6 +418,46 @@ class ECR(object):
 
         return self._send_packet(packet, listener)
 
+    def change_baudrate(self, baudrate: int, verify=True):
+        """
+        Negotiates baudrate with the PT and switches the serial port to it.
+
+        If the PT rejects the rate or doesn't answer, the port keeps its
+        rate. With verify, a status enquiry at the new rate checks that the PT
+        switched too, otherwise the port falls back to 9600.
+        @returns: True, if the port runs at baudrate afterwards.
+        throws ValueError for rates that ZVT doesn't know.
+        """
+        if not isinstance(self.transport, SerialTransport):
+            raise TransportLayerException('Only serial transports have a baud rate')
+        packet = ChangeBaudrate(baudrate=BaudRate.from_rate(baudrate))
+        if baudrate == self.transport.baudrate:
+            return True
+        try:
+            self.transmit(packet)
+        except TransportLayerException:
+            logger.warning('No answer to changing the baud rate to %s', baudrate)
+            return False
+        if not any(inc and isinstance(response, PacketReceived) for inc, response in self.transmitter.last_history):
+            logger.warning('PT rejected the baud rate %s', baudrate)
+            return False
+
+        self.transport.set_baudrate(baudrate)
+        if verify:
+            # The PT must answer the status enquiry with a Completion at the new rate
+            try:
+                self.transmitter.last_history = []
+                self.status()
+            except TransportLayerException:
+                pass
+            verified = any(inc and isinstance(response, Completion)
+                           for inc, response in self.transmitter.last_history)
+            if not verified:
+                logger.warning('No answer at baud rate %s, falling back to %s', baudrate, DEFAULT_BAUDRATE)
+                self.transport.set_baudrate(DEFAULT_BAUDRATE)
+                return False
+        return True
+
     def _send_packet(self, packet, listener=None):
         """
         Generic method to send packets and check for completion status.
@@ -457,8 +493,7 @@ class ECR(object):
         status = self.status()
         while status:
             print(TERMINAL_STATUS_CODES.get(status, 'Unknown Status'))
-            if self.transport.insert_delays:
-                sleep(2)
+            self.pacing.between_polls()
             status = self.status()
 
     def listen(self, timeout=15):
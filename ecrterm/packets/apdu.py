@@ -1,10 +1,14 @@
 """Classes and Functions which deal with the APDU Layer."""
 
-from typing import TypeVar, Type, List, Union, Tuple, Any
-from collections import OrderedDict
+from typing import TypeVar, Type, List, Union, Tuple, Any, Optional, Dict, Mapping
+from collections import Counter, OrderedDict
+from types import MappingProxyType
 
+from . import plans
+from .context import using_context
 from .bitmaps import BITMAPS
 from .fields import Field, ParseError
+from .tlv import TLV
 
 # Currencies
 CC_EUR = '0978'
@@ -19,12 +23,31 @@ CMD_RESP_ERROR = 0x84  # work had errors
 
 
 class FieldContainer(type):
+    # Subclass dispatch tables used by APDU.parse, one per class parse() is called on,
+    # each mapping the first two bytes of a packet to the candidate subclasses.
+    # Any new class may change the resolution, so all tables are dropped when one is created.
+    _dispatch_tables = {}
+
     @classmethod
     def __prepare__(mcs, name, bases):
         return OrderedDict()
 
     def __new__(cls, name, bases, classdict):
+        # The packets of this library keep their state in slots. Subclasses defined
+        # elsewhere get a __dict__, as usual, unless they declare __slots__ themselves.
+        module = classdict.get('__module__', '')
+        if module == __package__ or module.startswith(__package__ + '.'):
+            classdict.setdefault('__slots__', ())
         retval = super().__new__(cls, name, bases, classdict)
+        FieldContainer._dispatch_tables.clear()
+        retval._STATE_SLOTS = tuple(
+            slot for clazz in reversed(retval.__mro__) for slot in clazz.__dict__.get('__slots__', ())
+            if slot not in ('_values', '_bitmaps', '_serialized', '__dict__', '__weakref__')
+        )
+        # Packets without any values serialize to a constant, e.g. 80 00 00
+        control = retval._control_pattern()
+        retval._EMPTY_SERIALIZATION = \
+            bytes(control) + b'\x00' if control is not None and Ellipsis not in control else None
         retval.FIELDS = OrderedDict()
         for supercls in reversed(bases):
             if hasattr(supercls, 'FIELDS'):
@@ -40,13 +63,54 @@ class FieldContainer(type):
                 if not v.ignore_parse_error:
                     have_optional = True
 
+        # Shared, read-only bitmap index: key -> (field, name, description) and name -> key
+        known_bitmaps = dict(BITMAPS)
+        known_bitmaps.update(getattr(retval, 'OVERRIDE_BITMAPS', {}))
+        retval._KNOWN_BITMAPS = MappingProxyType(known_bitmaps)
+        retval._BITMAP_KEYS = MappingProxyType({name: key for key, (field, name, description) in known_bitmaps.items()})
+        allowed_bitmaps = getattr(retval, 'ALLOWED_BITMAPS', None)
+        retval._ALLOWED_BITMAP_NAMES = frozenset(allowed_bitmaps) if allowed_bitmaps is not None else None
+
+        retval._SERIALIZE_PLAN = plans.compile_serializer(name, retval.FIELDS, known_bitmaps)
+
         return retval
 
 
 APDUType = TypeVar('APDUType', bound='APDU')
 
 
+class ParseHints:
+    """
+    What a request tells about the layout of its responses.
+
+    `layouts` maps response classes to {field name: present} for optional fields
+    whose presence the request determines, e.g. the software version in the
+    Completion to a StatusEnquiry. APDU.parse() uses this to parse in a single
+    pass, and falls back to trying combinations of optional fields if the data
+    doesn't match. `fallbacks` counts those fallbacks per class name.
+
+    Like the backtracking, a layout can only skip optional fields with
+    ignore_parse_error, other fields are parsed whatever their entry says.
+    """
+    fallbacks = Counter()
+
+    def __init__(self, service_byte: Optional[int] = None, layouts: Optional[Dict[type, Dict[str, bool]]] = None):
+        self.service_byte = service_byte
+        self.layouts = layouts or {}
+
+    def layout(self, clazz: type) -> Dict[str, bool]:
+        for supercls in clazz.__mro__:
+            if supercls in self.layouts:
+                return self.layouts[supercls]
+        return {}
+
+    def __repr__(self):
+        return "{}(service_byte={!r}, layouts={!r})".format(self.__class__.__name__, self.service_byte, self.layouts)
+
+
 class APDU(metaclass=FieldContainer):
+    __slots__ = ('_values', '_bitmaps', '_serialized', 'control_field')
+
     AUTOMATIC_SUBCLASS = True
 
     REQUIRED_BITMAPS = []
@@ -55,16 +119,37 @@ class APDU(metaclass=FieldContainer):
 
     def __init__(self, *args, **kwargs):
         self._values = {}
-        self._bitmaps = OrderedDict()
-
-        self._KNOWN_BITMAPS = dict(BITMAPS)
-        self._KNOWN_BITMAPS.update(self.OVERRIDE_BITMAPS)
+        self._bitmaps = {}
+        self._serialized = None
 
         for (name, field), arg in zip(self.FIELDS.items(), args):
             setattr(self, name, arg)
         for name, arg in kwargs.items():
             setattr(self, name, arg)
 
+    def __getstate__(self):
+        # Values by name: the Field objects that key _values are class attributes and must not be copied
+        return {
+            'values': self.items(),
+            'slots': {name: getattr(self, name) for name in self._STATE_SLOTS if hasattr(self, name)},
+            'dict': getattr(self, '__dict__', None),
+        }
+
+    def __setstate__(self, state):
+        self._values = {}
+        self._bitmaps = {}
+        self._serialized = None
+        for name, value in state['values']:
+            setattr(self, name, value)
+        for name, value in state['slots'].items():
+            object.__setattr__(self, name, value)
+        if state['dict']:
+            self.__dict__.update(state['dict'])
+
+    def parse_hints(self) -> Optional[ParseHints]:
+        """Return hints for parsing the responses to this packet, if any."""
+        return None
+
     def as_dict(self):
         return OrderedDict(self.items())
 
@@ -91,14 +176,21 @@ class APDU(metaclass=FieldContainer):
             )
         )
 
-    def __getattr__(self, item):
+    def _bitmap_key(self, item: str) -> Optional[int]:
+        """Return the key of the bitmap called item and remember it for this packet, or None."""
         bmp = self._bitmaps.get(item, None)
 
         if bmp is None:
-            for key, (field, name, description) in self._KNOWN_BITMAPS.items():
-                if item == name:
-                    self._bitmaps[name] = key
-                    bmp = key
+            bmp = self._BITMAP_KEYS.get(item, None)
+            if bmp is not None:
+                self._bitmaps[item] = bmp
+                if self._serialized is not None:
+                    self._serialized = None
+
+        return bmp
+
+    def __getattr__(self, item):
+        bmp = self._bitmap_key(item) if not item.startswith('_') else None
 
         if bmp is None:
             raise AttributeError("{!r} object has no attribute {!r}".format(self.__class__.__name__, item))
@@ -125,16 +217,10 @@ class APDU(metaclass=FieldContainer):
             object.__setattr__(self, item, value)
             return
 
-        bmp = self._bitmaps.get(item, None)
-
-        if bmp is None:
-            for key, (field, name, description) in self._KNOWN_BITMAPS.items():
-                if item == name:
-                    self._bitmaps[name] = key
-                    bmp = key
+        bmp = self._bitmap_key(item)
 
         if bmp is not None:
-            if self.ALLOWED_BITMAPS is not None and self._KNOWN_BITMAPS[bmp][1] not in self.ALLOWED_BITMAPS:
+            if self._ALLOWED_BITMAP_NAMES is not None and self._KNOWN_BITMAPS[bmp][1] not in self._ALLOWED_BITMAP_NAMES:
                 raise AttributeError("Bitmap {:02X} not allowed on {}".format(bmp, self))
             self._KNOWN_BITMAPS[bmp][0].__set__(self, value)
         else:
@@ -158,37 +244,140 @@ class APDU(metaclass=FieldContainer):
     def can_parse(cls, data: Union[bytes, List[int]]) -> bool:
         return True  # pragma: no cover
 
+    @classmethod
+    def _control_pattern(cls) -> Optional[Tuple[Any, Any]]:
+        """
+        The first two bytes that can_parse() accepts, with Ellipsis as a wildcard.
+        None means that the class never accepts a packet.
+        """
+        return Ellipsis, Ellipsis
+
+    @classmethod
+    def _has_custom_can_parse(cls) -> bool:
+        owners = [
+            next(clazz for clazz in cls.__mro__ if attr in clazz.__dict__)
+            for attr in ('can_parse', '_control_pattern')
+        ]
+        return owners[0] is not owners[1]
+
+    @classmethod
+    def _dispatch_candidates(cls, key: bytes) -> Tuple[Tuple[Type['APDU'], bool], ...]:
+        """
+        Return the subclasses that may parse a packet starting with `key`, in
+        _iterate_subclasses() order, as (class, needs_can_parse_call) tuples.
+        The list ends with the first class that is known to match.
+        """
+        table = FieldContainer._dispatch_tables.setdefault(cls, {})
+        candidates = table.get(key, None)
+        if candidates is None:
+            candidates = []
+            for clazz in cls._iterate_subclasses():
+                if clazz is cls:
+                    continue
+                if clazz._has_custom_can_parse():
+                    candidates.append((clazz, True))
+                    continue
+                pattern = clazz._control_pattern()
+                if pattern is not None and all(p is Ellipsis or p == k for (p, k) in zip(pattern, key)):
+                    candidates.append((clazz, False))
+                    break
+            candidates = table[key] = tuple(candidates)
+        return candidates
+
+    @classmethod
+    def _find_subclass(cls, data: bytes) -> Optional[Type['APDU']]:
+        if len(data) < 2:
+            for clazz in cls._iterate_subclasses():
+                if clazz.can_parse(data) and clazz is not cls:
+                    return clazz
+            return None
+
+        for clazz, check in cls._dispatch_candidates(data[:2]):
+            if not check or clazz.can_parse(data):
+                return clazz
+        return None
+
     def parser_hook(self, data: Union[bytes, List[int]]) -> Union[bytes, List[int]]:
         return data
 
     @classmethod
-    def parse(cls: Type[APDUType], data: Union[bytes, List[int]]) -> APDUType:
-        data = bytes(data)
-        hex_data_str = data.hex()
+    def parse(cls: Type[APDUType], data: Union[bytes, List[int]], hints: Optional['ParseHints'] = None,
+              context: Optional[Mapping[str, Any]] = None) -> APDUType:
+        """
+        Parse data into an instance of the matching subclass. context, e.g. a
+        context.snapshot() or a dictionary like {'character_set': CharacterSet.UTF8},
+        is entered for parsing.
+        """
+        if context:
+            with using_context(context):
+                return cls.parse(data, hints)
+        data = raw_data = bytes(data)
         # Find more appropriate subclass and use that
         if cls.AUTOMATIC_SUBCLASS:
-            for clazz in cls._iterate_subclasses():
-                if clazz.can_parse(data) and clazz is not cls:
-                    return clazz.parse(data)
+            clazz = cls._find_subclass(data)
+            if clazz is not None:
+                return clazz.parse(data, hints)
 
         retval = cls()
+        view = memoryview(data)
+        pos = 0
 
         if len(data) >= 2:
-            retval.control_field = bytearray(data[:2])
-            data = data[2:]
+            retval.control_field = bytearray(view[:2])
+            pos = 2
 
-        length, data = data[0], data[1:]
+        length = data[pos]
+        pos += 1
         if length == 0xff:
-            length, data = data[0] + (data[1] << 8), data[2:]
+            length = data[pos] + (data[pos + 1] << 8)
+            pos += 2
+
+        data = view[pos:(pos + length)]
+
+        if type(retval).parser_hook is not APDU.parser_hook:
+            data = memoryview(bytes(retval.parser_hook(bytes(data))))
 
-        data = data[:length]
+        items = None
+        layout = hints.layout(cls) if hints is not None else None
+        if layout:
+            # The request told us which optional fields to expect, try a single pass with that
+            items = retval._parse_with_layout(data, layout)
+            if items is None:
+                ParseHints.fallbacks[cls.__name__] += 1
 
-        data = retval.parser_hook(data)
+        if items is None:
+            items = retval._parse_with_backtracking(data, raw_data)
+
+        for k, v in items:
+            setattr(retval, k, v)
+
+        # FIXME Mandatory fields.
+        return retval
+
+    def _parse_with_layout(self, data: memoryview, layout: Dict[str, bool]) -> Optional[List[Tuple[str, Any]]]:
+        """
+        Parse with the fields that layout marks as absent skipped.
+        Return None if the data doesn't match the layout.
+        """
+        blacklist = [field for name, field in self.FIELDS.items()
+                     if field.ignore_parse_error and layout.get(name, None) is False]
+        try:
+            items = self._parse_inner(data, blacklist)
+        except ParseError:
+            return None
+        if isinstance(items, Field):
+            return None
+        if self._ALLOWED_BITMAP_NAMES is not None and any(
+                name not in self.FIELDS and name not in self._ALLOWED_BITMAP_NAMES for (name, value) in items):
+            return None
+        return items
+
+    def _parse_with_backtracking(self, data: memoryview, raw_data: bytes) -> List[Tuple[str, Any]]:
         blacklist = []
 
         while True:
             try:
-                items = retval._parse_inner(data, blacklist)
+                items = self._parse_inner(data, blacklist)
 
                 if isinstance(items, Field):
                     # The parser has indicated the field it thinks is the problem
@@ -197,27 +386,21 @@ class APDU(metaclass=FieldContainer):
                     continue
 
                 # Parsing seems to have completed without incident
-                for k, v in items:
-                    setattr(retval, k, v)
-
-                break
+                return items
 
             except ParseError as e:
                 blacklist_candidates = [
-                    f for f in retval.FIELDS.values()
+                    f for f in self.FIELDS.values()
                     if not f.required and f.ignore_parse_error and f not in blacklist
                 ]
                 if not blacklist_candidates:
                     # No more we can do, probably really a parse error
-                    raise ParseError(str(e) + " in data: " + hex_data_str)
+                    raise ParseError(str(e) + " in data: " + raw_data.hex())
                 else:
                     blacklist.append(blacklist_candidates[0])
                     continue
 
-        # FIXME Mandatory fields.
-        return retval
-
-    def _parse_inner(self, data: bytes, blacklist: List[Field]) -> Union[List[Tuple[str, Any]], Field]:
+    def _parse_inner(self, data: memoryview, blacklist: List[Field]) -> Union[List[Tuple[str, Any]], Field]:
         # ~~~~ Strategy to parse the SUPER CURSED Completion packet ~~~~
         # A) When a Field parser marked required=False, ignore_parse_error=True fails
         #    it gets added to the blacklist and not tried again
@@ -226,16 +409,17 @@ class APDU(metaclass=FieldContainer):
         #    and the process is started from scratch
 
         retval = []
+        pos, end = 0, len(data)
 
         for name, field in self.FIELDS.items():
-            if not data:
+            if pos >= end:
                 break
 
             if field in blacklist:
                 continue
 
             try:
-                value, data = field.parse(data)
+                value, pos = field.parse_from(data, pos)
             except ParseError:
                 if field.ignore_parse_error:
                     # Indicate this field to the outer loop as being problematic
@@ -246,17 +430,103 @@ class APDU(metaclass=FieldContainer):
             retval.append((name, value))
 
         # Try to parse the remainder as bitmaps
-        while len(data):
-            key = data[0]
+        while pos < end:
+            key = data[pos]
             field, name, description = self._KNOWN_BITMAPS.get(key, (None, None, None))
             if field is None:
                 raise ParseError("Invalid bitmap 0x{:02X}".format(key))
-            value, data = field.parse(data[1:])
+            value, pos = field.parse_from(data, pos + 1)
             retval.append((name, value))
 
         return retval
 
     def serialize(self) -> bytes:
+        """
+        Return the packet as bytes. The result is cached until a field or
+        bitmap is changed. Packets that hold a TLV container aren't cached, as
+        the container can change without the packet noticing.
+        """
+        control_field = self.control_field
+
+        if not plans.VERIFY:
+            cached = self._cached_serialization()
+            if cached is not None:
+                return cached
+
+        if not plans.ENABLED:
+            data = self._generic_serialize_data()
+        elif plans.VERIFY:
+            data = plans.verify("{}.serialize".format(self.__class__.__name__),
+                                self._SERIALIZE_PLAN, self._generic_serialize_data)
+        else:
+            data = self._SERIALIZE_PLAN()
+        retval = bytes(control_field) + self.compute_length_field(len(data)) + data
+
+        # Changes to TLV containers don't go through the packet
+        if not any(isinstance(value, TLV) for value in self._values.values()):
+            self._serialized = retval
+        return retval
+
+    def _cached_serialization(self) -> Optional[bytes]:
+        """Return the serialization if it is known without serializing, otherwise None."""
+        control_field = self.control_field
+        cached = self._serialized
+        if cached is not None and cached[0] == control_field[0] and cached[1] == control_field[1]:
+            return cached
+        if not self._values:
+            constant = self._EMPTY_SERIALIZATION
+            if constant is not None and constant[0] == control_field[0] and constant[1] == control_field[1]:
+                return constant
+        return None
+
+    def _serialized_entries(self):
+        """Yield (bitmap key or None, field, value) for everything serialize() writes, in order."""
+        for name, field in self.FIELDS.items():
+            d = getattr(self, name)
+            if d is not None:
+                yield None, field, d
+        for name, key in self._bitmaps.items():
+            d = getattr(self, name)
+            if d is not None:
+                yield key, self._KNOWN_BITMAPS[key][0], d
+
+    def _data_size(self) -> int:
+        return sum(field.serialized_size(d) + (key is not None) for key, field, d in self._serialized_entries())
+
+    def serialized_size(self) -> int:
+        """
+        Return the length of serialize(), including control and length fields.
+        The fields are measured without serializing them.
+        """
+        cached = self._cached_serialization()
+        if cached is not None:
+            return len(cached)
+        size = self._data_size()
+        return len(self.control_field) + len(self.compute_length_field(size)) + size
+
+    def serialize_into(self, buffer: Union[bytearray, memoryview], offset: int = 0) -> int:
+        """
+        Write the packet to buffer at offset and return the offset after it.
+        The buffer must have serialized_size() bytes of room at offset. Each
+        field writes itself into the buffer, unless the serialization is
+        cached already.
+        """
+        cached = self._cached_serialization()
+        if cached is not None:
+            end = offset + len(cached)
+            buffer[offset:end] = cached
+            return end
+        header = bytes(self.control_field) + self.compute_length_field(self._data_size())
+        buffer[offset:offset + len(header)] = header
+        offset += len(header)
+        for key, field, d in self._serialized_entries():
+            if key is not None:
+                buffer[offset] = key
+                offset += 1
+            offset = field.serialize_into(buffer, offset, d)
+        return offset
+
+    def _generic_serialize_data(self) -> bytearray:
         data = bytearray()
         for name, field in self.FIELDS.items():
             # FIXME: Mandatory fields.  Esp. in conjunction with bitmaps (defaults?)
@@ -268,7 +538,7 @@ class APDU(metaclass=FieldContainer):
             if d is not None:
                 data.append(key)
                 data.extend(self._KNOWN_BITMAPS[key][0].serialize(d))
-        return bytes(self.control_field) + self.compute_length_field(len(data)) + data
+        return data
 
 
 # FIXME Command vs. response vs. packet
@@ -291,6 +561,12 @@ class CommandAPDU(APDU):
                 cls.CMD_INSTR is Ellipsis or cls.CMD_INSTR == data[1]
         )
 
+    @classmethod
+    def _control_pattern(cls) -> Optional[Tuple[Any, Any]]:
+        if cls.CMD_CLASS is None or cls.CMD_INSTR is None:
+            return None
+        return cls.CMD_CLASS, cls.CMD_INSTR
+
     @property
     def cmd_class(self):
         return self.control_field[0]
@@ -316,6 +592,7 @@ class ResponseAPDU(APDU):
         super().__init__(*args, **kwargs)
         self.control_field = [self.RESP_CCRC, self.RESP_APRC]
 
+    @classmethod
     def can_parse(cls, data: Union[bytes, List[int]]) -> bool:
         data = bytes(data)
         return len(data) >= 2 and (
@@ -324,6 +601,12 @@ class ResponseAPDU(APDU):
                 cls.RESP_APRC is Ellipsis or cls.RESP_APRC == data[1]
         )
 
+    @classmethod
+    def _control_pattern(cls) -> Optional[Tuple[Any, Any]]:
+        if cls.RESP_CCRC is None or cls.RESP_APRC is None:
+            return None
+        return cls.RESP_CCRC, cls.RESP_APRC
+
     @property
     def resp_ccrc(self):
         return self.control_field[0]
@@ -1,16 +1,22 @@
 import struct
 from typing import Dict, List, Optional, Union
 
-from .apdu import CommandAPDU
+from .apdu import CommandAPDU, ParseHints
 from .fields import BCDField, FlagByteField, BCDIntField, LLLStringField, ByteField, StringField
 from .text_encoding import ZVT_7BIT_CHARACTER_SET
-from .types import ConfigByte, CurrencyCode
+from .tlv_path import TLVPath, TLVSelector
+from .types import BaudRate, ConfigByte, CurrencyCode, ServiceByte
 
 
 class Packet(CommandAPDU):
+    __slots__ = ('completion', 'response_listener')
+
     wait_for_completion = False
-    completion = None
-    response_listener = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.completion = None
+        self.response_listener = None
 
     def _handle_unknown_response(self, response, tm):
         print('Unknown packet response %s' % response)
@@ -37,6 +43,17 @@ class Packet(CommandAPDU):
     def register_response_listener(self, listener):
         self.response_listener = listener
 
+    def parse_hints(self) -> ParseHints:
+        """
+        Only the Completion to a StatusEnquiry carries the software version and the
+        terminal status, see StatusEnquiry.parse_hints().
+        """
+        return ParseHints(
+            # Reading an unset bitmap would add it to the packet
+            service_byte=self.service_byte if 'service_byte' in self._bitmaps else None,
+            layouts={Completion: {'sw_version': False, 'terminal_status': False}},
+        )
+
     def handle_response(self, response, tm) -> bool:
         """
         Handle a response for a certain packet type, return `True` if
@@ -176,7 +193,8 @@ class Completion(Packet):
     CMD_INSTR = 0x0f
 
     # The sw_version field is optional but first. It will be sent or not depending on
-    # a bit in the previous Enquiry, which the parser doesn't know about. It's technically
+    # a bit in the previous Enquiry. Transmission passes that information to the parser
+    # (see Packet.parse_hints()), but when parsing without it it's technically
     # impossible to parse this protocol properly. We'll try anyway.
     #
     # Observe that the sw_version field is of type LLLVar, so will always start with bytes
@@ -192,27 +210,18 @@ class Completion(Packet):
 
     ALLOWED_BITMAPS = ['tlv', 'status_byte', 'tid', 'currency_code']
 
+    SERIAL_NUMBERS = TLVPath('E4/*1F42')
+    DEVICE_NAMES = TLVPath('E4/*1F40')
+
     def get_serial_number(self):
-        serial_number = None
         tlv = self.get('tlv')
-        if tlv is not None:
-            device_information = tlv.get_value('xE4', [])
-            for item in device_information:
-                if item.tag_ == 0x1F42:
-                    serial_number = item.value_
-
-        return serial_number
+        serial_numbers = self.SERIAL_NUMBERS.select(tlv) if tlv is not None else []
+        return serial_numbers[-1] if serial_numbers else None
 
     def get_device_name(self):
-        device_name = None
         tlv = self.get('tlv')
-        if tlv is not None:
-            device_information = tlv.get_value('xE4', [])
-            for item in device_information:
-                if item.tag_ == 0x1F40:
-                    device_name = item.value_
-
-        return device_name
+        device_names = self.DEVICE_NAMES.select(tlv) if tlv is not None else []
+        return device_names[-1] if device_names else None
 
 
 class Abort(Packet):
@@ -228,6 +237,8 @@ class Abort(Packet):
 
     # FIXME error_code
 
+    RECEIPT_NUMBERS = TLVPath('23/*08')
+
     def get_receipt_numbers(self) -> List[str]:
         receipt_numbers = []
         if self.get('receipt') is not None and self.get('receipt') != 'ffff':
@@ -235,12 +246,9 @@ class Abort(Packet):
 
         tlv = self.get('tlv')
         if tlv is not None:
-            receipt_numbers_tlv_list = tlv.get_value('x23', [])
-            for receipt_number_tlv in receipt_numbers_tlv_list:
-                if receipt_number_tlv.tag_ == 8 \
-                        and receipt_number_tlv.value_ != 'ffff' \
-                        and receipt_number_tlv.value_ not in receipt_numbers:
-                    receipt_numbers.append(receipt_number_tlv.value_)
+            for receipt_number in self.RECEIPT_NUMBERS.select(tlv):
+                if receipt_number != 'ffff' and receipt_number not in receipt_numbers:
+                    receipt_numbers.append(receipt_number)
 
         return receipt_numbers
 
@@ -433,6 +441,12 @@ class StatusEnquiry(CommandWithPassword):
 
     ALLOWED_BITMAPS = ['service_byte', 'tlv']
 
+    def parse_hints(self) -> ParseHints:
+        hints = super().parse_hints()
+        send_sw_version = not (hints.service_byte or 0) & ServiceByte.STATUS_ENQUIRY_DO_NOT_SEND_SW_VERSION
+        hints.layouts[Completion] = {'sw_version': send_sw_version, 'terminal_status': True}
+        return hints
+
 
 class ChangePTConfiguration(Packet):
     CMD_CLASS = 0x08
@@ -442,6 +456,19 @@ class ChangePTConfiguration(Packet):
     ALLOWED_BITMAPS = ['tlv']
 
 
+class ChangeBaudrate(Packet):
+    """
+    08 40
+    Switches the serial line to another baud rate. The PT answers 80 00 at
+    the current rate, or 84 FD if it doesn't support the rate, and both sides
+    use the new rate from the next command on.
+    """
+    CMD_CLASS = 0x08
+    CMD_INSTR = 0x40
+
+    baudrate = FlagByteField(data_type=BaudRate)
+
+
 class SetTerminalID(CommandWithPassword):
     CMD_CLASS = 0x06
     CMD_INSTR = 0x1B
@@ -454,10 +481,14 @@ class RequestFile(Packet):
 
 
 class WriteFiles(CommandWithPassword):
+    __slots__ = ('_files',)
+
     CMD_CLASS = 0x08
     CMD_INSTR = 0x14
     wait_for_completion = True
 
+    FILE_REQUEST = TLVSelector({'file_id': '2D/1D', 'offset': '2D/1E'})
+
     def __init__(self, files: Dict[int, bytes] = None, *args, **kwargs):
         self._files = {} if files is None else files
         super().__init__(*args, **kwargs)
@@ -491,8 +522,8 @@ class WriteFiles(CommandWithPassword):
             # FIXME Ensure necessary tags are present
             # FIXME Find out maximum read length
             readlength = 65000
-            file_id = cmd.tlv.x2d.x1d
-            offset = cmd.tlv.x2d.x1e
+            request = self.FILE_REQUEST.select(cmd.tlv)
+            file_id, offset = request['file_id'], request['offset']
             data = self.get_file_content_(file_id, offset, readlength)
             return PacketReceived(tlv={0x2d: {
                 0x1d: bytes([file_id]),
@@ -0,0 +1,113 @@
+"""
+BCD codec.
+
+Binary coded decimals hold two digits per byte, one in each nibble. ZVT also
+uses the pseudo-tetrads A-F, e.g. FF FF as receipt number of an open
+reservation enquiry (06 23 03 87 FF FF), so strings are encoded and decoded as
+hex digits. Integers are decimal only.
+
+Every function encodes or decodes and validates in a single pass over the
+data. Single bytes, which are common, are handled by the precomputed tables.
+"""
+import string
+from typing import Iterable, List, Union
+
+BytesLike = Union[bytes, bytearray, memoryview, List[int]]
+
+HEXDIGITS = frozenset(string.hexdigits)
+
+#: The digits of every byte value, pseudo-tetrads included
+DIGITS = tuple('{:02x}'.format(b) for b in range(256))
+#: The decimal value of every byte value, None if it holds a pseudo-tetrad
+VALUES = tuple((b >> 4) * 10 + (b & 0x0f) if (b >> 4) < 10 and (b & 0x0f) < 10 else None for b in range(256))
+#: The encoding of every value from 0 to 99
+BYTES = tuple(bytes([(v // 10) << 4 | v % 10]) for v in range(100))
+
+
+def is_valid(value: str) -> bool:
+    """Return whether value consists of BCD digits and pseudo-tetrads only."""
+    return HEXDIGITS.issuperset(value)
+
+
+def decode(data: BytesLike) -> str:
+    """Return the digits of data as a string, pseudo-tetrads as lower case a-f."""
+    if len(data) == 1:
+        return DIGITS[data[0]]
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+    return data.hex()
+
+
+def decode_int(data: BytesLike) -> int:
+    """Return the decimal value of data. Raises ValueError on pseudo-tetrads."""
+    if len(data) == 1:
+        value = VALUES[data[0]]
+        if value is None:
+            raise ValueError("BCD value contains pseudo-tetrads: {}".format(DIGITS[data[0]]))
+        return value
+    digits = decode(data)
+    try:
+        return int(digits, 10)
+    except ValueError:
+        raise ValueError("BCD value contains pseudo-tetrads: {}".format(digits)) from None
+
+
+def encode(value: str) -> bytes:
+    """
+    Return the BCD encoding of the digits in value, padded with a leading 0 to
+    whole bytes. Raises ValueError if value holds anything but hex digits.
+    """
+    if len(value) % 2:
+        value = '0' + value
+    try:
+        data = bytes.fromhex(value)
+    except ValueError:
+        data = b''
+    # fromhex() skips whitespace, which the length check catches
+    if len(data) * 2 != len(value):
+        raise ValueError("BCD field contents can only be hexdigits")
+    return data
+
+
+def encode_int(value: int, length: int) -> bytes:
+    """
+    Return the BCD encoding of value in length bytes, with leading zeros.
+    Raises ValueError if value is negative or does not fit.
+    """
+    if length == 1 and 0 <= value < 100:
+        return BYTES[value]
+    if value < 0:
+        raise ValueError("BCD values can't be negative")
+    digits = '%0*d' % (length * 2, value)
+    if len(digits) != length * 2:
+        raise ValueError("Value length doesn't match field length")
+    return bytes.fromhex(digits)
+
+
+def _split(data: BytesLike, lengths: Iterable[int], offset: int) -> Iterable[str]:
+    lengths = list(lengths)
+    view = memoryview(data) if isinstance(data, (bytes, bytearray, memoryview)) else memoryview(bytes(data))
+    digits = view[offset:offset + sum(lengths)].hex()
+    pos = 0
+    for length in lengths:
+        yield digits[pos:pos + length * 2]
+        pos += length * 2
+
+
+def decode_many(data: BytesLike, lengths: Iterable[int], offset: int = 0) -> List[str]:
+    """
+    Decode consecutive BCD values with the given byte lengths from data,
+    starting at offset, with a single conversion of the whole run.
+    """
+    return list(_split(data, lengths, offset))
+
+
+def decode_int_many(data: BytesLike, lengths: Iterable[int], offset: int = 0) -> List[int]:
+    """Like decode_many(), but return decimal values as decode_int() does."""
+    retval = []
+    for digits in _split(data, lengths, offset):
+        try:
+            retval.append(int(digits, 10))
+        except ValueError:
+            raise ValueError("BCD value contains pseudo-tetrads: {}".format(digits)) from None
+    return retval
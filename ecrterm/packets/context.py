@@ -1,66 +1,201 @@
-import threading
+"""
+Context for parsing and serializing, e.g. the character set or vendor quirks.
+
+Settings are made in GlobalContext, which applies everywhere, or for a block
+with enter_context(**settings). Contexts entered this way are tracked with
+contextvars, so each thread and each asyncio task sees only its own.
+CurrentContext reads and changes the innermost context. A task or thread
+that inherited the innermost context doesn't change it in place: its first
+change enters a new context of its own (copy on write).
+
+Lookups go to a flattened, read-only snapshot of the context chain, which is
+rebuilt only after a context changed. snapshot() returns it, e.g. to pass a
+context to Packet.parse() explicitly.
+"""
+import asyncio
 import contextlib
+import itertools
+import threading
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+_versions = itertools.count(1)
+_version = 0
 
 
-_localdata = threading.local()
+def _changed():
+    global _version
+    _version = next(_versions)
+
+
+def _owner() -> tuple:
+    """Identify the running thread and asyncio task."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), task
 
 
 class Context(dict):
-    def __init__(self, _parent=None, **kwargs):
+    def __init__(self, _parent=None, _owner=None, **kwargs):
         self._parent = _parent
+        self._owner = _owner
         self._deleted = set()
+        self._flat = (-1, None)
         super().__init__(**kwargs)
 
     def __delitem__(self, key):
         with contextlib.suppress(KeyError):
             super().__delitem__(key)
         self._deleted.add(key)
+        _changed()
 
     def __getitem__(self, key):
-        if key in self._deleted:
-            raise KeyError("{} deleted in context".format(key))
-        if key not in self:
-            if self._parent is not None:
-                return self._parent[key]
-        return super().__getitem__(key)
+        flat = self._flat
+        if flat[0] != _version:
+            flat = self._flatten()
+        try:
+            return flat[1][key]
+        except KeyError:
+            if key in self._deleted:
+                raise KeyError("{} deleted in context".format(key)) from None
+            raise
 
     def __setitem__(self, key, value):
         if key in self._deleted:
             self._deleted.remove(key)
         super().__setitem__(key, value)
+        _changed()
 
     def get(self, key, default=None):
-        with contextlib.suppress(KeyError):
-            return self[key]
-        return default
+        flat = self._flat
+        if flat[0] != _version:
+            flat = self._flatten()
+        return flat[1].get(key, default)
 
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
 
-def _get_current_context():
-    if not hasattr(_localdata, 'contexts'):
-        _localdata.contexts = [Context(_parent=GlobalContext)]
-    return _localdata.contexts[-1]
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, *args):
+        retval = super().pop(*args)
+        _changed()
+        return retval
+
+    def popitem(self):
+        retval = super().popitem()
+        _changed()
+        return retval
+
+    def clear(self):
+        super().clear()
+        self._deleted.clear()
+        _changed()
+
+    def _flatten(self):
+        version = _version
+        chain = []
+        level = self
+        while level is not None:
+            chain.append(level)
+            level = level._parent
+        values = {}
+        for level in reversed(chain):
+            for key in level._deleted:
+                values.pop(key, None)
+            values.update(dict.items(level))
+        self._flat = flat = (version, MappingProxyType(values))
+        return flat
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """Return the effective settings of this context and its parents, as read-only mapping."""
+        flat = self._flat
+        if flat[0] != _version:
+            flat = self._flatten()
+        return flat[1]
+
+
+_current = ContextVar('ecrterm_context')
+
+
+def _get_current_context() -> Context:
+    try:
+        return _current.get()
+    except LookupError:
+        context = Context(_parent=GlobalContext, _owner=_owner())
+        _current.set(context)
+        return context
+
+
+def _get_writable_context() -> Context:
+    """Return the current context, after entering a new one if it was inherited from another task or thread."""
+    context = _get_current_context()
+    owner = _owner()
+    if context._owner != owner:
+        context = Context(_parent=context, _owner=owner)
+        _current.set(context)
+    return context
 
 
 class MetaContext:
+    _WRITERS = frozenset(('update', 'setdefault', 'pop', 'popitem', 'clear'))
+
     def __delitem__(self, item):
-        return _get_current_context().__delitem__(item)
+        return _get_writable_context().__delitem__(item)
 
-    def __getattribute__(self, key):
-        return _get_current_context().__getattribute__(key)
+    def __getattr__(self, key):
+        if key in self._WRITERS:
+            return getattr(_get_writable_context(), key)
+        return getattr(_get_current_context(), key)
 
     def __setitem__(self, item, value):
-        return _get_current_context().__setitem__(item, value)
+        return _get_writable_context().__setitem__(item, value)
 
     def __getitem__(self, item):
         return _get_current_context().__getitem__(item)
 
+    def get(self, key, default=None):
+        return _get_current_context().get(key, default)
+
+
+def snapshot() -> Mapping[str, Any]:
+    """
+    Return the effective settings of the current context as read-only mapping.
+    The snapshot doesn't change when the context is changed later.
+    """
+    return _get_current_context().snapshot()
+
+
+class _EnteredContext(contextlib.ContextDecorator):
+    def __init__(self, settings: Mapping[str, Any]):
+        self._settings = settings
+
+    def _recreate_cm(self):
+        return _EnteredContext(self._settings)
+
+    def __enter__(self):
+        self._token = _current.set(Context(_parent=_get_current_context(), _owner=_owner(), **self._settings))
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._token)
+
 
-@contextlib.contextmanager
 def enter_context(**kwargs):
-    _get_current_context()
-    _localdata.contexts.append(Context(_parent=_localdata.contexts[-1], **kwargs))
-    yield
-    _localdata.contexts.pop()
+    return _EnteredContext(kwargs)
+
+
+def using_context(context: Optional[Mapping[str, Any]]):
+    """Enter context if it is given, e.g. a snapshot() or a dictionary of settings."""
+    if not context:
+        return contextlib.nullcontext()
+    return _EnteredContext(context)
 
 
 CurrentContext = MetaContext()
@@ -1,9 +1,9 @@
-import string
 from enum import Enum
 from typing import Any, Union, List, Optional, Tuple
 
-from .context import CurrentContext
-from .text_encoding import encode, decode
+from . import bcd
+from .context import snapshot
+from .text_encoding import context_codec, get_codec
 from .tlv import TLV, TLVDictionary, ContainerType
 from .types import CharacterSet, VendorQuirks, CardholderIdentification, OnlineTag
 
@@ -28,18 +28,50 @@ class Field:
         self.name = name  # Only used in TLV
         super().__init__()
 
-    def from_bytes(self, v: Union[bytes, List[int]]) -> Any:
+    def from_bytes(self, v: Union[bytes, memoryview, List[int]]) -> Any:
+        if isinstance(v, memoryview):
+            return bytes(v)
         return v
 
     def to_bytes(self, v: Any, length: Optional[int] = None) -> bytes:
         return v
 
     def parse(self, data: Union[bytes, List[int]]) -> Tuple[Any, bytes]:
+        """Parse a value from the start of data, return the value and the remaining data."""
+        data = bytes(data) if not isinstance(data, bytes) else data
+        value, offset = self.parse_from(memoryview(data), 0)
+        return value, data[offset:]
+
+    def parse_from(self, data: memoryview, offset: int) -> Tuple[Any, int]:
+        """Parse a value from data starting at offset, return the value and the offset after it."""
+        if type(self).parse is not Field.parse:
+            # Subclass that only implements parse()
+            value, rest = self.parse(bytes(data[offset:]))
+            return value, len(data) - len(rest)
         raise NotImplementedError  # pragma: no coverage
 
     def serialize(self, data: Any) -> bytes:
         raise NotImplementedError  # pragma: no coverage
 
+    def serialized_size(self, data: Any) -> int:
+        """
+        Return len(self.serialize(data)). The fields here compute it without
+        serializing, this is the fallback for subclasses that only implement
+        serialize().
+        """
+        return len(self.serialize(data))
+
+    def serialize_into(self, buffer: Union[bytearray, memoryview], offset: int, data: Any) -> int:
+        """
+        Write the serialization of data to buffer at offset and return the offset after it.
+        The buffer must have serialized_size(data) bytes of room at offset.
+        This is the fallback for subclasses that only implement serialize().
+        """
+        serialized = self.serialize(data)
+        end = offset + len(serialized)
+        buffer[offset:end] = serialized
+        return end
+
     def coerce(self, data: Any) -> Any:
         if self.data_type:
             return self.data_type(data)
@@ -54,9 +86,13 @@ class Field:
     def __set__(self, instance, value: Any):
         v = self.coerce(value)
         instance._values[self] = v
+        if instance._serialized is not None:
+            instance._serialized = None
 
     def __delete__(self, instance):
         del instance._values[self]
+        if instance._serialized is not None:
+            instance._serialized = None
 
     def __get__(self, instance, objtype=None):
         return instance._values.get(self, None)
@@ -71,14 +107,21 @@ class FixedLengthField(Field):
             raise ValueError("Length must be set for fixed length fields")
         super().__init__(*args, **kwargs)
 
-    def parse(self, data: Union[bytes, List[int]]) -> Tuple[Any, bytes]:
-        data = bytes(data) if not isinstance(data, bytes) else data
-        v, data = data[:self.length], data[self.length:]
-        return self.from_bytes(v), data
+    def parse_from(self, data: memoryview, offset: int) -> Tuple[Any, int]:
+        end = offset + self.length
+        return self.from_bytes(data[offset:end]), end
 
     def serialize(self, data: Any) -> bytes:
-        self.validate(data)
-        return self.to_bytes(data, self.length)
+        if type(self).validate not in _ENCODING_VALIDATORS:
+            # A subclass adds checks of its own
+            self.validate(data)
+        retval = self.to_bytes(data, self.length)
+        if len(retval) != self.length:
+            raise ValueError("Field must be exactly {} bytes long (got {} bytes)".format(self.length, len(retval)))
+        return retval
+
+    def serialized_size(self, data: Any) -> int:
+        return self.length
 
     def validate(self, data: Any) -> None:
         if len(self.to_bytes(data)) != self.length:
@@ -89,18 +132,15 @@ class FixedLengthField(Field):
 class LVARField(Field):
     LL = 1
 
-    def parse(self, data: Union[bytes, List[int]]) -> Tuple[Any, bytes]:
-        data = bytes(data) if not isinstance(data, bytes) else data
+    def parse_from(self, data: memoryview, offset: int) -> Tuple[Any, int]:
         length = 0
-        for i in range(self.LL):
+        for i in range(offset, offset + self.LL):
             if (data[i] & 0xF0) != 0xF0 or (data[i] & 0x0F) > 9:
                 raise ParseError("L*VAR length header invalid")
             length = (length * 10) + (data[i] & 0x0F)
-        data = data[self.LL:]
-
-        v, data = data[:length], data[length:]
+        offset += self.LL
 
-        return self.from_bytes(v), data
+        return self.from_bytes(data[offset:(offset + length)]), offset + length
 
     def serialize(self, data: Any) -> bytes:
         data = self.to_bytes(data)
@@ -112,6 +152,21 @@ class LVARField(Field):
         header = bytes(0xF0 | ((length // (10 ** i)) % 10) for i in reversed(range(self.LL)))
         return header + data
 
+    def serialized_size(self, data: Any) -> int:
+        return self.LL + len(self.to_bytes(data))
+
+    def serialize_into(self, buffer: Union[bytearray, memoryview], offset: int, data: Any) -> int:
+        data = self.to_bytes(data)
+        length = len(data)
+        if length >= (10 ** self.LL):
+            raise ValueError("Data too long for L*VAR field")
+
+        for i in reversed(range(self.LL)):
+            buffer[offset] = 0xF0 | ((length // (10 ** i)) % 10)
+            offset += 1
+        buffer[offset:offset + length] = data
+        return offset + length
+
 
 class LLVARField(LVARField):
     LL = 2
@@ -131,35 +186,20 @@ class IntField(Field):
         if length is None:
             raise ValueError("Need to specify length for IntField serialization")
 
-        result = [0] * length
-        for i in range(length):
-            n, v = v & 0xff, v >> 8
-            if self.ENDIAN is Endianness.BIG_ENDIAN:
-                result[length - 1 - i] = n
-            else:
-                result[i] = n
-
-        if v:
-            raise ValueError("Value too large to serialize in {} bytes".format(length))
-
-        return bytes(result)
+        try:
+            return int.to_bytes(v, length, 'big' if self.ENDIAN is Endianness.BIG_ENDIAN else 'little')
+        except OverflowError:
+            raise ValueError("Value too large to serialize in {} bytes".format(length)) from None
 
     def from_bytes(self, v: Union[bytes, List[int]]) -> int:
-        if self.ENDIAN is Endianness.LITTLE_ENDIAN:
-            v = reversed(v)
-
-        result = 0
-        for n in v:
-            result = (result << 8) | n
-
-        return result
+        return int.from_bytes(v, 'big' if self.ENDIAN is Endianness.BIG_ENDIAN else 'little')
 
 
 class BytesField(Field):
     DATA_TYPE = bytes
 
-    def parse(self, data: Union[bytes, List[int]]) -> Tuple[str, bytes]:
-        return self.from_bytes(data), b''
+    def parse_from(self, data: memoryview, offset: int) -> Tuple[Any, int]:
+        return self.from_bytes(data[offset:]), len(data)
 
     def serialize(self, data: str) -> bytes:
         return self.to_bytes(data)
@@ -172,15 +212,16 @@ class StringField(BytesField):
         self._character_set = kwargs.pop('character_set', None)
         super().__init__(*args, **kwargs)
 
+    def _codec(self):
+        if self._character_set is not None:
+            return get_codec(self._character_set)
+        return context_codec()
+
     def from_bytes(self, v: Union[bytes, List[int]]) -> str:
-        character_set = self._character_set if self._character_set is not None \
-            else CurrentContext.get('character_set', CharacterSet.DEFAULT)
-        return decode(bytes(v), character_set)
+        return self._codec().decode(bytes(v))
 
     def to_bytes(self, v: str, length: int = None) -> bytes:
-        character_set = self._character_set if self._character_set is not None \
-            else CurrentContext.get('character_set', CharacterSet.DEFAULT)
-        retval = encode(v, character_set)
+        retval = self._codec().encode(v)
 
         if length:
             if len(retval) != length:
@@ -210,23 +251,17 @@ class FlagByteField(IntField, FixedLengthField):
 class BCDVariableLengthField(Field):
     DATA_TYPE = str
 
-    def from_bytes(self, v: Union[bytes, List[int]]) -> str:
-        return bytearray(v).hex()
+    def from_bytes(self, v: Union[bytes, memoryview, List[int]]) -> str:
+        return bcd.decode(v)
 
     def to_bytes(self, v: str, length: Optional[int] = None) -> bytes:
         # Note: we need to allow pseudo-tetrades - e.g. for open reservation enquiry (06 23 03 87 FF FF)
-        if any(x not in string.hexdigits for x in v):
-            raise ValueError("BCD field contents can only be hexdigits")
-
-        if len(v) % 2 != 0:
-            v = '0' + v
-
-        return bytes(bytearray.fromhex(v))
+        return bcd.encode(v)
 
     def validate(self, data: str) -> None:
         super().validate(data)
         # Note: we need to allow pseudo-tetrades - e.g. for open reservation enquiry (06 23 03 87 FF FF)
-        if any(x not in string.hexdigits for x in data):
+        if not bcd.is_valid(data):
             raise ValueError("BCD field contents can only be hexdigits")
 
 
@@ -252,13 +287,11 @@ class BCDIntField(BCDField):
     DATA_TYPE = int
 
     def from_bytes(self, v: Union[bytes, List[int]]) -> int:
-        v = super().from_bytes(v)
-        return int(v, 10)
+        return bcd.decode_int(v)
 
     def to_bytes(self, v: int, length: Optional[int] = None) -> bytes:
         length = length if length is not None else (self.length if self.length is not None else self.LENGTH)
-        v = str(int(v))
-        return super().to_bytes(v.rjust(length * 2, '0'), length)
+        return bcd.encode_int(int(v), length)
 
     def coerce(self, data: Any) -> int:
         if isinstance(data, str):
@@ -266,7 +299,12 @@ class BCDIntField(BCDField):
         return super().coerce(data)
 
     def validate(self, data: int) -> None:
-        super().validate(str(int(data)))
+        self.to_bytes(data)
+
+
+# Validators whose checks to_bytes() makes while encoding, FixedLengthField.serialize() doesn't call them
+_ENCODING_VALIDATORS = frozenset((
+    Field.validate, FixedLengthField.validate, BCDVariableLengthField.validate, BCDIntField.validate))
 
 
 class BEIntField(IntField, FixedLengthField):
@@ -296,18 +334,26 @@ class TLVField(Field):
             raise ValueError("Must not give length for TLV container")
         return v.serialize()
 
-    def parse(self, data: Union[bytes, List[int]]) -> Tuple[TLV, bytes]:
-        return TLV.parse(
-            data, empty_tag=True,
-            dictionary='feig_zvt' if VendorQuirks.FEIG_CVEND in CurrentContext.get('vendor_quirks', set()) else 'zvt')
+    def parse_from(self, data: memoryview, offset: int) -> Tuple[TLV, int]:
+        return TLV.parse_from(
+            data, offset, empty_tag=True,
+            dictionary='feig_zvt' if VendorQuirks.FEIG_CVEND in snapshot().get('vendor_quirks', ()) else 'zvt')
 
     def serialize(self, data: TLV) -> bytes:
         return data.serialize()
 
+    def serialized_size(self, data: TLV) -> int:
+        return data.serialized_size()
+
+    def serialize_into(self, buffer: Union[bytearray, memoryview], offset: int, data: TLV) -> int:
+        return data.serialize_into(buffer, offset)
+
     def __get__(self, instance, objtype=None) -> TLV:
         if self not in instance._values:
             instance._values[self] = TLV()
             instance._values[self].pending = True
+            if instance._serialized is not None:
+                instance._serialized = None
         return super().__get__(instance, objtype)
 
 
@@ -0,0 +1,214 @@
+"""
+Per-class serialize plans.
+
+The generic APDU serializer interprets FIELDS and the bitmap table for every
+packet. The functions in this module generate a specialized serializer for
+one APDU class instead, once, when the class is defined: the FIELDS loop is
+unrolled, the encoders of simple fields are inlined, runs of consecutive
+fixed size integer fields are packed with one struct.Struct and the bitmap
+table is resolved to per-key writer functions.
+
+Parsing has no plans, generating parsers the same way gained too little.
+
+Set ENABLED to False to always use the generic serializer, or VERIFY to True to
+run both and raise an AssertionError if their results differ.
+"""
+import linecache
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import bcd
+from .fields import BCDField, BCDIntField, BEIntField, ByteField, Field, FlagByteField, PasswordField
+
+ENABLED = True
+VERIFY = False
+
+
+class _Source:
+    """Collects generated code lines and the constants they refer to."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lines = []
+        self.namespace = {
+            'struct_error': struct.error,
+            'HEXDIGITS': bcd.HEXDIGITS,
+            'fromhex': bytes.fromhex,
+        }
+
+    def constant(self, prefix: str, value: Any) -> str:
+        name = '{}_{}'.format(prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def emit(self, indent: int, *lines: str):
+        self.lines.extend('    ' * indent + line for line in lines)
+
+    def build(self, name: str) -> Callable:
+        source = '\n'.join(self.lines) + '\n'
+        # Keep the source around so that tracebacks point into the generated code
+        linecache.cache[self.filename] = (len(source), None, source.splitlines(True), self.filename)
+        exec(compile(source, self.filename, 'exec'), self.namespace)
+        return self.namespace[name]
+
+
+def _emit_serialize_field(src: _Source, indent: int, field: Field):
+    """Emit code that appends the serialization of `value` for `field` to `data`."""
+    kind = type(field)
+    fallback = 'data += {}(value)'.format(src.constant('serialize', field.serialize))
+    if kind in (ByteField, FlagByteField):
+        src.emit(indent, 'if isinstance(value, int) and 0 <= value <= 0xff:', '    data.append(value)',
+                 'else:', '    ' + fallback)
+    elif kind in (BCDField, PasswordField):
+        src.emit(indent, 'if len(value) == {} and HEXDIGITS.issuperset(value):'.format(field.length * 2),
+                 '    data += fromhex(value)', 'else:', '    ' + fallback)
+    elif kind is BCDIntField:
+        src.emit(indent, 'if isinstance(value, int) and 0 <= value < {}:'.format(10 ** (field.length * 2)),
+                 "    data += fromhex('%0{}d' % value)".format(field.length * 2), 'else:', '    ' + fallback)
+    else:
+        src.emit(indent, fallback)
+
+
+_field_writers = {}
+
+
+def field_writer(field: Field) -> Callable[[bytearray, Any], None]:
+    """Return a function that appends field.serialize(value) to a bytearray."""
+    writer = _field_writers.get(field, None)
+    if writer is None:
+        src = _Source('<ecrterm plan {}.serialize>'.format(type(field).__name__))
+        src.emit(0, 'def serialize(data, value):')
+        _emit_serialize_field(src, 1, field)
+        writer = _field_writers[field] = src.build('serialize')
+    return writer
+
+
+def _field_getter(field: Field) -> Optional[Callable]:
+    """Return field.__get__ if it does more than look up the stored value, None otherwise."""
+    if type(field).__get__ is Field.__get__:
+        return None
+    return field.__get__
+
+
+def _struct_code(field: Field) -> Optional[str]:
+    """Return the struct format character that encodes `field`, or None."""
+    kind = type(field)
+    if kind in (ByteField, FlagByteField):
+        return 'B'
+    if kind is BEIntField:
+        return {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}.get(field.length)
+    return None
+
+
+def _packable(field: Field) -> bool:
+    return _struct_code(field) is not None
+
+
+def _runs(fields: Dict[str, Field]) -> List[List[Tuple[str, Field]]]:
+    """
+    Split FIELDS into runs of consecutive fixed size integer fields, which are
+    packed with one struct call, and single other fields.
+    """
+    retval = []
+    previous = False
+    for item in fields.items():
+        packable = _packable(item[1])
+        if packable and previous:
+            retval[-1].append(item)
+        else:
+            retval.append([item])
+        previous = packable
+    return retval
+
+
+def _run_struct(src: _Source, run: List[Tuple[str, Field]]) -> Tuple[struct.Struct, str]:
+    packer = struct.Struct('>' + ''.join(_struct_code(field) for field_name, field in run))
+    return packer, src.constant('struct', packer)
+
+
+def _emit_value(src: _Source, indent: int, target: str, field: Field):
+    getter = _field_getter(field)
+    if getter is None:
+        src.emit(indent, '{} = values.get({}, None)'.format(target, src.constant('field', field)))
+    else:
+        src.emit(indent, '{} = {}(self)'.format(target, src.constant('get', getter)))
+
+
+def _emit_serialize_field_entry(src: _Source, indent: int, field: Field, value: str):
+    """Emit the code for one field in FIELDS: append the serialization of `value` to data if it is set."""
+    if value != 'value':
+        src.emit(indent, 'value = {}'.format(value))
+    src.emit(indent, 'if value is not None:')
+    _emit_serialize_field(src, indent + 1, field)
+
+
+def _emit_serialize_run(src: _Source, run: List[Tuple[str, Field]]):
+    """
+    Emit code that packs a run of fixed size fields at once if all of them are
+    set and in range, and falls back to the single fields otherwise.
+    """
+    packer, struct_ref = _run_struct(src, run)
+    names = ['value_{}'.format(i) for i in range(len(run))]
+    for name, (field_name, field) in zip(names, run):
+        _emit_value(src, 1, name, field)
+    src.emit(1, 'packed = None')
+    src.emit(1, 'if {}:'.format(' and '.join('{} is not None'.format(name) for name in names)))
+    src.emit(2, 'try:', '    packed = {}.pack({})'.format(struct_ref, ', '.join(names)))
+    src.emit(2, 'except struct_error:', '    pass')
+    src.emit(1, 'if packed is not None:', '    data += packed', 'else:')
+    for name, (field_name, field) in zip(names, run):
+        _emit_serialize_field_entry(src, 2, field, name)
+
+
+def compile_serializer(name: str, fields: Dict[str, Field], bitmaps: Dict[int, Tuple[Field, str, str]]) -> Callable:
+    """
+    Generate the body of APDU.serialize() for a class with the given FIELDS and
+    known bitmaps. The generated function returns the APDU data without control
+    and length fields.
+    """
+    src = _Source('<ecrterm plan {}.serialize>'.format(name))
+    src.namespace['bitmap_writers'] = {
+        key: (_field_getter(field) or (lambda instance, field=field: instance._values.get(field, None)),
+              field_writer(field))
+        for key, (field, bitmap_name, description) in bitmaps.items()
+    }
+
+    src.emit(0, 'def serialize(self):')
+    src.emit(1, 'values = self._values', 'data = bytearray()')
+
+    for run in _runs(fields):
+        if len(run) > 1:
+            _emit_serialize_run(src, run)
+        else:
+            _emit_value(src, 1, 'value', run[0][1])
+            _emit_serialize_field_entry(src, 1, run[0][1], 'value')
+
+    src.emit(1, 'for key in self._bitmaps.values():')
+    src.emit(2, 'get, write = bitmap_writers[key]')
+    src.emit(2, 'value = get(self)')
+    src.emit(2, 'if value is not None:')
+    src.emit(3, 'data.append(key)', 'write(data, value)')
+    src.emit(1, 'return data')
+
+    return src.build('serialize')
+
+
+def _outcome(fun: Callable, *args) -> Tuple[Any, Optional[Exception]]:
+    try:
+        return fun(*args), None
+    except Exception as e:
+        return None, e
+
+
+def verify(description: str, compiled: Callable, generic: Callable, *args) -> Any:
+    """Run the compiled and the generic implementation and make sure that they agree."""
+    result, error = _outcome(compiled, *args)
+    generic_result, generic_error = _outcome(generic, *args)
+    compiled_repr = repr(result) if error is None else repr((type(error), str(error)))
+    generic_repr = repr(generic_result) if generic_error is None else repr((type(generic_error), str(generic_error)))
+    if compiled_repr != generic_repr:
+        raise AssertionError("Compiled plan for {} differs from generic implementation: {} != {}".format(
+            description, compiled_repr, generic_repr))
+    if error is not None:
+        raise error
+    return result
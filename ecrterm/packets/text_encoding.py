@@ -1,5 +1,7 @@
-from typing import Union
+import codecs
+from typing import Dict, Union
 
+from .context import snapshot
 from .types import CharacterSet
 
 # "7-bit ASCII with umlauts"
@@ -10,6 +12,44 @@ ZVT_7BIT_CHARACTER_SET = [
 ZVT_7BIT_CHARACTER_SET[0x5B:0x5E] = list('ÄÖÜ')
 ZVT_7BIT_CHARACTER_SET[0x7B:0x80] = list('äöüßΔ')
 
+# The ZVT 7-bit character set as charmap codec 'zvt-7bit'. The 8th bit is ignored when decoding.
+ZVT_7BIT_CODEC_NAME = 'zvt-7bit'
+_ZVT_7BIT_DECODING_TABLE = ''.join(ZVT_7BIT_CHARACTER_SET) * 2
+_ZVT_7BIT_ENCODING_TABLE = codecs.charmap_build(''.join(ZVT_7BIT_CHARACTER_SET))
+
+
+def _zvt_7bit_encode(value: str, errors: str = 'strict'):
+    return codecs.charmap_encode(value, errors, _ZVT_7BIT_ENCODING_TABLE)
+
+
+def _zvt_7bit_decode(value: bytes, errors: str = 'strict'):
+    return codecs.charmap_decode(value, errors, _ZVT_7BIT_DECODING_TABLE)
+
+
+class _ZVT7BitIncrementalEncoder(codecs.IncrementalEncoder):
+    def encode(self, value, final=False):
+        return _zvt_7bit_encode(value, self.errors)[0]
+
+
+class _ZVT7BitIncrementalDecoder(codecs.IncrementalDecoder):
+    def decode(self, value, final=False):
+        return _zvt_7bit_decode(value, self.errors)[0]
+
+
+def _search_codec(name: str):
+    if name.replace('-', '_') == 'zvt_7bit':
+        return codecs.CodecInfo(
+            name=ZVT_7BIT_CODEC_NAME,
+            encode=_zvt_7bit_encode,
+            decode=_zvt_7bit_decode,
+            incrementalencoder=_ZVT7BitIncrementalEncoder,
+            incrementaldecoder=_ZVT7BitIncrementalDecoder,
+        )
+    return None
+
+
+codecs.register(_search_codec)
+
 
 def _map_character_set(encoding: CharacterSet):
     if encoding is CharacterSet.ASCII_7BIT:
@@ -22,19 +62,62 @@ def _map_character_set(encoding: CharacterSet):
         return 'iso-8859-{}'.format(encoding.value)
 
 
-def encode(value: str, encoding: Union[list, CharacterSet] = CharacterSet.DEFAULT) -> bytes:
+class TextCodec:
+    """Encoder and decoder for one character set, see get_codec()."""
+    __slots__ = ('name', '_encode', '_decode', '_errors')
+
+    def __init__(self, name: str, errors: str):
+        info = codecs.lookup(name)
+        self.name = info.name
+        self._encode = info.encode
+        self._decode = info.decode
+        self._errors = errors
+
+    def encode(self, value: str) -> bytes:
+        return self._encode(value, self._errors)[0]
+
+    def decode(self, value: bytes) -> str:
+        return self._decode(value)[0]
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+
+# Characters that the 7-bit set can't represent are an error, for the others they are dropped
+ZVT_7BIT_CODEC = TextCodec(ZVT_7BIT_CODEC_NAME, 'strict')
+_codecs: Dict[CharacterSet, TextCodec] = {}
+
+
+def get_codec(encoding: Union[list, CharacterSet]) -> TextCodec:
+    """Return the cached codec for a CharacterSet or the special value ZVT_7BIT_CHARACTER_SET."""
     if encoding is ZVT_7BIT_CHARACTER_SET:
-        return bytes(ZVT_7BIT_CHARACTER_SET.index(t) for t in value)
-    elif isinstance(encoding, CharacterSet):
-        return value.encode(_map_character_set(encoding), 'ignore')
-    else:
+        return ZVT_7BIT_CODEC
+    if not isinstance(encoding, CharacterSet):
         raise ValueError("encoding parameter must me a CharacterSet or the special value ZVT_7BIT_CHARACTER_SET")
+    codec = _codecs.get(encoding)
+    if codec is None:
+        codec = _codecs[encoding] = TextCodec(_map_character_set(encoding), 'ignore')
+    return codec
+
+
+_context_codec = (None, None)
+
+
+def context_codec() -> TextCodec:
+    """Return the codec for the character set of the current context."""
+    global _context_codec
+    context = snapshot()
+    cached_context, codec = _context_codec
+    if cached_context is not context:
+        # Snapshots are immutable, so the codec is resolved once per context
+        codec = get_codec(context.get('character_set', CharacterSet.DEFAULT))
+        _context_codec = (context, codec)
+    return codec
+
+
+def encode(value: str, encoding: Union[list, CharacterSet] = CharacterSet.DEFAULT) -> bytes:
+    return get_codec(encoding).encode(value)
 
 
 def decode(value: bytes, encoding: Union[list, CharacterSet] = CharacterSet.DEFAULT) -> str:
-    if encoding is ZVT_7BIT_CHARACTER_SET:
-        return "".join(ZVT_7BIT_CHARACTER_SET[t & 0x7f] for t in value)
-    elif isinstance(encoding, CharacterSet):
-        return value.decode(_map_character_set(encoding))
-    else:
-        raise ValueError("encoding parameter must me a CharacterSet or the special value ZVT_7BIT_CHARACTER_SET")
+    return get_codec(encoding).decode(value)
@@ -1,7 +1,7 @@
 import string
 from enum import IntEnum
-from typing import Union, TypeVar, Type, List, Dict, Tuple, Any, Optional
-from .context import CurrentContext, enter_context
+from typing import Union, TypeVar, Type, List, Dict, Tuple, Any, Optional, Mapping, Iterator, NamedTuple
+from .context import enter_context, snapshot, using_context
 from .types import VendorQuirks
 
 
@@ -28,6 +28,25 @@ _FIRST_PARAM_TYPE = Union[
 
 
 class TLV:
+    """
+    A BER-TLV element, primitive or constructed.
+
+    With lazy_tlv=True in the context, constructed TLVs that are parsed keep
+    their encoded value in _raw and only record the tag and span of each child
+    when they are first accessed. A child is decoded when it is touched, with
+    the context of the parse. Untouched children are serialized by copying
+    their original bytes, unless a TLV in them runs past the end of its
+    parent: those are decoded and truncated like the eager parser does.
+
+    Constructed TLVs index the positions of their children by tag and by name
+    on the first lookup. The index is kept up to date by append_() and
+    dropped when value_ is assigned, or read, because the caller may change
+    the list.
+    """
+    # pending is only set on the empty container that TLVField creates on first access
+    __slots__ = ('_constructed', '_info', '_tag', '_value', '_implicit', '_raw', '_context', '_tags', '_names',
+                 'pending')
+
     # <editor-fold desc="static T/L helpers">
     @staticmethod
     def _read_tlv_tag(data: bytes, pos: int) -> Tuple[int, int]:
@@ -56,25 +75,24 @@ class TLV:
             length = length
         return length, pos
 
+    @staticmethod
+    def _is_constructed(tag: int, feig_cvend: bool = False) -> bool:
+        if feig_cvend and 0xff00 <= tag <= 0xffff:
+            return False
+        while tag > 0xff:
+            tag >>= 8
+        return bool(tag & 0x20)
+
     @staticmethod
     def _make_tlv_tag(tag: int) -> bytes:
-        retval = bytearray()
-        while tag > 0:
-            retval.insert(0, tag & 0xff)
-            tag = tag >> 8
-        return bytes(retval)
+        return tag.to_bytes((tag.bit_length() + 7) // 8, 'big')
 
     @staticmethod
     def _make_tlv_length(length: int) -> bytes:
         if length < 0x80:
             return bytes([length])
-        else:
-            retval = bytearray()
-            while length:
-                retval.append(length & 0xff)
-                length = length >> 8
-            retval.append(0x80 | len(retval))
-            return bytes(reversed(retval))
+        size = (length.bit_length() + 7) // 8
+        return bytes([0x80 | size]) + length.to_bytes(size, 'big')
 
     # </editor-fold>
 
@@ -89,11 +107,14 @@ class TLV:
             return  # __new__ handled this
 
         self._constructed = False
-        self._class = None
+        self._info: Optional[TagInfo] = None
         self._tag = NOT_PROVIDED
         self._value = None
         self._implicit = implicit_
-        self._type: Optional[TLVDataType] = None
+        self._raw = None
+        self._context = None
+        self._tags = None
+        self._names = None
 
         self.tag_ = tag_
 
@@ -123,27 +144,9 @@ class TLV:
         if self._tag is not NOT_PROVIDED:
             raise TypeError("Cannot change tag after creation")
 
-        active_dictionary = TLVDictionary.get(CurrentContext.get('tlv_dictionary', 'default'))
-
         self._tag = value
-        self._class = None
-        if value is None:
-            self._constructed = True
-        else:
-            t = value
-            while t > 0xff:
-                t >>= 8
-            if VendorQuirks.FEIG_CVEND in CurrentContext.get('vendor_quirks', set()):
-                if 0xff00 <= value <= 0xffff:
-                    self._constructed = False
-                else:
-                    self._constructed = bool(t & 0x20)
-            else:
-                self._constructed = bool(t & 0x20)
-            self._class = TLVClass(t >> 6)
-
-        if not self._constructed:
-            self._type = active_dictionary.get(value, active_dictionary[None])
+        self._info = info = _tag_table()[value]
+        self._constructed = info.constructed
 
     # </editor-fold>
 
@@ -154,21 +157,24 @@ class TLV:
 
     @property
     def class_(self):
-        return self._class
+        return self._info.class_
 
     # </editor-fold>
 
     # <editor-fold desc="value accessors">
     @property
     def value_(self):
-        if self._value is None and self._constructed:
-            self._value = []
+        if self._constructed:
+            self._tags = self._names = None
+            return self._children()
         return self._value
 
     @value_.setter
     def value_(self, value):
         if value is not None:
             self._implicit = False
+        self._raw = self._context = None
+        self._tags = self._names = None
         if self._constructed:
             if isinstance(value, (tuple, list)):
                 self._value = []
@@ -188,34 +194,176 @@ class TLV:
                     if isinstance(k, int):
                         k = "x{:X}".format(k)
                     setattr(self, k, v)
-            elif isinstance(value, bytes):
+            elif isinstance(value, (bytes, memoryview)):
+                self._value = None
+                context = snapshot()
+                if context.get('lazy_tlv', False):
+                    self._raw = memoryview(value)
+                    self._context = context
+                    return
                 self._value = []
-                while len(value):
-                    item, value = TLV.parse(value)
+                value = memoryview(value)
+                pos = 0
+                while pos < len(value):
+                    item, pos = TLV.parse_from(value, pos)
                     self._value.append(item)
         else:
-            if self._type:
-                self._value = self._type.from_bytes(value)
+            if isinstance(value, memoryview):
+                value = bytes(value)
+            data_type = self._info.data_type
+            if data_type:
+                self._value = data_type.from_bytes(value)
             else:
                 self._value = value
 
     # </editor-fold>
 
+    # <editor-fold desc="lazy children">
+    def _entries(self) -> list:
+        """
+        Return the list of children of a lazy TLV, in which children that have
+        not been decoded yet are (tag, start, end) spans of _raw.
+        """
+        if self._value is None:
+            raw = self._raw
+            entries = []
+            pos, end = 0, len(raw)
+            while pos < end:
+                start = pos
+                tag, pos = self._read_tlv_tag(raw, pos)
+                length, pos = self._read_tlv_length(raw, pos)
+                # A truncated child ends with the data, as in the eager parser
+                pos = min(pos + length, end)
+                entries.append((tag, start, pos))
+            self._value = entries
+        return self._value
+
+    def _fits(self, table: '_TagTable', pos: int, end: int) -> bool:
+        """
+        Return whether the TLVs in _raw[pos:end] and all their descendants end
+        within their parents, so that copying the bytes gives the same result
+        as decoding and serializing them.
+        """
+        raw = self._raw
+        while pos < end:
+            tag, pos = self._read_tlv_tag(raw, pos)
+            length, pos = self._read_tlv_length(raw, pos)
+            if pos + length > end or (table[tag].constructed and not self._fits(table, pos, pos + length)):
+                return False
+            pos += length
+        return True
+
+    def _copyable(self) -> Tuple[bool, Optional['_TagTable']]:
+        """Return whether all of _raw can be copied, and the tag table to check single children with."""
+        with using_context(self._context):
+            table = _tag_table()
+        return self._value is None and self._fits(table, 0, len(self._raw)), table
+
+    def _decode_entry(self, index: int) -> 'TLV':
+        entries = self._value
+        with using_context(self._context):
+            entries[index] = TLV.parse_from(self._raw, entries[index][1])[0]
+        return entries[index]
+
+    def _decode_all(self):
+        entries = self._entries()
+        for index, entry in enumerate(entries):
+            if type(entry) is tuple:
+                self._decode_entry(index)
+        self._raw = self._context = None
+
+    def _children(self) -> list:
+        """Return the decoded list of children of a constructed TLV."""
+        if self._raw is not None:
+            self._decode_all()
+        if self._value is None:
+            self._value = []
+        return self._value
+
+    # </editor-fold>
+
+    # <editor-fold desc="child index">
+    def _tag_index(self) -> Dict[int, List[int]]:
+        """Return the positions of the children by tag, in order."""
+        if self._tags is None:
+            tags = {}
+            entries = self._entries() if self._raw is not None else self._value or ()
+            for index, entry in enumerate(entries):
+                tags.setdefault(entry[0] if type(entry) is tuple else entry._tag, []).append(index)
+            self._tags = tags
+        return self._tags
+
+    def _name_index(self) -> Dict[str, List[int]]:
+        """Return the positions of the children by name, in order."""
+        if self._names is None:
+            names = {}
+            for index, item in enumerate(self._children()):
+                names.setdefault(item.name_, []).append(index)
+            self._names = names
+        return self._names
+
+    def _child_at(self, index: int) -> 'TLV':
+        entry = self._value[index]
+        if type(entry) is tuple:
+            entry = self._decode_entry(index)
+        return entry
+
+    def _find(self, tag: int) -> Optional['TLV']:
+        """Return the first child with tag, decoding only that child of a lazy TLV."""
+        positions = self._tag_index().get(tag)
+        return self._child_at(positions[0]) if positions else None
+
+    def _append(self, item: 'TLV'):
+        entries = self._entries() if self._raw is not None else self._children()
+        if self._tags is not None:
+            self._tags.setdefault(item._tag, []).append(len(entries))
+        if self._names is not None:
+            self._names.setdefault(item.name_, []).append(len(entries))
+        entries.append(item)
+
+    def children_(self, key: Union[int, str]) -> List['TLV']:
+        """
+        Return all children with a tag, given as number or as 'x1F42', or
+        with a name like 'serial_number', in order.
+        """
+        if not self._constructed:
+            raise TypeError("Cannot access children of primitive TLV")
+        if isinstance(key, str) and key.startswith('x') and all(e in string.hexdigits for e in key[1:]):
+            key = int(key[1:], 16)
+        if isinstance(key, int):
+            return [self._child_at(index) for index in self._tag_index().get(key, ())]
+        return [self._value[index] for index in self._name_index().get(key, ())]
+
+    def __getstate__(self):
+        if self._raw is not None:
+            self._decode_all()  # Memoryviews and snapshots can't be pickled
+        return {slot: getattr(self, slot) for slot in TLV.__slots__
+                if slot not in ('_tags', '_names') and hasattr(self, slot)}
+
+    def __setstate__(self, state):
+        for slot in ('_raw', '_context', '_tags', '_names'):
+            object.__setattr__(self, slot, None)
+        for slot, value in state.items():
+            object.__setattr__(self, slot, value)
+
+    # </editor-fold>
+
     def __getattr__(self, key):
+        if key.startswith('_'):
+            # Slots that aren't set yet, e.g. during unpickling
+            raise AttributeError("{} object has no attribute {!r}".format(self.__class__.__name__, key))
         if self._constructed and key.startswith('x') and all(e in string.hexdigits for e in key[1:]):
             tag = int(key[1:], 16)
 
-            for item in self.value_:
-                if item.tag_ == tag:
-                    if item.constructed_:
-                        return item
-                    return item.value_
+            item = self._find(tag)
+            if item is None:
+                # Generate an implicit empty tag
+                item = TLV(tag_=tag, implicit_=True)
+                self._append(item)
 
-            # Generate an implicit empty tag
-            target = TLV(tag_=tag, implicit_=True)
-            self.value_.append(target)
-
-            return self.__getattr__(key)
+            if item.constructed_:
+                return item
+            return item.value_
 
         raise AttributeError("{} object has no attribute {!r}".format(self.__class__.__name__, key))
 
@@ -233,7 +381,7 @@ class TLV:
         if self._constructed:
             items = list(self.items_)
             if len(items) != len({e[0] for e in items}):
-                valstr = "value_={!r}".format(self.value_)
+                valstr = "value_={!r}".format(self._children())
             else:
                 for i, (k, v) in enumerate(items):
                     if isinstance(v, list) and all(isinstance(e, TLV) for e in v):
@@ -253,16 +401,14 @@ class TLV:
 
     @property
     def name_(self):
-        if self._type and self._type.name:
-            return self._type.name
-        return "x{:X}".format(self.tag_)
+        return self._info.name
 
     @property
     def items_(self):
         if not self._constructed:
             raise TypeError("Cannot access items_ of primitive TLV")
         retval = []
-        for v in self.value_:
+        for v in self._children():
             retval.append((v.name_, v.value_))
         return retval
 
@@ -279,35 +425,39 @@ class TLV:
             return super().__setattr__(key, value)
 
         if overwrite:
-            for item in self.value_:
-                if item.tag_ == tag:
-                    target = item
-                    target.value_ = value
-                    return
+            target = self._find(tag)
+            if target is not None:
+                target.value_ = value
+                return
 
         target = TLV(tag_=tag, value_=value)
-        self.value_.append(target)
+        self._append(target)
 
     def _serialize_value(self) -> bytes:
+        """Return the value of a primitive TLV."""
         if self._value is None:
             return b''
-
-        if not self._constructed:
-            if self._type:
-                return self._type.to_bytes(self._value)
-            else:
-                return self._value
-        else:
-            retval = bytearray()
-            for item in self._value:
-                retval.extend(item.serialize())
-            return bytes(retval)
+        data_type = self._info.data_type
+        if data_type:
+            return data_type.to_bytes(self._value)
+        return self._value
 
     @classmethod
-    def parse(cls: Type[TLVType], data: bytes, empty_tag: bool = False, dictionary: Optional[str] = None) \
-            -> Tuple[TLVType, bytes]:
-        pos = 0
+    def parse(cls: Type[TLVType], data: bytes, empty_tag: bool = False, dictionary: Optional[str] = None,
+              context: Optional[Mapping[str, Any]] = None) -> Tuple[TLVType, bytes]:
+        """
+        Parse one TLV from the start of data, return it and the remaining data.
+        context, e.g. a context.snapshot(), is entered for parsing.
+        """
+        data = bytes(data) if not isinstance(data, bytes) else data
+        with using_context(context):
+            retval, pos = cls.parse_from(memoryview(data), 0, empty_tag=empty_tag, dictionary=dictionary)
+        return retval, data[pos:]
 
+    @classmethod
+    def parse_from(cls: Type[TLVType], data: memoryview, pos: int, empty_tag: bool = False,
+                   dictionary: Optional[str] = None) -> Tuple[TLVType, int]:
+        """Parse one TLV from data starting at pos, return it and the position after it."""
         if empty_tag:
             tag_ = None
         else:
@@ -324,26 +474,97 @@ class TLV:
         else:
             retval = cls(tag_=tag_, value_=value_)
 
-        return retval, data[pos:]
+        return retval, pos
 
     def serialize(self) -> bytes:
-        d = self._serialize_value()
-
-        if self._implicit and len(d) == 0:
-            return b''
-
-        retval = bytearray()
+        plan = []
+        buffer = bytearray(self._measure(plan))
+        self._write(buffer, 0, iter(plan))
+        return bytes(buffer)
+
+    def _measure(self, plan: list) -> int:
+        """
+        First pass of the serialization: append the header of this TLV and
+        its descendants to plan, in the order _write() needs them, with their
+        value length and the value of primitive TLVs. Return the serialized
+        size.
+        """
+        index = len(plan)
+        plan.append(None)
+        data = None
+        if self._constructed:
+            raw = self._raw
+            copyable, table = self._copyable() if raw is not None else (False, None)
+            if copyable:
+                length = len(raw)
+            else:
+                length = 0
+                entries = self._entries() if raw is not None else self._value or ()
+                for position, item in enumerate(entries):
+                    if type(item) is tuple:
+                        if self._fits(table, item[1], item[2]):
+                            length += item[2] - item[1]
+                            continue
+                        # Malformed below, serialize it the way the eager parser would have parsed it
+                        item = self._decode_entry(position)
+                    length += item._measure(plan)
+        else:
+            data = self._serialize_value()
+            length = len(data)
+
+        if self._implicit and length == 0:
+            # Nothing is written, neither for this TLV nor for its implicit children
+            del plan[index + 1:]
+            plan[index] = (None, 0, None)
+            return 0
+        header = self._make_tlv_length(length)
         if isinstance(self._tag, int):
-            retval.extend(self._make_tlv_tag(self._tag))
-        retval.extend(self._make_tlv_length(len(d)))
-
-        return bytes(retval) + d
+            header = self._make_tlv_tag(self._tag) + header
+        plan[index] = (header, length, data)
+        return len(header) + length
+
+    def _write(self, buffer: Union[bytearray, memoryview], offset: int, plan: Iterator) -> int:
+        """Second pass of the serialization: write this TLV at offset, return the offset after it."""
+        header, length, data = next(plan)
+        if header is None:
+            return offset
+        end = offset + len(header)
+        buffer[offset:end] = header
+        offset = end
+
+        if data is not None:
+            buffer[offset:offset + length] = data
+            return offset + length
+        raw = self._raw
+        if raw is not None and self._value is None:
+            buffer[offset:offset + length] = raw
+            return offset + length
+        for item in self._value or ():
+            if type(item) is tuple:
+                buffer[offset:offset + item[2] - item[1]] = raw[item[1]:item[2]]
+                offset += item[2] - item[1]
+            else:
+                offset = item._write(buffer, offset, plan)
+        return offset
+
+    def serialized_size(self) -> int:
+        """Return len(self.serialize())."""
+        return self._measure([])
+
+    def serialize_into(self, buffer: Union[bytearray, memoryview], offset: int = 0) -> int:
+        """
+        Write the serialization to buffer at offset and return the offset after it.
+        The buffer must have serialized_size() bytes of room at offset.
+        """
+        plan = []
+        self._measure(plan)
+        return self._write(buffer, offset, iter(plan))
 
     def get_value(self, key, default=None):
-        for item in self.items_:
-            if item[0] == key:
-                return item[1]
-        return default
+        if not self._constructed:
+            raise TypeError("Cannot access items_ of primitive TLV")
+        positions = self._name_index().get(key)
+        return self._value[positions[0]].value_ if positions else default
 
 
 class TLVDataType:
@@ -361,17 +582,92 @@ class TLVDataType:
         raise NotImplementedError
 
 
+class TagInfo(NamedTuple):
+    """Description of a tag in a dictionary, shared by all TLVs with the tag."""
+    constructed: bool
+    class_: Optional[TLVClass]
+    data_type: Optional[TLVDataType]
+    name: Optional[str]
+
+
+class _TagTable(dict):
+    """TagInfo by tag for a dictionary and vendor quirk setting, filled on first use of a tag."""
+
+    def __init__(self, dictionary: str, feig_cvend: bool):
+        super().__init__()
+        self.dictionary = dictionary
+        self.feig_cvend = feig_cvend
+
+    def __missing__(self, tag: Optional[int]) -> TagInfo:
+        if tag is None:
+            info = TagInfo(True, None, None, None)
+        else:
+            t = tag
+            while t > 0xff:
+                t >>= 8
+            constructed = TLV._is_constructed(tag, self.feig_cvend)
+            data_type = None
+            if not constructed:
+                types = TLVDictionary[self.dictionary]
+                data_type = types.get(tag, types[None])
+            name = data_type.name if data_type and data_type.name else "x{:X}".format(tag)
+            info = TagInfo(constructed, TLVClass(t >> 6), data_type, name)
+        self[tag] = info
+        return info
+
+
 class _TLVDictionary(dict):
+    def __init__(self):
+        super().__init__()
+        self._tag_tables: Dict[Tuple[str, bool], _TagTable] = {}
+        # Changes whenever a dictionary is changed, which drops its tag tables
+        self.version = 0
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        self._changed(name)
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._changed(name)
+
+    def _changed(self, name):
+        self._tag_tables.pop((name, False), None)
+        self._tag_tables.pop((name, True), None)
+        self.version += 1
+
     def register(self, name, value):
         self[name] = value
 
     def child(self, name, parent, value):
-        self[name] = dict(self[parent])
-        self[name].update(value)
+        values = dict(self[parent])
+        values.update(value)
+        self[name] = values
+
+    def tag_table(self, name: str, feig_cvend: bool = False) -> _TagTable:
+        """Return the cached TagInfo table of a dictionary."""
+        table = self._tag_tables.get((name, feig_cvend))
+        if table is None:
+            table = self._tag_tables[(name, feig_cvend)] = _TagTable(name, feig_cvend)
+        return table
 
 
 TLVDictionary = _TLVDictionary()
 
+_context_tag_table = (None, -1, None)
+
+
+def _tag_table() -> _TagTable:
+    """Return the TagInfo table for the dictionary and vendor quirks of the current context."""
+    global _context_tag_table
+    context = snapshot()
+    cached_context, version, table = _context_tag_table
+    if cached_context is not context or version != TLVDictionary.version:
+        table = TLVDictionary.tag_table(context.get('tlv_dictionary', 'default'),
+                                        VendorQuirks.FEIG_CVEND in context.get('vendor_quirks', ()))
+        _context_tag_table = (context, TLVDictionary.version, table)
+    return table
+
 
 class BytesData(TLVDataType):
     def from_bytes(self, value: bytes) -> bytes:
@@ -0,0 +1,175 @@
+"""
+Path selectors for TLV trees.
+
+A path names tags from a container down, separated by '/', e.g. 'E4/1F42'
+for the serial number in the device information of a status enquiry. A step
+matches the first child with that tag. With a leading '*' it matches all of
+them, e.g. '23/*08' for all receipt numbers, and '*' alone matches every
+child. Tags are hex, optionally with the 'x' of the attribute access, e.g.
+'xE4/x1F42'.
+
+A path selects a single value, or a list of values if any step has a '*'.
+Primitive TLVs give their value_, constructed ones the TLV itself.
+
+TLVSelector compiles several paths and extracts them all in one walk, from a
+TLV or from its encoded bytes. Unlike attribute access, selecting never
+creates implicit tags. On bytes, only the selected values are decoded; on
+lazy TLVs (lazy_tlv=True in the context), only the children on the paths.
+"""
+import string
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+from .context import snapshot, using_context
+from .tlv import TLV
+from .types import VendorQuirks
+
+# A step is (tag, all), tag None for '*'
+Step = Tuple[Optional[int], bool]
+
+
+class _Node:
+    __slots__ = ('keys', 'children')
+
+    def __init__(self):
+        self.keys = []  # The paths that end at this step
+        self.children: Dict[Step, _Node] = {}
+
+
+class TLVPath:
+    """A compiled path, see the module docstring."""
+    __slots__ = ('path', 'steps', 'multiple', '_selector')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.steps = tuple(self._parse_step(path, step) for step in path.strip().strip('/').split('/'))
+        self.multiple = any(step[1] for step in self.steps)
+        self._selector = None
+
+    @staticmethod
+    def _parse_step(path: str, step: str) -> Step:
+        step = step.strip()
+        if step == '*':
+            return None, True
+        every = step.startswith('*')
+        if every:
+            step = step[1:]
+        if step[:1] in ('x', 'X'):
+            step = step[1:]
+        if not step or not all(e in string.hexdigits for e in step):
+            raise ValueError("Invalid TLV path {!r}".format(path))
+        return int(step, 16), every
+
+    def select(self, source: Union[TLV, bytes, bytearray, memoryview], default: Any = None,
+               empty_tag: bool = False, dictionary: Optional[str] = None,
+               context: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Return the value selected from source, or default if there is none.
+        For paths with '*' steps, return the list of values instead.
+        See TLVSelector.select() for the other arguments.
+        """
+        if self._selector is None:
+            self._selector = TLVSelector({None: self})
+        result = self._selector.select(source, empty_tag=empty_tag, dictionary=dictionary, context=context)[None]
+        return default if result is None else result
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.path)
+
+
+class TLVSelector:
+    """Several compiled paths, by key, that are selected in one walk."""
+
+    def __init__(self, paths: Mapping[Any, Union[str, TLVPath]]):
+        self.paths = {key: path if isinstance(path, TLVPath) else compile_path(path) for key, path in paths.items()}
+        self._root = _Node()
+        for key, path in self.paths.items():
+            node = self._root
+            for step in path.steps:
+                node = node.children.setdefault(step, _Node())
+            node.keys.append(key)
+
+    def select(self, source: Union[TLV, bytes, bytearray, memoryview], empty_tag: bool = False,
+               dictionary: Optional[str] = None, context: Optional[Mapping[str, Any]] = None) -> Dict[Any, Any]:
+        """
+        Return the values selected from source by key, None or an empty list
+        for paths without matches.
+
+        source is a TLV container or the encoding of one, which is read like
+        TLV.parse() with empty_tag, dictionary and context does.
+        """
+        results = {key: [] if path.multiple else None for key, path in self.paths.items()}
+        if isinstance(source, TLV):
+            if source.constructed_:
+                self._walk_tree(source, self._root, results)
+            return results
+
+        data = source if isinstance(source, memoryview) else memoryview(bytes(source))
+        with using_context(context):
+            feig_cvend = VendorQuirks.FEIG_CVEND in snapshot().get('vendor_quirks', ())
+            pos = 0
+            if not empty_tag:
+                tag, pos = TLV._read_tlv_tag(data, 0)
+                if not TLV._is_constructed(tag, feig_cvend):
+                    return results
+            length, pos = TLV._read_tlv_length(data, pos)
+            self._walk_raw(data, pos, pos + length, self._root, results, dictionary, feig_cvend)
+        return results
+
+    def _found(self, node: _Node, item: TLV, results: Dict[Any, Any]):
+        value = item if item.constructed_ else item.value_
+        for key in node.keys:
+            if self.paths[key].multiple:
+                results[key].append(value)
+            else:
+                results[key] = value
+
+    def _walk_tree(self, container: TLV, node: _Node, results: Dict[Any, Any]):
+        for (tag, every), child in node.children.items():
+            if tag is None:
+                positions = range(len(container._entries() if container._raw is not None else container._children()))
+            else:
+                positions = container._tag_index().get(tag, ())
+            for index in positions if every else positions[:1]:
+                item = container._child_at(index)
+                if child.keys:
+                    self._found(child, item, results)
+                if child.children and item.constructed_:
+                    self._walk_tree(item, child, results)
+
+    def _walk_raw(self, data: memoryview, pos: int, end: int, node: _Node, results: Dict[Any, Any],
+                  dictionary: Optional[str], feig_cvend: bool):
+        children = node.children
+        # Steps that match only the first child with their tag, the scan ends when all of them matched
+        pending = {step for step in children if not step[1]}
+        scan_all = len(pending) < len(children)
+        while pos < end and (scan_all or pending):
+            start = pos
+            tag, pos = TLV._read_tlv_tag(data, pos)
+            length, pos = TLV._read_tlv_length(data, pos)
+            value_end = pos + length
+            for step in ((tag, False), (tag, True), (None, True)):
+                child = children.get(step)
+                if child is None:
+                    continue
+                if not step[1]:
+                    if step not in pending:
+                        continue
+                    pending.discard(step)
+                if child.keys:
+                    item, _ = TLV.parse_from(data, start, dictionary=dictionary)
+                    self._found(child, item, results)
+                if child.children and TLV._is_constructed(tag, feig_cvend):
+                    self._walk_raw(data, pos, value_end, child, results, dictionary, feig_cvend)
+            pos = value_end
+
+
+@lru_cache(maxsize=256)
+def compile_path(path: str) -> TLVPath:
+    """Return the compiled path, compiled once per path string."""
+    return TLVPath(path)
+
+
+def select(source: Union[TLV, bytes, bytearray, memoryview], path: str, default: Any = None, **kwargs) -> Any:
+    """Shortcut for compile_path(path).select(source, default, **kwargs)."""
+    return compile_path(path).select(source, default, **kwargs)
@@ -0,0 +1,291 @@
+"""
+Streaming TLV reader and writer.
+
+TLVReader yields START, PRIMITIVE and END events for the TLVs in a
+memoryview or file-like object without building a tree, e.g. for file
+transfers with large 1C payloads. Values from memory are memoryviews of the
+source. Values from files are read into memory up to inline_limit bytes;
+larger ones are announced with value None and can be read in parts with
+read_value() before the next event.
+
+TLVWriter writes TLVs to a file-like object. A container is written directly
+if its length is given to start(); otherwise its children are collected in
+memory until end(). primitive_from() copies a value from a file in chunks,
+so with the lengths given nothing has to be held in memory. encoded_size()
+helps to compute the lengths of containers.
+"""
+import io
+from enum import Enum
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Union
+
+from .context import snapshot, using_context
+from .tlv import TLV
+from .types import VendorQuirks
+
+#: Bytes read from files at once
+READ_SIZE = 65536
+
+
+class TLVEventType(Enum):
+    START = 'start'
+    PRIMITIVE = 'primitive'
+    END = 'end'
+
+
+class TLVEvent(NamedTuple):
+    type: TLVEventType
+    tag: Optional[int]
+    length: int
+    depth: int
+    value: Optional[Union[bytes, memoryview]] = None
+
+
+class _MemoryInput:
+    def __init__(self, data: memoryview):
+        self._data = data
+        self.pos = 0
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self._data)
+
+    def read_byte(self) -> int:
+        if self.pos >= len(self._data):
+            raise ValueError("Truncated TLV data")
+        self.pos += 1
+        return self._data[self.pos - 1]
+
+    def read(self, size: int) -> memoryview:
+        if self.pos + size > len(self._data):
+            raise ValueError("Truncated TLV data")
+        self.pos += size
+        return self._data[self.pos - size:self.pos]
+
+    def read_some(self, size: int) -> memoryview:
+        return self.read(min(size, len(self._data) - self.pos))
+
+
+class _StreamInput:
+    def __init__(self, stream: BinaryIO, read_size: int):
+        self._stream = stream
+        self._read_size = read_size
+        self._buffer = b''
+        self._offset = 0
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Read more data if the buffer is used up, return whether there is any."""
+        if self._offset < len(self._buffer):
+            return True
+        self._buffer = self._stream.read(self._read_size) or b''
+        self._offset = 0
+        return bool(self._buffer)
+
+    def at_end(self) -> bool:
+        return not self._fill()
+
+    def read_byte(self) -> int:
+        if not self._fill():
+            raise ValueError("Truncated TLV data")
+        self._offset += 1
+        self.pos += 1
+        return self._buffer[self._offset - 1]
+
+    def read_some(self, size: int) -> bytes:
+        """Read up to size bytes, at least one unless the stream ended."""
+        if not size or not self._fill():
+            return b''
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        self.pos += len(data)
+        return data
+
+    def read(self, size: int) -> bytes:
+        parts = []
+        while size:
+            data = self.read_some(size)
+            if not data:
+                raise ValueError("Truncated TLV data")
+            parts.append(data)
+            size -= len(data)
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+
+class TLVReader:
+    """
+    Iterate over the TLV events in source. With empty_tag, source is a
+    single container without tag, as in a TLV field, otherwise a sequence of
+    TLVs. context, e.g. a context.snapshot(), decides about vendor quirks.
+    """
+
+    def __init__(self, source: Union[bytes, bytearray, memoryview, BinaryIO], empty_tag: bool = False,
+                 inline_limit: int = READ_SIZE, read_size: int = READ_SIZE, context=None):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._input = _MemoryInput(memoryview(source))
+        else:
+            self._input = _StreamInput(source, read_size)
+        self._empty_tag = empty_tag
+        self._inline_limit = inline_limit
+        with using_context(context):
+            self._feig_cvend = VendorQuirks.FEIG_CVEND in snapshot().get('vendor_quirks', ())
+        # Bytes of the current value that haven't been read yet
+        self._pending = 0
+
+    def _read_tag(self) -> int:
+        read_byte = self._input.read_byte
+        tag = read_byte()
+        if tag & 0x1f == 0x1f:
+            b = read_byte()
+            while b & 0x80:
+                tag = (tag << 8) | b
+                b = read_byte()
+            tag = (tag << 8) | b
+        return tag
+
+    def _read_length(self) -> int:
+        length = self._input.read_byte()
+        if length & 0x80:
+            ll = length & 0x7f
+            length = 0
+            for _ in range(ll):
+                length = (length << 8) | self._input.read_byte()
+        return length
+
+    def read_value(self, size: int = -1) -> bytes:
+        """
+        Read up to size bytes, or everything, of the value of the current
+        PRIMITIVE event that had value None. Returns b'' at the end of it.
+        """
+        if size < 0 or size > self._pending:
+            size = self._pending
+        data = bytes(self._input.read(size))
+        self._pending -= len(data)
+        return data
+
+    def __iter__(self) -> Iterator[TLVEvent]:
+        inp = self._input
+        # (tag, end position) of the open containers
+        open_tags: List[tuple] = []
+        first = True
+        while True:
+            while self._pending:
+                skipped = len(inp.read_some(self._pending))
+                if not skipped:
+                    raise ValueError("Truncated TLV data")
+                self._pending -= skipped
+            while open_tags and inp.pos >= open_tags[-1][1]:
+                tag, end = open_tags.pop()
+                if inp.pos > end:
+                    raise ValueError("TLV exceeds its container")
+                yield TLVEvent(TLVEventType.END, tag, 0, len(open_tags))
+            if not first and self._empty_tag and not open_tags:
+                return
+            if not open_tags and inp.at_end():
+                return
+
+            if first and self._empty_tag:
+                tag = None
+            else:
+                tag = self._read_tag()
+            first = False
+            length = self._read_length()
+            if open_tags and inp.pos + length > open_tags[-1][1]:
+                raise ValueError("TLV exceeds its container")
+
+            if tag is None or TLV._is_constructed(tag, self._feig_cvend):
+                yield TLVEvent(TLVEventType.START, tag, length, len(open_tags))
+                open_tags.append((tag, inp.pos + length))
+            elif length <= self._inline_limit or isinstance(inp, _MemoryInput):
+                yield TLVEvent(TLVEventType.PRIMITIVE, tag, length, len(open_tags), inp.read(length))
+            else:
+                self._pending = length
+                yield TLVEvent(TLVEventType.PRIMITIVE, tag, length, len(open_tags))
+
+
+class _Container:
+    __slots__ = ('tag', 'length', 'written', 'buffer')
+
+    def __init__(self, tag: Optional[int], length: Optional[int]):
+        self.tag = tag
+        self.length = length
+        self.written = 0
+        self.buffer = io.BytesIO() if length is None else None
+
+
+class TLVWriter:
+    """Write TLVs to stream, see the module docstring."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._open: List[_Container] = []
+
+    @staticmethod
+    def header(tag: Optional[int], length: int) -> bytes:
+        """Return the encoded tag and length. tag None is a container without tag."""
+        length = TLV._make_tlv_length(length)
+        return length if tag is None else TLV._make_tlv_tag(tag) + length
+
+    @classmethod
+    def encoded_size(cls, tag: Optional[int], length: int) -> int:
+        """Return the size of a TLV with a value of length bytes."""
+        return len(cls.header(tag, length)) + length
+
+    def _write(self, data: Union[bytes, memoryview]):
+        stream = self._stream
+        for container in reversed(self._open):
+            if container.buffer is not None:
+                stream = container.buffer
+                break
+            container.written += len(data)
+        stream.write(data)
+
+    def start(self, tag: Optional[int], length: Optional[int] = None):
+        """Start a container with length bytes of children, or of unknown length."""
+        if length is not None:
+            self._write(self.header(tag, length))
+        self._open.append(_Container(tag, length))
+
+    def end(self):
+        """End the innermost container."""
+        container = self._open.pop()
+        if container.buffer is not None:
+            value = container.buffer.getbuffer()
+            self._write(self.header(container.tag, len(value)))
+            self._write(value)
+        elif container.written != container.length:
+            raise ValueError("Container {} has {} bytes instead of {}".format(
+                self._name(container.tag), container.written, container.length))
+
+    def primitive(self, tag: int, value: Union[bytes, bytearray, memoryview]):
+        self._write(self.header(tag, len(value)))
+        self._write(value)
+
+    def primitive_from(self, tag: int, source: BinaryIO, length: int, read_size: int = READ_SIZE):
+        """Write a primitive TLV with the next length bytes of source as value, in chunks of read_size."""
+        self._write(self.header(tag, length))
+        while length:
+            data = source.read(min(read_size, length))
+            if not data:
+                raise ValueError("Source ended {} bytes before the end of the value of {}".format(
+                    length, self._name(tag)))
+            self._write(data)
+            length -= len(data)
+
+    def write(self, tlv: TLV):
+        """Write a complete TLV."""
+        self._write(tlv.serialize())
+
+    def close(self):
+        """Check that all containers are ended. The stream is not closed."""
+        if self._open:
+            raise ValueError("Container {} is not ended".format(self._name(self._open[-1].tag)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+    @staticmethod
+    def _name(tag: Optional[int]) -> str:
+        return 'without tag' if tag is None else 'x{:X}'.format(tag)
@@ -53,6 +53,26 @@ class CharacterSet(IntEnum):
     ZVT_8BIT = CP437 = DEFAULT = 0xff
 
 
+class BaudRate(IntEnumRepr):
+    """Baud rate codes of Change Baudrate (08 40)."""
+    BAUD_9600 = 0x00
+    BAUD_19200 = 0x01
+    BAUD_38400 = 0x02
+    BAUD_57600 = 0x03
+    BAUD_115200 = 0x04
+
+    @property
+    def rate(self) -> int:
+        return int(self.name[5:])
+
+    @classmethod
+    def from_rate(cls, rate: int) -> 'BaudRate':
+        try:
+            return cls['BAUD_{}'.format(int(rate))]
+        except KeyError:
+            raise ValueError("Unsupported baud rate {}".format(rate)) from None
+
+
 class VendorQuirks(Enum):
     FEIG_CVEND = auto()
 
@@ -1,7 +1,9 @@
-from ecrterm.packets.apdu import CommandAPDU, ParseError
+import copy
+from ecrterm.packets.apdu import APDU, CommandAPDU, ParseError
 from ecrterm.packets.fields import ByteField, BytesField, BCDIntField
+from ecrterm.packets.tlv import TLV
 from ecrterm.packets.base_packets import LogOff, Initialisation, Registration, DisplayText, PrintLine, Authorisation, \
-    WriteFiles, OpenReservationsEnquiry
+    WriteFiles, OpenReservationsEnquiry, Packet, PacketReceived, PacketReceivedError
 from unittest import TestCase, main
 
 
@@ -28,6 +30,9 @@ class TestAPDUParser(TestCase):
     def test_parse_error(self):
         self.assertRaises(ParseError, CommandAPDU.parse, bytearray.fromhex('06020322F0E0'))
 
+    def test_parse_unallowed_bitmap(self):
+        self.assertRaises(AttributeError, CommandAPDU.parse, bytearray.fromhex('06e0020501'))
+
     def test_parse_cursed_completion(self):
         c1 = CommandAPDU.parse(bytearray.fromhex('060f07F0F0F3626c6100'))
         self.assertEqual(0x00, c1.terminal_status)
@@ -65,6 +70,72 @@ class TestAPDUSerializer(TestCase):
         c = Registration('987654', config_byte=0x41)
         self.assertEqual(bytearray.fromhex('06000498765441'), c.serialize())
 
+    def test_serialize_into(self):
+        packets = (
+            lambda: Authorisation(amount=123, tlv={0xf2: {0xc1: b'\x12\x23'}}),
+            lambda: Authorisation(amount=1, tlv={0x1f10: b'\xaa' * 300}),
+            lambda: Registration('987654', config_byte=0x41),
+            lambda: DisplayText(display_duration=5, line1='Hello', line2='World'),
+            lambda: LogOff(),
+        )
+        for make in packets:
+            expected = make().serialize()
+
+            # Measured and written field by field
+            c = make()
+            buffer = bytearray(b'\xff' * (len(expected) + 2))
+            self.assertEqual(len(expected), c.serialized_size())
+            self.assertEqual(len(buffer) - 1, c.serialize_into(memoryview(buffer), 1))
+            self.assertEqual(b'\xff' + expected + b'\xff', buffer)
+            self.assertIsNone(c._serialized)
+
+            # From the cached serialization
+            c.serialize()
+            buffer = bytearray(len(expected))
+            self.assertEqual(len(expected), c.serialized_size())
+            c.serialize_into(buffer)
+            self.assertEqual(expected, buffer)
+
+    def test_serialize_cache(self):
+        c = Registration('987654', config_byte=0x41)
+
+        self.assertIs(c.serialize(), c.serialize())
+
+        c.config_byte = 0x42
+        self.assertEqual(bytes.fromhex('06000498765442'), c.serialize())
+        c.service_byte = 0x01
+        self.assertEqual(bytes.fromhex('060006987654420301'), c.serialize())
+        del c.service_byte
+        self.assertEqual(bytes.fromhex('06000498765442'), c.serialize())
+        c.cmd_instr = 0x01
+        self.assertEqual(bytes.fromhex('06010498765442'), c.serialize())
+
+    def test_serialize_cache_tlv(self):
+        c = Authorisation()
+
+        self.assertEqual(bytes.fromhex('060100'), c.serialize())
+        c.tlv.xf2.xc1 = b'\x12\x23'
+        self.assertEqual(bytes.fromhex('0601080606f204c1021223'), c.serialize())
+        c.tlv.xf2.xc1 = b'\x12\x24'
+        self.assertEqual(bytes.fromhex('0601080606f204c1021224'), c.serialize())
+
+        self.assertIsNone(c._serialized)
+
+        # Changes to a list of children that was fetched before serializing
+        children = c.tlv.xf2.value_
+        children.append(TLV(tag_=0xc2, value_=b'\x01'))
+        self.assertEqual(bytes.fromhex('06010b0609f207c1021224c20101'), c.serialize())
+        children.pop(0)
+        self.assertEqual(bytes.fromhex('0601070605f203c20101'), c.serialize())
+
+    def test_serialize_constant(self):
+        self.assertIs(PacketReceived().serialize(), PacketReceived().serialize())
+        self.assertEqual(bytes.fromhex('800000'), PacketReceived().serialize())
+
+        c = PacketReceived()
+        c.control_field[1] = 0x01
+        self.assertEqual(bytes.fromhex('800100'), c.serialize())
+
 
 class TestInvalidAPDUs(TestCase):
     def test_required_after_optional(self):
@@ -83,6 +154,41 @@ class TestInvalidAPDUs(TestCase):
         self.assertRaises(ValueError, construct_class)
 
 
+class TestAPDUDispatch(TestCase):
+    @staticmethod
+    def linear_scan(cls, data):
+        for clazz in cls._iterate_subclasses():
+            if clazz.can_parse(data) and clazz is not cls:
+                return clazz
+        return None
+
+    def test_dispatch_matches_linear_scan(self):
+        known = {0x00, 0x9c, 0xfe} | {
+            v for clazz in APDU._iterate_subclasses()
+            for v in (getattr(clazz, 'CMD_CLASS', None), getattr(clazz, 'CMD_INSTR', None)) if isinstance(v, int)
+        }
+        for root in (APDU, CommandAPDU, Packet):
+            for cmd_class in known:
+                for cmd_instr in known:
+                    data = bytes([cmd_class, cmd_instr, 0])
+                    self.assertIs(self.linear_scan(root, data), root._find_subclass(data))
+
+    def test_dispatch_wildcard(self):
+        self.assertIsInstance(CommandAPDU.parse(bytes.fromhex('849c00')), PacketReceivedError)
+
+    def test_dispatch_custom_can_parse(self):
+        self.assertNotIsInstance(CommandAPDU.parse(bytes.fromhex('081400')), WriteFiles)
+
+    def test_dispatch_new_subclass(self):
+        self.assertNotIsInstance(CommandAPDU.parse(bytes.fromhex('fe0100')), LogOff)
+
+        class LateLogOff(LogOff):
+            CMD_CLASS = 0xfe
+            CMD_INSTR = 0x01
+
+        self.assertIsInstance(CommandAPDU.parse(bytes.fromhex('fe0100')), LateLogOff)
+
+
 class DummyPacket(CommandAPDU):
     CMD_CLASS = 0xff
     CMD_INSTR = 0xaa
@@ -93,6 +199,17 @@ class DummyPacket(CommandAPDU):
     }
 
 
+class DummyPacketWithDict(CommandAPDU):
+    __slots__ = ('__dict__',)
+
+    CMD_CLASS = 0xff
+    CMD_INSTR = 0xab
+
+
+class DownstreamRegistration(Registration):
+    pass
+
+
 class TestAPDUBitmaps(TestCase):
     def test_simple_create_serialize(self):
         c = Registration('777777', 0xa0, cc='0978')
@@ -174,6 +291,45 @@ class TestAPDUBitmaps(TestCase):
         self.assertIsInstance(c.raw_tlv, bytes)
         self.assertEqual(b'\x02\xff\xaa', c.raw_tlv)
 
+    def test_bitmap_index_is_shared(self):
+        a, b = Registration('123456'), Registration('654321')
+
+        self.assertFalse(hasattr(a, '__dict__'))
+        self.assertIs(a._KNOWN_BITMAPS, b._KNOWN_BITMAPS)
+        self.assertEqual(0x06, Registration._BITMAP_KEYS['tlv'])
+        self.assertEqual(0x06, DummyPacket._BITMAP_KEYS['raw_tlv'])
+        self.assertNotIn('tlv', DummyPacket._BITMAP_KEYS)
+        with self.assertRaises(TypeError):
+            Registration._KNOWN_BITMAPS[0x06] = None
+
+    def test_slots(self):
+        c = Registration('123456')
+
+        self.assertFalse(hasattr(c, '__dict__'))
+        self.assertIsNone(c.completion)
+        self.assertIsNone(c.response_listener)
+        self.assertRaises(AttributeError, setattr, c, 'foo', 1)
+
+        c = DummyPacketWithDict()
+        c.foo = 1
+
+        self.assertEqual(1, c.foo)
+        self.assertEqual([0xff, 0xab], c.control_field)
+
+        # Subclasses outside of the library don't have to declare __slots__
+        c = DownstreamRegistration('123456')
+        c.foo = 1
+
+        self.assertEqual(1, c.foo)
+        self.assertEqual(c.serialize(), copy.deepcopy(c).serialize())
+        self.assertEqual(1, copy.deepcopy(c).foo)
+
+    def test_private_attributes_are_not_bitmaps(self):
+        c = Registration('123456')
+
+        self.assertRaises(AttributeError, lambda: c._foo)
+        self.assertNotIn('_foo', c._bitmaps)
+
     def test_write_file_apdu(self):
         c = WriteFiles(password='000000',
                        files={
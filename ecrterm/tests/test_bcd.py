@@ -0,0 +1,59 @@
+from unittest import TestCase, main
+
+from ecrterm.packets import bcd
+from ecrterm.packets.fields import BCDField, BCDIntField, BCDVariableLengthField
+
+
+class TestBCD(TestCase):
+    def test_tables(self):
+        for b in range(256):
+            self.assertEqual(bytes([b]).hex(), bcd.DIGITS[b])
+            if bcd.VALUES[b] is not None:
+                self.assertEqual(int(bcd.DIGITS[b]), bcd.VALUES[b])
+                self.assertEqual(bytes([b]), bcd.BYTES[bcd.VALUES[b]])
+        self.assertEqual(100, len([v for v in bcd.VALUES if v is not None]))
+
+    def test_decode(self):
+        self.assertEqual('12', bcd.decode(b'\x12'))
+        self.assertEqual('001234', bcd.decode([0x00, 0x12, 0x34]))
+        self.assertEqual('ffff', bcd.decode(memoryview(b'\xff\xff')))
+        self.assertEqual('', bcd.decode(b''))
+
+    def test_decode_int(self):
+        self.assertEqual(12, bcd.decode_int(b'\x12'))
+        self.assertEqual(1234, bcd.decode_int(memoryview(b'\x00\x12\x34')))
+        self.assertRaises(ValueError, bcd.decode_int, b'\x1f')
+        self.assertRaises(ValueError, bcd.decode_int, b'\x00\xff')
+
+    def test_encode(self):
+        self.assertEqual(b'\x01\x23', bcd.encode('123'))
+        self.assertEqual(b'\xff\xff', bcd.encode('FFff'))
+        for invalid in ('12g4', '12 4', ' 123', '1234 ', 'ä1'):
+            self.assertRaises(ValueError, bcd.encode, invalid)
+
+    def test_encode_int(self):
+        self.assertEqual(b'\x99', bcd.encode_int(99, 1))
+        self.assertEqual(b'\x00\x01\x00\x23', bcd.encode_int(10023, 4))
+        self.assertRaises(ValueError, bcd.encode_int, 100, 1)
+        self.assertRaises(ValueError, bcd.encode_int, -1, 1)
+        self.assertRaises(ValueError, bcd.encode_int, -1, 3)
+
+    def test_batch(self):
+        data = b'\x06\x00\x00\x00\x01\x23\x45\x00\x12\x12\x31'
+
+        self.assertEqual(['000000012345', '0012', '1231'], bcd.decode_many(data, [6, 2, 2], 1))
+        self.assertEqual([12345, 12, 1231], bcd.decode_int_many(data, [6, 2, 2], 1))
+        self.assertRaises(ValueError, bcd.decode_int_many, b'\x12\xff', [1, 1])
+
+    def test_fields(self):
+        self.assertEqual('ffff', BCDField(length=2).parse(b'\xff\xff')[0])
+        self.assertEqual(b'\xff\xff', BCDField(length=2).serialize('FFFF'))
+        self.assertRaises(ValueError, BCDField(length=2).serialize, '123')
+        self.assertRaises(ValueError, BCDField(length=2).serialize, '12x4')
+        self.assertEqual(b'\x01\x23', BCDVariableLengthField().to_bytes('123'))
+        self.assertRaises(ValueError, BCDIntField(length=2).parse, b'\xff\xff')
+        self.assertRaises(ValueError, BCDIntField(length=2).serialize, 12345)
+
+
+if __name__ == '__main__':
+    main()
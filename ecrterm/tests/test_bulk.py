@@ -0,0 +1,116 @@
+import io
+import pickle
+from unittest import TestCase, main
+
+from ecrterm.bulk import SERIAL, TCP, as_record, parse_frames
+from ecrterm.conv import toBytes
+from ecrterm.ecr import parse_represented_data
+from ecrterm.packets.base_packets import Completion, Packet, Registration
+from ecrterm.packets.types import VendorQuirks
+from ecrterm.tests.test_framing import serial_frame
+from ecrterm.tests.test_parsing import TestParsingMechanisms
+
+FRAMES = [bytes(toBytes(packet)) for packet in TestParsingMechanisms.PACKET_LIST]
+BROKEN = bytes.fromhex('060201ff')
+
+
+class TestBulkParsing(TestCase):
+    def assertParsed(self, frames, results):
+        results = list(results)
+        self.assertEqual(list(range(len(frames))), [result.index for result in results])
+        for frame, result in zip(frames, results):
+            self.assertEqual(frame, result.frame)
+            self.assertIsNone(result.error)
+            self.assertEqual(repr(Packet.parse(frame)), repr(result.packet))
+
+    def test_bytes_and_hex(self):
+        self.assertParsed(FRAMES, parse_frames(TestParsingMechanisms.PACKET_LIST))
+        self.assertParsed(FRAMES, parse_frames(FRAMES))
+
+    def test_text_file(self):
+        self.assertParsed(FRAMES, parse_frames(io.StringIO('\n'.join(TestParsingMechanisms.PACKET_LIST) + '\n\n')))
+
+    def test_binary_file(self):
+        self.assertParsed(FRAMES, parse_frames(io.BytesIO(b''.join(FRAMES)), framing=TCP))
+
+        capture = b''.join(b'\x06' + serial_frame(frame) for frame in FRAMES)
+        self.assertParsed(FRAMES, parse_frames(io.BytesIO(capture), framing=SERIAL))
+
+        self.assertRaises(ValueError, list, parse_frames(io.BytesIO(capture)))
+
+    def test_serial_frames(self):
+        self.assertParsed(FRAMES[:2], parse_frames([serial_frame(FRAMES[0]), b'\x06', FRAMES[1], b'\x15']))
+
+    def test_errors(self):
+        results = list(parse_frames([FRAMES[0], BROKEN, FRAMES[1]]))
+
+        self.assertIn('Invalid bitmap 0xFF', results[1].error)
+        self.assertIsNone(results[1].packet)
+        self.assertEqual(BROKEN, results[1].frame)
+        self.assertParsed([FRAMES[1]], [results[2]._replace(index=0)])
+
+        results = list(parse_frames(io.BytesIO(serial_frame(FRAMES[0])[:-3]), framing=SERIAL))
+
+        self.assertEqual(['FramingError: Incomplete frame at the end of the data'], [r.error for r in results])
+
+    def test_crc_errors(self):
+        frame = serial_frame(FRAMES[0])
+        broken = frame[:-1] + bytes([frame[-1] ^ 0xff])
+
+        for results in (parse_frames([broken, serial_frame(FRAMES[1])]),
+                        parse_frames(io.BytesIO(broken + serial_frame(FRAMES[1])), framing=SERIAL)):
+            results = list(results)
+            self.assertEqual('FramingError: CRC mismatch', results[0].error)
+            self.assertIsNone(results[0].packet)
+            self.assertEqual(FRAMES[0], results[0].frame)
+            self.assertParsed([FRAMES[1]], [results[1]._replace(index=0)])
+
+    def test_records(self):
+        record = as_record(parse_represented_data('06 0F 11 19 00 29 52 00 12 33 49 09 78 06 05 27 03 14 01 FF'))
+
+        self.assertEqual('Completion', record['type'])
+        self.assertEqual('52001233', record['tid'])
+        self.assertEqual(0xff, record['tlv.x27.character_set'])
+
+        results = list(parse_frames(FRAMES, records=True))
+        self.assertEqual([as_record(Packet.parse(frame)) for frame in FRAMES], [r.packet for r in results])
+
+    def test_context(self):
+        frame = bytes.fromhex('061e086c06051f1702c384')
+
+        plain, = parse_frames([frame])
+        feig, = parse_frames([frame], context={'vendor_quirks': {VendorQuirks.FEIG_CVEND}})
+        pooled = list(parse_frames([frame] * 2, processes=2, context={'vendor_quirks': {VendorQuirks.FEIG_CVEND}}))
+
+        self.assertEqual('├ä', plain.packet.tlv.x1f17)
+        self.assertEqual('Ä', feig.packet.tlv.x1f17)
+        self.assertEqual(['Ä', 'Ä'], [r.packet.tlv.x1f17 for r in pooled])
+
+    def test_process_pool(self):
+        frames = (FRAMES + [BROKEN]) * 5
+
+        results = list(parse_frames(frames, processes=2, chunksize=3))
+        serial = list(parse_frames(frames))
+
+        self.assertEqual([r.index for r in serial], [r.index for r in results])
+        self.assertEqual([r.error for r in serial], [r.error for r in results])
+        self.assertEqual([repr(r.packet) for r in serial], [repr(r.packet) for r in results])
+
+    def test_pickle(self):
+        for frame in FRAMES:
+            packet = Packet.parse(frame)
+            copy = pickle.loads(pickle.dumps(packet))
+
+            self.assertEqual(repr(packet), repr(copy))
+            self.assertEqual(packet.serialize(), copy.serialize())
+
+        packet = Registration('123456', 0xba)
+        packet.completion = Completion()
+        copy = pickle.loads(pickle.dumps(packet))
+
+        self.assertIsInstance(copy.completion, Completion)
+        self.assertEqual([0x06, 0x00], copy.control_field)
+
+
+if __name__ == '__main__':
+    main()
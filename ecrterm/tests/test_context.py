@@ -1,8 +1,12 @@
+import asyncio
 import threading
 import time
 from unittest import TestCase, main
 
-from ecrterm.packets.context import enter_context, GlobalContext, CurrentContext
+from ecrterm.packets.base_packets import Packet
+from ecrterm.packets.context import enter_context, GlobalContext, CurrentContext, snapshot
+from ecrterm.packets.tlv import TLV
+from ecrterm.packets.types import CharacterSet, VendorQuirks
 
 
 class TestContext(TestCase):
@@ -95,6 +99,75 @@ class TestContext(TestCase):
         self.assertEqual(1, GlobalContext['test_threads'])
         self.assertEqual(1, CurrentContext['test_threads'])
 
+    def test_asyncio_tasks(self):
+        async def task(arg):
+            with enter_context(test_asyncio_tasks=arg):
+                await asyncio.sleep(0.01)
+                return CurrentContext['test_asyncio_tasks']
+
+        async def run():
+            return await asyncio.gather(*(task(i) for i in range(3)))
+
+        self.assertEqual([0, 1, 2], asyncio.run(run()))
+        self.assertRaises(KeyError, lambda: CurrentContext['test_asyncio_tasks'])
+
+    def test_asyncio_tasks_write(self):
+        # The tasks inherit the context of the main thread, and must not change it for each other
+        CurrentContext.get('test_asyncio_tasks_write')
+        started = []
+
+        async def task(arg):
+            CurrentContext['test_asyncio_tasks_write'] = arg
+            started.append(arg)
+            while len(started) < 2:
+                await asyncio.sleep(0.001)
+            return CurrentContext['test_asyncio_tasks_write']
+
+        async def run():
+            return await asyncio.gather(task('A'), task('B'))
+
+        self.assertEqual(['A', 'B'], asyncio.run(run()))
+        self.assertRaises(KeyError, lambda: CurrentContext['test_asyncio_tasks_write'])
+
+    def test_snapshot(self):
+        with enter_context(test_snapshot=1):
+            first = snapshot()
+            self.assertIs(first, snapshot())
+            self.assertEqual(1, first['test_snapshot'])
+
+            CurrentContext['test_snapshot'] = 2
+            GlobalContext['test_snapshot_global'] = 3
+            second = snapshot()
+
+            self.assertEqual(1, first['test_snapshot'])
+            self.assertNotIn('test_snapshot_global', first)
+            self.assertEqual((2, 3), (second['test_snapshot'], second['test_snapshot_global']))
+            with self.assertRaises(TypeError):
+                second['test_snapshot'] = 4
+        del GlobalContext['test_snapshot_global']
+
+    def test_decorator(self):
+        @enter_context(test_decorator=1)
+        def fun(depth):
+            return CurrentContext['test_decorator'] if depth == 0 else fun(depth - 1)
+
+        self.assertEqual(1, fun(2))
+        self.assertRaises(KeyError, lambda: CurrentContext['test_decorator'])
+
+    def test_explicit_parse_context(self):
+        frame = bytes.fromhex('061e086c06051f1702c384')
+        with enter_context(vendor_quirks={VendorQuirks.FEIG_CVEND}):
+            context = snapshot()
+
+        self.assertEqual('├ä', Packet.parse(frame).tlv.x1f17)
+        self.assertEqual('Ä', Packet.parse(frame, context=context).tlv.x1f17)
+        self.assertEqual('Ä', Packet.parse(frame, context={'vendor_quirks': {VendorQuirks.FEIG_CVEND}}).tlv.x1f17)
+
+        data = bytes.fromhex('07240507036162e1')
+        self.assertEqual('ab\u00df', TLV.parse(data, empty_tag=True, dictionary='zvt')[0].x24.x07)
+        latin_1 = {'character_set': CharacterSet.LATIN_1}
+        self.assertEqual('ab\u00e1', TLV.parse(data, empty_tag=True, dictionary='zvt', context=latin_1)[0].x24.x07)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,47 @@
+from unittest import TestCase, main
+
+from ecrterm.crc import CRC16, TABLE_XMODEM16, codetable, crc_checksum, crc_xmodem16
+from ecrterm.transmission.signals import ETX
+from ecrterm.transmission.transport_serial import SerialMessage
+
+
+class TestCRC(TestCase):
+    def test_check_values(self):
+        # CRC-16/KERMIT and CRC-16/ARC
+        self.assertEqual(0x2189, crc_xmodem16(b'123456789'))
+        self.assertEqual(0x2189, crc_checksum('123456789'))
+        self.assertEqual(0xbb3d, crc_checksum(b'123456789', poly=0xa001))
+        self.assertEqual(0, crc_xmodem16(b''))
+
+    def test_codetable(self):
+        self.assertEqual(tuple(TABLE_XMODEM16), codetable(0x8408))
+        self.assertIs(codetable(0xa001), codetable(0xa001))
+
+    def test_incremental(self):
+        data = bytes(range(256)) * 3
+        for poly in (0x8408, 0xa001):
+            expected = CRC16(data, poly)
+            crc = CRC16(poly=poly)
+            for i in range(0, len(data), 7):
+                crc.update(memoryview(data)[i:i + 7])
+
+            self.assertEqual(expected.value, crc.value)
+            self.assertEqual(expected.digest(), crc.digest())
+            self.assertEqual(bytes([crc.value & 0xff, crc.value >> 8]), crc.digest())
+
+        copy = crc.copy()
+        copy.update(b'\x00')
+        self.assertNotEqual(copy.value, crc.value)
+
+    def test_serial_message(self):
+        apdu = bytes.fromhex('060f101019000000')
+        message = SerialMessage(apdu)
+        expected = CRC16(apdu + bytes([ETX])).digest()
+
+        self.assertEqual(expected, message.crc())
+        message.apdu = b'\x80\x00\x00'
+        self.assertEqual(CRC16(b'\x80\x00\x00' + bytes([ETX])).digest(), message.crc())
+
+
+if __name__ == '__main__':
+    main()
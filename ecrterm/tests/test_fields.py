@@ -1,7 +1,8 @@
 from unittest import TestCase, main
+from unittest.mock import patch
 
 from ecrterm.packets.fields import IntField, Endianness, ByteField, BEIntField, BCDIntField, PasswordField, LVARField, \
-    StringField, LLLStringField, LLLVARField, TLVField, BytesField
+    StringField, LLLStringField, LLLVARField, TLVField, BytesField, Field
 from ecrterm.packets.tlv import TLV
 
 
@@ -16,6 +17,8 @@ class TestFields(TestCase):
         self.assertEqual(ifield.to_bytes(3, length=1), b'\x03')
         self.assertEqual(ifield.to_bytes(256, length=2), b'\x01\x00')
         self.assertEqual(ifield.to_bytes(256, length=3), b'\x00\x01\x00')
+        self.assertRaises(ValueError, ifield.to_bytes, 256, length=1)
+        self.assertRaises(ValueError, ifield.to_bytes, -1, length=1)
 
     def test_intfield_le(self):
         ifield = IntField()
@@ -122,6 +125,40 @@ class TestFields(TestCase):
 
         # FIXME With more tags
 
+    def test_parse_from(self):
+        data = memoryview(b'\xF2ab\x12\x34\x56\x07')
+
+        value, offset = LVARField().parse_from(data, 0)
+        self.assertEqual((b'ab', 3), (value, offset))
+        self.assertIsInstance(value, bytes)
+
+        self.assertEqual(('123456', 6), PasswordField().parse_from(data, offset))
+        self.assertEqual((7, 7), ByteField().parse_from(data, 6))
+        self.assertEqual((b'\x56\x07', 7), BytesField().parse_from(data, 5))
+
+    def test_parse_from_legacy_parse(self):
+        class LegacyField(Field):
+            def parse(self, data):
+                return data[:1], data[1:]
+
+        self.assertEqual((b'b', 2), LegacyField().parse_from(memoryview(b'abc'), 1))
+
+    def test_serialize_into(self):
+        for field, value in (
+                (ByteField(), 5),
+                (BCDIntField(length=3), 123),
+                (PasswordField(), '123456'),
+                (LLLStringField(), 'abc'),
+                (BytesField(), b'\x01\x02'),
+                (TLVField(), TLV(x1=b'\xaa', x2=b'')),
+        ):
+            expected = field.serialize(value)
+            buffer = bytearray(b'\xff' * (len(expected) + 3))
+
+            self.assertEqual(len(expected), field.serialized_size(value))
+            self.assertEqual(2 + len(expected), field.serialize_into(memoryview(buffer), 2, value))
+            self.assertEqual(b'\xff\xff' + expected + b'\xff', buffer)
+
     def test_coercion(self):
         self.assertIsInstance(TLVField().coerce([]), TLV)
         self.assertIsInstance(TLVField().coerce(TLV(tag_=None, value_=[])).value_, list)
@@ -138,6 +175,24 @@ class TestFields(TestCase):
         self.assertRaises(ValueError, pf.validate, '123')
         self.assertRaises(ValueError, pf.validate, '12345678')
 
+        class EvenField(BEIntField):
+            LENGTH = 2
+
+            def validate(self, data: int) -> None:
+                super().validate(data)
+                if data % 2:
+                    raise ValueError("Must be even")
+
+        self.assertEqual(b'\x00\x02', EvenField().serialize(2))
+        self.assertRaises(ValueError, EvenField().serialize, 3)
+
+    def test_serialize_encodes_once(self):
+        field = BCDIntField(length=3)
+        with patch.object(BCDIntField, 'to_bytes', wraps=field.to_bytes) as to_bytes:
+            self.assertEqual(b'\x00\x12\x34', field.serialize(1234))
+            self.assertRaises(ValueError, field.serialize, 10 ** 6)
+        self.assertEqual(2, to_bytes.call_count)
+
 
 if __name__ == '__main__':
     main()
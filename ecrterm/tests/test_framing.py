@@ -0,0 +1,191 @@
+import random
+from socket import socketpair
+from unittest import TestCase, main
+
+from ecrterm.ecr import dismantle_serial_packet
+from ecrterm.exceptions import TransportLayerException
+from ecrterm.transmission import framing
+from ecrterm.transmission.framing import (
+    Ack, Frame, FramingError, Nak, SerialFrameDecoder, TCPFrameDecoder, serial_crc, serial_frame_into,
+    serial_frame_size, stuff_dle)
+from ecrterm.transmission.signals import ACK, DLE, ETX, NAK, STX
+from ecrterm.transmission.transport_serial import SerialMessage
+from ecrterm.transmission.transport_socket import SocketTransport
+
+
+def serial_frame(apdu: bytes) -> bytes:
+    message = SerialMessage(apdu)
+    return bytes([DLE, STX]) + apdu.replace(bytes([DLE]), bytes([DLE, DLE])) + bytes([DLE, ETX]) + message.crc()
+
+
+class TestSerialFrameDecoder(TestCase):
+    APDU = bytes.fromhex('060f101019000000')
+
+    def feed_bytewise(self, data: bytes):
+        decoder = SerialFrameDecoder()
+        events = []
+        for i in range(len(data)):
+            events.extend(decoder.feed(data[i:i + 1]))
+        return events
+
+    def test_frame(self):
+        data = serial_frame(self.APDU)
+
+        self.assertEqual([Frame(self.APDU)], SerialFrameDecoder().feed(data))
+        self.assertEqual([Frame(self.APDU)], self.feed_bytewise(data))
+
+    def test_several_frames_in_one_chunk(self):
+        data = bytes([ACK]) + serial_frame(self.APDU) + serial_frame(b'\x80\x00\x00') + bytes([NAK])
+
+        self.assertEqual([Ack(), Frame(self.APDU), Frame(b'\x80\x00\x00'), Nak()], SerialFrameDecoder().feed(data))
+
+    def test_partial_frame(self):
+        decoder = SerialFrameDecoder()
+        data = serial_frame(self.APDU)
+
+        self.assertEqual([], decoder.feed(data[:5]))
+        self.assertTrue(decoder.in_frame)
+        self.assertEqual([Frame(self.APDU)], decoder.feed(data[5:]))
+        self.assertFalse(decoder.in_frame)
+
+    def test_crc_error(self):
+        data = bytearray(serial_frame(self.APDU))
+        data[-1] ^= 0xff
+
+        self.assertEqual([Frame(self.APDU, crc_ok=False)], SerialFrameDecoder().feed(data))
+
+    def test_garbage(self):
+        data = b'\x00\x01' + serial_frame(self.APDU)
+
+        self.assertEqual([FramingError('Unexpected data outside of frame', b'\x00\x01'), Frame(self.APDU)],
+                         SerialFrameDecoder().feed(data))
+
+    def test_header_error(self):
+        events = SerialFrameDecoder().feed(bytes([DLE, ACK]))
+
+        self.assertEqual([FramingError('Header Error: 1006'), Ack()], events)
+
+    def test_dle_without_sense(self):
+        data = bytes([DLE, STX, 0x06, DLE, 0x0f]) + serial_frame(self.APDU)
+
+        self.assertEqual([FramingError('DLE without sense detected.', b'\x06'), Frame(self.APDU)],
+                         self.feed_bytewise(data))
+
+    def test_reset(self):
+        decoder = SerialFrameDecoder()
+        data = serial_frame(self.APDU)
+
+        decoder.feed(data[:5])
+        decoder.reset()
+
+        self.assertFalse(decoder.in_frame)
+        self.assertEqual([Frame(self.APDU)], decoder.feed(data))
+
+
+class TestSerialFrameEncoder(TestCase):
+    def test_serial_frame_into(self):
+        for apdu in (b'\x80\x00\x00', b'\x10\x10\x02\x10', bytes.fromhex('060f101019000010')):
+            expected = serial_frame(apdu)
+            buffer = bytearray(len(expected) + 2)
+
+            self.assertEqual(len(expected), serial_frame_size(apdu))
+            self.assertEqual(1 + len(expected), serial_frame_into(memoryview(buffer), 1, apdu))
+            self.assertEqual(b'\x00' + expected + b'\x00', buffer)
+            self.assertEqual([Frame(apdu)], SerialFrameDecoder().feed(buffer[1:-1]))
+
+
+def former_read(frame: bytes):
+    """The byte at a time loop the serial transport read frames with before."""
+    data = iter(frame[2:])
+    apdu = bytearray()
+    dle = False
+    for b in data:
+        if b == ETX and dle:
+            return bytes(apdu), bytes([next(data), next(data)])
+        elif b == DLE:
+            if not dle:
+                dle = True
+                continue
+            dle = False
+        apdu.append(b)
+
+
+class TestSerialCodec(TestCase):
+    def setUp(self):
+        rnd = random.Random(23)
+        self.apdus = [b'', b'\x10', b'\x10\x10\x03', bytes.fromhex('060f101019000010')] + [
+            bytes(rnd.choice((DLE, ETX, STX, rnd.randrange(256))) for _ in range(rnd.randrange(300)))
+            for _ in range(50)]
+
+    def test_identical(self):
+        for apdu in self.apdus:
+            frame = serial_frame(apdu)
+
+            self.assertEqual(apdu.replace(bytes([DLE]), bytes([DLE, DLE])), stuff_dle(memoryview(apdu)))
+            self.assertEqual(frame, framing.serial_frame(apdu))
+            self.assertEqual(SerialMessage(apdu).crc(), serial_crc(apdu))
+            self.assertEqual(former_read(frame)[::-1], dismantle_serial_packet(list(frame)))
+            self.assertEqual([Frame(apdu)], SerialFrameDecoder().feed(memoryview(frame)))
+
+    def test_decode(self):
+        frame = serial_frame(self.apdus[3])
+        # A wrong CRC is returned for the caller to check
+        self.assertEqual((b'\x00\x00', self.apdus[3]), dismantle_serial_packet(frame[:-2] + b'\x00\x00'))
+
+        for data, message in (
+                (b'', 'No Header'),
+                (b'\x06\x10\x02', 'No Header'),
+                (b'\x10\x06\x02', 'Header Error: 1006'),
+                (frame[:-4], 'Frame without DLE ETX'),
+                (frame[:-1], 'Frame without CRC'),
+                (bytes([DLE, STX, 0x01, DLE, 0x02]), 'DLE without sense detected.')):
+            with self.assertRaises(TransportLayerException) as cm:
+                dismantle_serial_packet(data)
+            self.assertEqual(message, str(cm.exception))
+
+
+class TestTCPFrameDecoder(TestCase):
+    SHORT = bytes.fromhex('060f0319001a')
+    LONG = bytes.fromhex('06d3ff0401') + bytes(range(256)) + b'\xaa\xbb\xcc\xdd'
+
+    def test_frames(self):
+        decoder = TCPFrameDecoder()
+
+        self.assertEqual([Frame(self.SHORT), Frame(b'\x80\x00\x00'), Frame(self.LONG)],
+                         decoder.feed(self.SHORT + b'\x80\x00\x00' + self.LONG))
+        self.assertFalse(decoder.in_frame)
+
+    def test_chunks(self):
+        decoder = TCPFrameDecoder()
+        events = []
+        data = self.LONG + self.SHORT
+
+        self.assertEqual(3, decoder.bytes_needed)
+        for i in range(len(data)):
+            events.extend(decoder.feed(data[i:i + 1]))
+            if i == 2:
+                self.assertEqual(2, decoder.bytes_needed)
+            elif i == 4:
+                self.assertEqual(len(self.LONG) - 5, decoder.bytes_needed)
+
+        self.assertEqual([Frame(self.LONG), Frame(self.SHORT)], events)
+
+    def test_socket_transport(self):
+        a, b = socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        transport = SocketTransport('socket://localhost:20007')
+        transport.sock = a
+
+        b.sendall(self.SHORT + b'\x80\x00\x00' + self.LONG[:10])
+
+        self.assertEqual((True, self.SHORT), transport.receive(timeout=1))
+        self.assertEqual((True, b'\x80\x00\x00'), transport.receive(timeout=1))
+
+        b.sendall(self.LONG[10:])
+
+        self.assertEqual((True, self.LONG), transport.receive(timeout=1))
+
+
+if __name__ == '__main__':
+    main()
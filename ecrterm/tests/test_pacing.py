@@ -0,0 +1,123 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ecrterm.transmission import pacing
+from ecrterm.transmission.pacing import AdaptivePacing, FixedPacing, Pacing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class TestPacing(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch.multiple(pacing, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def command(self, pacer: Pacing, ok=True, duration=0.5):
+        pacer.before_command()
+        self.clock.now += duration
+        pacer.after_command(ok)
+
+    def test_none(self):
+        pacer = Pacing()
+        for ok in (True, False):
+            self.command(pacer, ok)
+        pacer.after_reset()
+        pacer.between_polls()
+
+        self.assertEqual([], self.clock.sleeps)
+        self.assertEqual({'commands': 2, 'failures': 1, 'waited': 0.0, 'last_wait': 0.0}, pacer.stats())
+
+    def test_fixed(self):
+        pacer = FixedPacing()
+        self.command(pacer)
+        pacer.after_reset()
+        pacer.between_polls()
+
+        self.assertEqual([0.2, 1.0, 2.0], self.clock.sleeps)
+        self.assertAlmostEqual(3.2, pacer.waited)
+
+    def test_adaptive_defaults(self):
+        pacer = AdaptivePacing()
+        self.command(pacer)
+        self.command(pacer)
+        pacer.after_reset()
+        self.command(pacer)
+
+        # The delays of FixedPacing at first, the gap shrinks from there
+        self.assertEqual([0.18, 1.0], self.clock.sleeps)
+        for _ in range(50):
+            self.command(pacer)
+        self.assertLess(pacer.gap, 0.01)
+
+    def test_adaptive(self):
+        pacer = AdaptivePacing(initial=0.0)
+        self.command(pacer)
+        self.command(pacer)
+        self.assertEqual([], self.clock.sleeps)
+
+        # Too early for the PT
+        self.command(pacer, ok=False)
+        self.assertEqual(0.05, pacer.gap)
+
+        # The next command waits the gap, fails again, and the gap is doubled
+        self.command(pacer, ok=False)
+        self.assertEqual([0.05], self.clock.sleeps)
+        self.assertAlmostEqual(0.1, pacer.gap)
+
+        # Time that passed anyway isn't waited again
+        self.clock.now += 0.08
+        self.command(pacer)
+        self.assertEqual([0.05, 0.02], self.clock.sleeps)
+        self.assertAlmostEqual(0.09, pacer.gap)
+
+        for _ in range(100):
+            self.command(pacer)
+        self.assertLess(pacer.gap, 0.001)
+        self.assertEqual({'commands': 105, 'failures': 2}, {k: pacer.stats()[k] for k in ('commands', 'failures')})
+
+    def test_adaptive_limits(self):
+        pacer = AdaptivePacing(initial=0.0, minimum=0.1, maximum=0.3)
+        self.command(pacer, ok=False)
+        self.assertEqual(0.0, pacer.gap)  # No command before this one
+
+        for _ in range(5):
+            self.command(pacer, ok=False)
+        self.assertEqual(0.3, pacer.gap)
+
+        # A failure after a long pause isn't caused by pacing
+        self.command(pacer)
+        self.clock.now += 10
+        self.command(pacer, ok=False)
+        self.assertAlmostEqual(0.27, pacer.gap)
+
+        for _ in range(50):
+            self.command(pacer)
+        self.assertEqual(0.1, pacer.gap)
+
+    def test_adaptive_hold(self):
+        pacer = AdaptivePacing()
+        self.command(pacer)
+        pacer.after_reset()
+        self.clock.now += 0.25
+        pacer.between_polls()
+        self.command(pacer)
+
+        self.assertEqual([0.75], self.clock.sleeps)
+        self.assertEqual(0.75, pacer.last_wait)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@ from unittest import TestCase, main
 
 from ecrterm.common import TERMINAL_STATUS_CODES
 from ecrterm.ecr import parse_represented_data
-from ecrterm.packets.base_packets import Completion
+from ecrterm.packets.apdu import ParseHints
+from ecrterm.packets.base_packets import Completion, Packet, Registration, StatusEnquiry
+from ecrterm.packets.types import ServiceByte
+from ecrterm.transmission._transmission import Transmission
 
 
 class TestParsingCompletion(TestCase):
@@ -22,5 +25,68 @@ class TestParsingCompletion(TestCase):
         self.assertEqual(TERMINAL_STATUS_CODES.get(parsed.terminal_status), 'PT ready')
 
 
+class TestParsingCompletionWithHints(TestCase):
+    def setUp(self):
+        ParseHints.fallbacks.clear()
+
+    def test_status_enquiry_with_sw_version(self):
+        hints = StatusEnquiry('123456').parse_hints()
+        parsed = Packet.parse(bytes.fromhex('060f09F0F0F3626c61060600'), hints)
+
+        self.assertEqual('bla', parsed.sw_version)
+        self.assertEqual(0x06, parsed.terminal_status)
+        self.assertIn('tlv', parsed.as_dict())
+        self.assertEqual(0, ParseHints.fallbacks['Completion'])
+
+    def test_status_enquiry_without_sw_version(self):
+        hints = StatusEnquiry('123456', service_byte=ServiceByte.STATUS_ENQUIRY_DO_NOT_SEND_SW_VERSION).parse_hints()
+        parsed = Packet.parse(bytes.fromhex('060f03F00600'), hints)
+
+        self.assertIsNone(parsed.sw_version)
+        self.assertEqual(0xF0, parsed.terminal_status)
+        self.assertIn('tlv', parsed.as_dict())
+        self.assertEqual(0, ParseHints.fallbacks['Completion'])
+
+    def test_registration(self):
+        hints = Registration('123456', 0xba).parse_hints()
+        parsed = Packet.parse(bytes.fromhex('060f0d190029520012334909780600'), hints)
+
+        self.assertIsNone(parsed.sw_version)
+        self.assertIsNone(parsed.terminal_status)
+        self.assertEqual('52001233', parsed.tid)
+        self.assertEqual(0, ParseHints.fallbacks['Completion'])
+
+    def test_fallback(self):
+        # The PT sends the software version although it was told not to
+        hints = StatusEnquiry('123456', service_byte=ServiceByte.STATUS_ENQUIRY_DO_NOT_SEND_SW_VERSION).parse_hints()
+        parsed = Packet.parse(bytes.fromhex('060f07F0F0F3626c6100'), hints)
+
+        self.assertEqual('bla', parsed.sw_version)
+        self.assertEqual(0x00, parsed.terminal_status)
+        self.assertEqual(1, ParseHints.fallbacks['Completion'])
+
+    def test_hints_do_not_touch_request(self):
+        packet = Registration('123456', 0xba)
+        packet.parse_hints()
+
+        self.assertNotIn('service_byte', packet.as_dict())
+
+    def test_transmission_passes_hints(self):
+        class FakeTransport:
+            def send(self, data, *args, **kwargs):
+                return True, bytes.fromhex('060f03F00600')
+
+            def receive(self, *args, **kwargs):
+                raise AssertionError('Unexpected receive')
+
+        transmission = Transmission(FakeTransport())
+        transmission.send_received = lambda: None
+        packet = StatusEnquiry('123456', service_byte=ServiceByte.STATUS_ENQUIRY_DO_NOT_SEND_SW_VERSION)
+        transmission.transmit(packet)
+
+        self.assertEqual(0xF0, packet.completion.terminal_status)
+        self.assertEqual(0, ParseHints.fallbacks['Completion'])
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,94 @@
+import linecache
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ecrterm.ecr import parse_represented_data
+from ecrterm.packets import plans
+from ecrterm.packets.apdu import CommandAPDU
+from ecrterm.packets.base_packets import Authorisation, DisplayText, Registration
+from ecrterm.packets.fields import BCDIntField, BEIntField, ByteField, FlagByteField, LLLStringField
+from ecrterm.packets.types import ConfigByte
+from ecrterm.tests.test_parsing import TestParsingMechanisms
+
+
+class FixedRunPacket(CommandAPDU):
+    CMD_CLASS = 0xff
+    CMD_INSTR = 0xac
+
+    status = ByteField()
+    config_byte = FlagByteField(data_type=ConfigByte)
+    length = BEIntField(length=2, required=False)
+    timeout = ByteField(required=False)
+
+
+class PlanSwitchMixin:
+    def setUp(self):
+        self._enabled, self._verify = plans.ENABLED, plans.VERIFY
+
+    def tearDown(self):
+        plans.ENABLED, plans.VERIFY = self._enabled, self._verify
+
+
+class TestPlans(PlanSwitchMixin, TestCase):
+    def parse_all(self):
+        return [parse_represented_data(packet) for packet in TestParsingMechanisms.PACKET_LIST]
+
+    def test_compiled_matches_generic(self):
+        plans.ENABLED = False
+        generic = self.parse_all()
+        plans.ENABLED = True
+        compiled = self.parse_all()
+
+        for a, b in zip(generic, compiled):
+            self.assertEqual(repr(a), repr(b))
+            self.assertEqual(a.serialize(), b.serialize())
+
+    def test_verify(self):
+        plans.VERIFY = True
+        for packet in self.parse_all():
+            packet.serialize()
+
+    def test_verify_detects_difference(self):
+        plans.VERIFY = True
+        c = Registration('123456', 0xba)
+
+        with patch.object(Registration, '_SERIALIZE_PLAN', lambda self: bytearray(b'\x00')):
+            self.assertRaises(AssertionError, c.serialize)
+
+    def test_serialize_fallback(self):
+        # Values that the inlined encoders don't handle go through Field.serialize()
+        self.assertRaises(ValueError, Authorisation(amount=10 ** 12).serialize)
+        self.assertRaises(ValueError, DisplayText(display_duration=256).serialize)
+
+    def test_fixed_run(self):
+        plans.VERIFY = True
+        self.assertIn('.pack(', ''.join(linecache.getlines(FixedRunPacket._SERIALIZE_PLAN.__code__.co_filename)))
+
+        for data in ('ffac0501ba01020a', 'ffac0401ba0102', 'ffac0201ba', 'ffac0101'):
+            packet = FixedRunPacket.parse(bytearray.fromhex(data))
+            self.assertEqual(data, packet.serialize().hex())
+
+        packet = FixedRunPacket.parse(bytearray.fromhex('ffac0501ba01020a'))
+        self.assertIsInstance(packet.config_byte, ConfigByte)
+        self.assertEqual((1, 0x0102, 10), (packet.status, packet.length, packet.timeout))
+
+        del packet.timeout
+        self.assertEqual('ffac0401ba0102', packet.serialize().hex())
+        packet.status = 256
+        self.assertRaises(ValueError, packet.serialize)
+
+
+class TestFieldPlans(TestCase):
+    def test_writer(self):
+        for field, value in (
+                (ByteField(), 5),
+                (BCDIntField(length=2), 123),
+                (LLLStringField(), 'abc'),
+        ):
+            data = bytearray()
+            plans.field_writer(field)(data, value)
+            self.assertEqual(field.serialize(value), data)
+
+
+if __name__ == '__main__':
+    main()
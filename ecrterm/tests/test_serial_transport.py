@@ -0,0 +1,294 @@
+import os
+import termios
+from select import select
+from threading import Thread
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import serial
+
+from ecrterm.ecr import ECR
+from ecrterm.exceptions import TransportLayerException, TransportTimeoutException
+from ecrterm.packets.base_packets import ChangeBaudrate
+from ecrterm.packets.types import BaudRate
+from ecrterm.transmission import framing
+from ecrterm.transmission.framing import Frame, SerialFrameDecoder
+from ecrterm.transmission.pacing import AdaptivePacing
+from ecrterm.transmission.signals import ACK, DLE, ETX, NAK, STX, TIMEOUT_T1
+from ecrterm.transmission.transport_serial import SerialMessage, SerialTransport
+
+
+def serial_frame(apdu: bytes) -> bytes:
+    return (bytes([DLE, STX]) + apdu.replace(bytes([DLE]), bytes([DLE, DLE])) + bytes([DLE, ETX]) +
+            SerialMessage(apdu).crc())
+
+
+class FakeSerial:
+    """
+    A serial port that receives the given chunks one after the other, then
+    times out. A chunk is waiting once a read has started on it.
+    """
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = list(chunks)
+        self.timeout = 30
+        self.timeouts = []
+        self.reads = 0
+        self.written = b''
+        self.started = False
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks and self.started else 0
+
+    def read(self, size=1):
+        self.reads += 1
+        self.timeouts.append(self.timeout)
+        if not self.chunks:
+            return b''
+        data, self.chunks[0] = self.chunks[0][:size], self.chunks[0][size:]
+        self.started = bool(self.chunks[0])
+        if not self.started:
+            self.chunks.pop(0)
+        return data
+
+    def write(self, data):
+        self.written += bytes(data)
+
+
+class TestSerialTransport(TestCase):
+    APDU = bytes.fromhex('060f101019001003')
+
+    def transport(self, *chunks: bytes) -> SerialTransport:
+        transport = SerialTransport('/dev/null')
+        transport.connection = FakeSerial(*chunks)
+        return transport
+
+    def test_read(self):
+        frame = serial_frame(self.APDU)
+        for size in (1, 3, len(frame)):
+            transport = self.transport(*[frame[i:i + size] for i in range(0, len(frame), size)])
+
+            self.assertEqual((frame[-2:], self.APDU), transport.read())
+            self.assertFalse(transport._decoder.in_frame)
+            self.assertFalse(transport._events)
+
+    def test_chunked_reads(self):
+        apdu = bytes(range(256)) * 4
+        transport = self.transport(serial_frame(apdu))
+
+        self.assertEqual(apdu, transport.read()[1])
+        # One byte to wait for data, then everything that is waiting
+        self.assertEqual(2, transport.connection.reads)
+
+    def test_leftover(self):
+        second = bytes.fromhex('80000000')
+        data = serial_frame(self.APDU) + serial_frame(second)
+        transport = self.transport(data[:5], data[5:-3], data[-3:])
+
+        self.assertEqual(self.APDU, transport.read()[1])
+        self.assertEqual(second, transport.read()[1])
+
+    def test_timeouts(self):
+        frame = serial_frame(self.APDU)
+        transport = self.transport(frame[:4], frame[4:])
+        transport.read(timeout=5)
+
+        self.assertEqual([5, 5, TIMEOUT_T1, TIMEOUT_T1], transport.connection.timeouts)
+
+        for data, message in (
+                (b'', 'Reading Header Timeout'),
+                (frame[:6], 'Timeout T1 reading stream.'),
+                (frame[:-1], 'Timeout T1 reading CRC'),
+                (bytes([DLE, STX, 0x01, DLE, 0x02]), 'DLE without sense detected.'),
+                (bytes([DLE, ACK]), 'Header Error: 1006'),
+                (bytes([ACK, DLE]), 'Unexpected ACK instead of a frame')):
+            transport = self.transport(data)
+            with self.assertRaises(TransportLayerException) as cm:
+                transport.read()
+            self.assertEqual(message, str(cm.exception))
+
+    def test_read_message(self):
+        frame = serial_frame(self.APDU)
+        transport = self.transport(frame, frame[:-1] + bytes([frame[-1] ^ 1]))
+
+        self.assertEqual((True, self.APDU), transport.read_message())
+        self.assertEqual((False, self.APDU), transport.read_message())
+        self.assertEqual(bytes([ACK]), transport.connection.written)
+
+        transport = self.transport(bytes([DLE, STX, 0x01]))
+        self.assertRaises(TransportLayerException, transport.read_message)
+        self.assertEqual(bytes([NAK]), transport.connection.written)
+
+    def test_read_message_crc(self):
+        frame = serial_frame(self.APDU)
+        transport = self.transport(*[frame[i:i + 3] for i in range(0, len(frame), 3)])
+
+        # The CRC is updated per chunk while receiving, not computed over the frame afterwards
+        with patch('ecrterm.transmission.transport_serial.CRC16', side_effect=AssertionError), \
+                patch.object(framing.CRC16, 'update', autospec=True, side_effect=framing.CRC16.update) as update:
+            self.assertEqual((True, self.APDU), transport.read_message())
+        self.assertLess(max(len(call.args[1]) for call in update.call_args_list), len(self.APDU))
+
+    def test_send_message(self):
+        # The answer arrives in the same chunk as the acknowledgement
+        transport = self.transport(bytes([ACK]) + serial_frame(self.APDU))
+
+        self.assertEqual((True, self.APDU), transport.send_message(bytes.fromhex('060f00')))
+        self.assertEqual(serial_frame(bytes.fromhex('060f00')) + bytes([ACK]), transport.connection.written)
+
+    def test_send_message_no_acknowledge(self):
+        transport = self.transport()
+
+        self.assertRaises(TransportTimeoutException, transport.send_message, bytes.fromhex('060f00'))
+        # The acknowledgement is awaited with T1, not the timeout of the connection
+        self.assertEqual({TIMEOUT_T1}, set(transport.connection.timeouts))
+
+
+class PtySerial(serial.Serial):
+    """A pty has no modem lines to set."""
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+
+class StandInTerminal(Thread):
+    """
+    A PT on the other side of a pty. It only understands frames that were sent
+    at its own baud rate, accepts Change Baudrate to rates, and switches to
+    the new rate unless follow is False.
+    """
+    RATES = {getattr(termios, 'B{}'.format(code.rate)): code.rate for code in BaudRate}
+
+    def __init__(self, rates=(9600, 19200, 115200), follow=True):
+        super().__init__(daemon=True)
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.rates = rates
+        self.follow = follow
+        self.rate = 9600
+        self.received = []  # (line rate, APDU)
+        self.running = True
+
+    def line_rate(self) -> int:
+        return self.RATES[termios.tcgetattr(self.slave)[4]]
+
+    def send(self, *apdus: bytes):
+        os.write(self.master, b''.join(framing.serial_frame(apdu) for apdu in apdus))
+
+    def handle(self, apdu: bytes):
+        if apdu[:2] == b'\x08\x40':
+            rate = BaudRate(apdu[3]).rate
+            if rate not in self.rates:
+                self.send(b'\x84\xfd\x00')
+                return
+            self.send(b'\x80\x00\x00')
+            if self.follow:
+                self.rate = rate
+        elif apdu[:2] == b'\x05\x01':
+            self.send(b'\x80\x00\x00', bytes.fromhex('060f07f0f0f3626c6100'))
+
+    def run(self):
+        decoder = SerialFrameDecoder()
+        while self.running:
+            if not select([self.master], [], [], 0.05)[0]:
+                continue
+            for event in decoder.feed(os.read(self.master, 4096)):
+                if isinstance(event, Frame):
+                    rate = self.line_rate()
+                    self.received.append((rate, event.apdu))
+                    if rate == self.rate:
+                        os.write(self.master, bytes([ACK]))
+                        self.handle(event.apdu)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class TestChangeBaudrate(TestCase):
+    def setUp(self):
+        self.ecrs = []
+        self.terminals = []
+
+    def tearDown(self):
+        for ecr in self.ecrs:
+            ecr.transport.close()
+        for terminal in self.terminals:
+            terminal.stop()
+
+    def terminal(self, *args, **kwargs) -> StandInTerminal:
+        terminal = StandInTerminal(*args, **kwargs)
+        terminal.start()
+        self.terminals.append(terminal)
+        return terminal
+
+    def ecr(self, device: str) -> ECR:
+        with patch.object(SerialTransport, 'SerialCls', PtySerial):
+            ecr = ECR(device)
+        self.ecrs.append(ecr)
+        return ecr
+
+    def test_packet(self):
+        self.assertEqual(bytes.fromhex('08400104'), ChangeBaudrate(baudrate=BaudRate.BAUD_115200).serialize())
+        self.assertEqual(BaudRate.BAUD_38400, BaudRate.from_rate(38400))
+        self.assertRaises(ValueError, BaudRate.from_rate, 12345)
+
+    def test_uri(self):
+        self.assertEqual(9600, SerialTransport('/dev/ttyUSB0').baudrate)
+        transport = SerialTransport('/dev/ttyUSB0?baudrate=115200')
+        self.assertEqual(('/dev/ttyUSB0', 115200), (transport.device, transport.baudrate))
+
+        terminal = self.terminal()
+        self.ecr(terminal.device + '?baudrate=19200')
+        self.assertEqual(19200, terminal.line_rate())
+
+    def test_change(self):
+        terminal = self.terminal()
+        ecr = self.ecr(terminal.device)
+
+        self.assertTrue(ecr.change_baudrate(115200))
+        self.assertEqual(115200, ecr.transport.connection.baudrate)
+        self.assertEqual(115200, terminal.rate)
+        self.assertEqual([(9600, bytes.fromhex('08400104')), (115200, bytes.fromhex('050103123456'))],
+                         terminal.received[:2])
+        self.assertIsNot(False, ecr.status())
+
+    def test_rejected(self):
+        terminal = self.terminal(rates=(9600,))
+        ecr = self.ecr(terminal.device)
+
+        with self.assertLogs('ecrterm.ecr', 'WARNING'):
+            self.assertFalse(ecr.change_baudrate(38400))
+        self.assertEqual(9600, ecr.transport.connection.baudrate)
+        self.assertIsNot(False, ecr.status())
+
+    def test_fallback(self):
+        # The PT accepts the rate, but stays at 9600
+        terminal = self.terminal(follow=False)
+        ecr = self.ecr(terminal.device)
+
+        with self.assertLogs('ecrterm.ecr', 'WARNING'):
+            self.assertFalse(ecr.change_baudrate(19200))
+        self.assertEqual(9600, ecr.transport.connection.baudrate)
+        self.assertIsInstance(ecr.pacing, AdaptivePacing)
+        self.assertEqual(1, ecr.pacing.failures)
+        self.assertIsNot(False, ecr.status())
+
+    def test_no_completion(self):
+        # A status enquiry that gets no Completion doesn't verify the rate
+        terminal = self.terminal()
+        ecr = self.ecr(terminal.device)
+
+        with patch.object(ecr, 'status', return_value=None), self.assertLogs('ecrterm.ecr', 'WARNING'):
+            self.assertFalse(ecr.change_baudrate(19200))
+        self.assertEqual(9600, ecr.transport.connection.baudrate)
+
+
+if __name__ == '__main__':
+    main()
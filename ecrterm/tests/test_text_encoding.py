@@ -0,0 +1,50 @@
+import codecs
+from unittest import TestCase, main
+
+from ecrterm.packets.base_packets import PrintLine
+from ecrterm.packets.context import enter_context
+from ecrterm.packets.text_encoding import (
+    ZVT_7BIT_CHARACTER_SET, ZVT_7BIT_CODEC, context_codec, decode, encode, get_codec)
+from ecrterm.packets.types import CharacterSet
+
+
+class TestTextEncoding(TestCase):
+    def test_zvt_7bit_codec(self):
+        self.assertEqual(b'Test [ \\ ] { | } ~ \x7f', 'Test Ä Ö Ü ä ö ü ß Δ'.encode('zvt-7bit'))
+        self.assertEqual('Test Ä ä', b'Test [ {'.decode('zvt_7bit'))
+        self.assertEqual('zvt-7bit', codecs.lookup('ZVT-7BIT').name)
+
+        for i in range(256):
+            self.assertEqual(ZVT_7BIT_CHARACTER_SET[i & 0x7f], decode(bytes([i]), ZVT_7BIT_CHARACTER_SET))
+        for i, c in enumerate(ZVT_7BIT_CHARACTER_SET):
+            self.assertEqual(bytes([i]), encode(c, ZVT_7BIT_CHARACTER_SET))
+
+        # The 7-bit set has no [ and no €
+        self.assertRaises(ValueError, encode, '€', ZVT_7BIT_CHARACTER_SET)
+        self.assertRaises(ValueError, encode, '[', ZVT_7BIT_CHARACTER_SET)
+
+    def test_codec_cache(self):
+        self.assertIs(get_codec(CharacterSet.LATIN_1), get_codec(CharacterSet.ISO_8859_1))
+        self.assertIs(ZVT_7BIT_CODEC, get_codec(ZVT_7BIT_CHARACTER_SET))
+        self.assertEqual('iso8859-15', get_codec(CharacterSet.LATIN_15).name)
+        self.assertEqual(b'a', encode('a€', CharacterSet.ISO_8859_1))
+        self.assertRaises(ValueError, get_codec, 'utf-8')
+        self.assertRaises(ValueError, get_codec, 1)
+
+    def test_context_codec(self):
+        self.assertEqual('cp437', context_codec().name)
+        with enter_context(character_set=CharacterSet.UTF8):
+            self.assertEqual('utf-8', context_codec().name)
+            with enter_context(character_set=CharacterSet.LATIN_1):
+                self.assertEqual('iso8859-1', context_codec().name)
+            self.assertEqual('utf-8', context_codec().name)
+
+    def test_print_line(self):
+        p = PrintLine(attribute=0, text='Ä')
+        with enter_context(character_set=ZVT_7BIT_CHARACTER_SET):
+            self.assertEqual(b'\x00[', p.serialize()[3:])
+            self.assertEqual('Ä', PrintLine.parse(p.serialize()).text)
+
+
+if __name__ == '__main__':
+    main()
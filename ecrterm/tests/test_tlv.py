@@ -1,6 +1,11 @@
+import pickle
 from unittest import TestCase
 
-from ecrterm.packets.tlv import TLV, TLVClass
+from ecrterm.packets import fields  # noqa: F401 registers the zvt dictionary
+from ecrterm.packets.base_packets import Packet
+from ecrterm.packets.context import enter_context
+from ecrterm.packets.tlv import BytesData, TagInfo, TLV, TLVClass, TLVDictionary
+from ecrterm.packets.types import VendorQuirks
 
 
 class TestTLV(TestCase):
@@ -89,12 +94,189 @@ class TestTLV(TestCase):
         t2.xfe.xfe.xfe.xfe.xfe.xfe.xde = b''
         self.assertEqual(b'\x0e\xfe\x0c\xfe\x0a\xfe\x08\xfe\x06\xfe\x04\xfe\x02\xde\x00', t2.serialize())
 
+    def test_parse_from(self):
+        data = memoryview(b'\xff\x20\x04\x01\x02\x03\x04\xff')
+
+        t, pos = TLV.parse_from(data, 1)
+
+        self.assertEqual(7, pos)
+        self.assertEqual(b'\x03\x04', t.x1)
+        self.assertIsInstance(t.x1, bytes)
+
     def test_null_coercion(self):
         a = TLV()
         b = TLV(a)
 
         self.assertIs(a, b)
 
+    def test_serialize_into(self):
+        t = TLV(tag_=0x3f20, x1=b'\xaa', x1f42=b'\xbb' * 300, x21={'x3': b''})
+        expected = t.serialize()
+        buffer = bytearray(len(expected) + 2)
+
+        self.assertEqual(len(expected), t.serialized_size())
+        self.assertEqual(1 + len(expected), t.serialize_into(buffer, 1))
+        self.assertEqual(b'\x00' + expected + b'\x00', buffer)
+        self.assertEqual(0, TLV(tag_=0x2, implicit_=True).serialized_size())
+
+    def test_serialize_nested(self):
+        t = TLV(tag_=0x06, value_=b'\xaa' * 200)
+        expected = b'\x06\x81\xc8' + b'\xaa' * 200
+        for _ in range(3):
+            t = TLV(tag_=0x3f20, value_=[t, TLV(tag_=0x20, implicit_=True), TLV(tag_=0x01, value_=b'')])
+            expected = b'\x3f\x20' + TLV._make_tlv_length(len(expected) + 2) + expected + b'\x01\x00'
+        # An implicit container of implicit containers is suppressed as a whole
+        t.x21.x22.x23
+
+        self.assertEqual(expected, t.serialize())
+        self.assertEqual(len(expected), t.serialized_size())
+        self.assertEqual(b'\x82\x01\x00', TLV._make_tlv_length(0x100))
+        self.assertEqual(b'\x1f\x42', TLV._make_tlv_tag(0x1f42))
+
+    def test_lazy(self):
+        # The long form length 81 03 isn't minimal, so re-encoding would change it
+        data = bytes.fromhex('3f20 0e 01 01 aa 21 81 03 02 01 bb 1f42 02 cc dd'.replace(' ', ''))
+
+        with enter_context(lazy_tlv=True):
+            t, rest = TLV.parse(data)
+
+        self.assertEqual(data, t.serialize())
+        self.assertEqual(len(data), t.serialized_size())
+        self.assertEqual(b'\xcc\xdd', t.x1f42)
+        self.assertEqual([tuple, tuple, TLV], [type(e) for e in t._value])
+        self.assertEqual(data, t.serialize())
+
+        t.x1 = b'\xee'
+        self.assertEqual([TLV, tuple, TLV], [type(e) for e in t._value])
+        self.assertEqual(data.replace(b'\xaa', b'\xee'), t.serialize())
+        buffer = bytearray(t.serialized_size())
+        t.serialize_into(buffer)
+        self.assertEqual(data.replace(b'\xaa', b'\xee'), buffer)
+
+        t.x5 = b'\x01'
+        self.assertEqual(b'\x01', t.x5)
+        self.assertEqual(b'\xbb', t.x21.x2)
+        self.assertEqual([(0x1, b'\xee'), (0x21, None), (0x1f42, b'\xcc\xdd'), (0x5, b'\x01')],
+                         [(e.tag_, None if e.constructed_ else e.value_) for e in t.value_])
+        self.assertIsNone(t._raw)
+
+    def test_lazy_equals_eager(self):
+        for data in (
+                '3f200d0101aa21030201bb1f4202ccdd',
+                # Children that run past the end of their parent are truncated
+                'fe05c10101c205',
+                'fe07e105c10101c205',
+                'fe070101aa21030100'):
+            data = bytes.fromhex(data)
+            eager = TLV.parse(data)[0]
+            with enter_context(lazy_tlv=True):
+                lazy = TLV.parse(data)[0]
+
+            self.assertEqual(eager.serialize(), lazy.serialize())
+            self.assertEqual(len(eager.serialize()), lazy.serialized_size())
+
+        frame = bytes.fromhex('060f090607fe05c10101c205')
+        with enter_context(lazy_tlv=True):
+            lazy = Packet.parse(frame)
+        self.assertEqual(bytes.fromhex('060f090607fe05c10101c200'), lazy.serialize())
+        self.assertEqual(Packet.parse(frame).serialize(), lazy.serialize())
+
+    def test_lazy_context(self):
+        data = bytes.fromhex('e404ff010142')
+        with enter_context(lazy_tlv=True, vendor_quirks={VendorQuirks.FEIG_CVEND}):
+            t, rest = TLV.parse(data)
+
+        # Decoded with the context of the parse
+        self.assertFalse(t.value_[0].constructed_)
+        self.assertEqual(b'\x42', t.xff01)
+        self.assertEqual(data, t.serialize())
+
+    def test_lazy_pickle(self):
+        with enter_context(lazy_tlv=True):
+            t, rest = TLV.parse(bytes.fromhex('e0050101012100'))
+
+        copy = pickle.loads(pickle.dumps(t))
+
+        self.assertEqual(t.serialize(), copy.serialize())
+        self.assertEqual(b'\x01', copy.x1)
+        self.assertIsNone(copy._raw)
+
+    def test_index(self):
+        t = TLV(value_=[(0x01, b'\x01'), (0x02, b'\x02'), (0x01, b'\x03')])
+
+        self.assertEqual([b'\x01', b'\x03'], [e.value_ for e in t.children_(0x01)])
+        self.assertEqual([b'\x02'], [e.value_ for e in t.children_('x2')])
+        self.assertEqual(b'\x01', t.x1)
+
+        t.append_('x1', b'\x04')
+        self.assertEqual([b'\x01', b'\x03', b'\x04'], [e.value_ for e in t.children_('x1')])
+        self.assertEqual(b'\x01', t.get_value('x1'))
+
+        self.assertIsNone(t.x3)
+        self.assertEqual(1, len(t.children_(0x03)))
+
+        t.value_.insert(0, TLV(tag_=0x03, value_=b'\x05'))
+        self.assertEqual(b'\x05', t.x3)
+        self.assertEqual(2, len(t.children_(0x03)))
+
+        t.value_ = {'x2': b'\x06'}
+        self.assertEqual([], t.children_(0x01))
+        self.assertEqual(b'\x06', t.x2)
+        self.assertIsNone(t.get_value('x1'))
+
+        self.assertRaises(TypeError, TLV(tag_=0x01, value_=b'').children_, 0x01)
+
+    def test_index_names(self):
+        with enter_context(tlv_dictionary='zvt'):
+            t = TLV(tag_=0x24, value_=[(0x07, b'Line 1'), (0x07, b'Line 2')])
+            t.append_('x7', b'Line 3')
+
+        self.assertEqual(['Line 1', 'Line 2', 'Line 3'], [e.value_ for e in t.children_('text_line')])
+        self.assertEqual('Line 1', t.get_value('text_line'))
+        self.assertEqual(3, len(t.children_(0x07)))
+
+    def test_index_lazy(self):
+        with enter_context(lazy_tlv=True):
+            t, rest = TLV.parse(bytes.fromhex('e00e0101012103020101020102020103'))
+
+        self.assertEqual(b'\x02', t.children_(0x02)[0].value_)
+        self.assertIsInstance(t._value[0], tuple)
+        t.append_('x2', b'\x04')
+        self.assertEqual([b'\x02', b'\x03', b'\x04'], [e.value_ for e in t.children_(0x02)])
+        self.assertEqual(bytes.fromhex('e0110101012103020101020102020103020104'), t.serialize())
+
+    def test_tag_info(self):
+        with enter_context(tlv_dictionary='zvt'):
+            a, b = TLV(tag_=0x1f42), TLV(tag_=0x1f42)
+
+        self.assertIs(a._info, b._info)
+        self.assertEqual(TagInfo(False, TLVClass.UNIVERSAL, TLVDictionary['zvt'][0x1f42], 'serial_number'), a._info)
+        self.assertEqual(TagInfo(True, TLVClass.PRIVATE, None, 'xE4'), TLV(tag_=0xe4)._info)
+        self.assertEqual(TagInfo(True, None, None, None), TLV()._info)
+        self.assertTrue(TLV(tag_=0xff01)._info.constructed)
+        with enter_context(vendor_quirks={VendorQuirks.FEIG_CVEND}):
+            self.assertFalse(TLV(tag_=0xff01)._info.constructed)
+
+    def test_tag_info_invalidation(self):
+        TLVDictionary.register('test', {None: BytesData(), 0x01: BytesData(name='one')})
+        try:
+            with enter_context(tlv_dictionary='test'):
+                self.assertEqual('one', TLV(tag_=0x01).name_)
+                TLVDictionary.register('test', {None: BytesData(), 0x01: BytesData(name='first')})
+                self.assertEqual('first', TLV(tag_=0x01).name_)
+                TLVDictionary.child('test', 'test', {0x02: BytesData(name='two')})
+                self.assertEqual('two', TLV(tag_=0x02).name_)
+                self.assertEqual('first', TLV(tag_=0x01).name_)
+        finally:
+            del TLVDictionary['test']
+
+    def test_slots(self):
+        t = TLV(x1=b'\xaa')
+
+        self.assertFalse(hasattr(t, '__dict__'))
+        self.assertFalse(hasattr(t.x1, '__dict__'))
+        self.assertRaises(AttributeError, setattr, t, 'foo', 1)
+
 
 class TestTLVRepr(TestCase):
     def setUp(self) -> None:
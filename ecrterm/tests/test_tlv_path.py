@@ -0,0 +1,73 @@
+from unittest import TestCase, main
+
+from ecrterm.packets.context import enter_context
+from ecrterm.packets.fields import TLVField
+from ecrterm.packets.tlv import TLV
+from ecrterm.packets.tlv_path import TLVPath, TLVSelector, compile_path, select
+from ecrterm.packets.types import VendorQuirks
+
+
+class TestTLVPath(TestCase):
+    def setUp(self):
+        # Device information, two receipt number lists and a primitive tag
+        self.data = bytes.fromhex(
+            '20 e4 0b 1f40 03 446576 1f42 02 1234 23 08 08 02 0001 08 02 0002 23 04 08 02 0003 01 01 aa'
+            .replace(' ', ''))
+        self.tlv = TLVField().parse(self.data)[0]
+
+    def test_compile(self):
+        self.assertEqual(((0xe4, False), (0x1f42, False)), TLVPath('E4/1F42').steps)
+        self.assertEqual(((0x23, False), (0x08, True)), TLVPath('x23/*x08').steps)
+        self.assertEqual(((None, True),), TLVPath('*').steps)
+        self.assertFalse(TLVPath('E4/1F42').multiple)
+        self.assertTrue(TLVPath('23/*08').multiple)
+        self.assertIs(compile_path('23/*08'), compile_path('23/*08'))
+        for invalid in ('', 'E4//1F42', 'E4/xyz', '**08'):
+            self.assertRaises(ValueError, TLVPath, invalid)
+
+    def test_select(self):
+        for source, kwargs in ((self.tlv, {}), (self.data, dict(empty_tag=True, dictionary='zvt'))):
+            self.assertEqual('1234', select(source, 'E4/1F42', **kwargs))
+            self.assertEqual(b'\xaa', select(source, '01', **kwargs))
+            self.assertEqual(['0001', '0002'], select(source, '23/*08', **kwargs))
+            self.assertEqual(['0001', '0003'], select(source, '*23/08', **kwargs))
+            self.assertEqual(['0001', '0002', '0003'], select(source, '*23/*08', **kwargs))
+            self.assertEqual(4, len(select(source, '*', **kwargs)))
+            self.assertEqual('Dev', select(source, 'E4', **kwargs).x1f40)
+            self.assertEqual('none', select(source, 'E4/1F41', 'none', **kwargs))
+            self.assertEqual([], select(source, '*99/*01', **kwargs))
+            self.assertIsNone(select(source, '01/02', **kwargs))
+
+    def test_selector(self):
+        selector = TLVSelector({'serial_number': 'E4/1F42', 'device_name': 'E4/1F40', 'receipts': '*23/*08'})
+        expected = {'serial_number': '1234', 'device_name': 'Dev', 'receipts': ['0001', '0002', '0003']}
+
+        self.assertEqual(expected, selector.select(self.tlv))
+        self.assertEqual(expected, selector.select(self.data, empty_tag=True, dictionary='zvt'))
+        self.assertEqual(expected, selector.select(b'\xe0' + self.data, dictionary='zvt'))
+
+    def test_no_side_effects(self):
+        before = self.tlv.serialize()
+
+        self.assertIsNone(select(self.tlv, 'E5/1F42'))
+        self.assertEqual(before, self.tlv.serialize())
+        self.assertEqual(4, len(self.tlv.value_))
+
+    def test_lazy(self):
+        with enter_context(lazy_tlv=True):
+            tlv = TLVField().parse(self.data)[0]
+
+        self.assertEqual('1234', select(tlv, 'E4/1F42'))
+        self.assertEqual([TLV, tuple, tuple, tuple], [type(e) for e in tlv._value])
+
+    def test_context(self):
+        data = bytes.fromhex('e404ff010142')
+        context = {'vendor_quirks': {VendorQuirks.FEIG_CVEND}}
+
+        # FF01 is primitive with the FEIG quirk
+        self.assertEqual(b'\x42', select(data, 'FF01', context=context))
+        self.assertIsNone(select(data, 'FF01/01', context=context))
+
+
+if __name__ == '__main__':
+    main()
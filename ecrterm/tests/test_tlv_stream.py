@@ -0,0 +1,119 @@
+import io
+from unittest import TestCase, main
+
+from ecrterm.packets.tlv import TLV
+from ecrterm.packets.tlv_stream import TLVEvent, TLVEventType, TLVReader, TLVWriter
+from ecrterm.packets.types import VendorQuirks
+
+START, PRIMITIVE, END = TLVEventType.START, TLVEventType.PRIMITIVE, TLVEventType.END
+
+
+class TestTLVReader(TestCase):
+    def setUp(self):
+        self.tlv = TLV(tag_=0x2d, value_=[(0x1d, b'\x01'), (0x1e, bytes(4)), (0x3f20, [(0x1c, b'\xaa' * 300)])])
+        self.data = self.tlv.serialize()
+        self.events = [
+            TLVEvent(START, 0x2d, len(self.data) - 4, 0),
+            TLVEvent(PRIMITIVE, 0x1d, 1, 1, b'\x01'),
+            TLVEvent(PRIMITIVE, 0x1e, 4, 1, bytes(4)),
+            TLVEvent(START, 0x3f20, 304, 1),
+            TLVEvent(PRIMITIVE, 0x1c, 300, 2, b'\xaa' * 300),
+            TLVEvent(END, 0x3f20, 0, 1),
+            TLVEvent(END, 0x2d, 0, 0),
+        ]
+
+    def test_memory(self):
+        events = list(TLVReader(self.data + b'\x01\x00'))
+
+        self.assertEqual(self.events + [TLVEvent(PRIMITIVE, 0x01, 0, 0, b'')], events)
+        self.assertIsInstance(events[1].value, memoryview)
+
+    def test_stream(self):
+        self.assertEqual(self.events, list(TLVReader(io.BytesIO(self.data), read_size=7)))
+
+    def test_empty_tag(self):
+        events = list(TLVReader(io.BytesIO(self.data[1:] + b'\xff'), empty_tag=True))
+
+        self.assertEqual(TLVEvent(START, None, len(self.data) - 4, 0), events[0])
+        self.assertEqual(TLVEvent(END, None, 0, 0), events[-1])
+
+    def test_large_value(self):
+        reader = TLVReader(io.BytesIO(self.data), inline_limit=100, read_size=16)
+        values = []
+        for event in reader:
+            if event.type is PRIMITIVE and event.value is None:
+                values.append(reader.read_value(250))
+                values.append(reader.read_value())
+                values.append(reader.read_value())
+
+        self.assertEqual([b'\xaa' * 250, b'\xaa' * 50, b''], values)
+
+        # Unread values are skipped
+        events = list(TLVReader(io.BytesIO(self.data), inline_limit=100, read_size=16))
+        self.assertEqual(TLVEvent(PRIMITIVE, 0x1c, 300, 2), events[4])
+        self.assertEqual(self.events[5:], events[5:])
+
+    def test_context(self):
+        data = bytes.fromhex('e404ff010142')
+        events = list(TLVReader(data, context={'vendor_quirks': {VendorQuirks.FEIG_CVEND}}))
+
+        self.assertEqual(TLVEvent(PRIMITIVE, 0xff01, 1, 1, b'\x42'), events[1])
+
+    def test_errors(self):
+        for data in (self.data[:-1], self.data[:1], bytes.fromhex('e0030102aabb')):
+            self.assertRaises(ValueError, list, TLVReader(data))
+            self.assertRaises(ValueError, list, TLVReader(io.BytesIO(data)))
+
+
+class TestTLVWriter(TestCase):
+    def test_write(self):
+        expected = TLV(tag_=0x2d, value_=[
+            (0x1d, b'\x01'), (0x3f20, [(0x1c, b'\xaa' * 300)]), (0x1e, b'')
+        ]).serialize()
+        for known_length in (False, True):
+            out = io.BytesIO()
+            with TLVWriter(out) as writer:
+                inner = TLVWriter.encoded_size(0x1c, 300)
+                writer.start(0x2d, (3 + TLVWriter.encoded_size(0x3f20, inner) + 2) if known_length else None)
+                writer.primitive(0x1d, b'\x01')
+                writer.start(0x3f20, inner if known_length else None)
+                writer.primitive_from(0x1c, io.BytesIO(b'\xaa' * 400), 300, read_size=64)
+                writer.end()
+                writer.write(TLV(tag_=0x1e, value_=b''))
+                writer.end()
+
+            self.assertEqual(expected, out.getvalue())
+
+    def test_round_trip(self):
+        data = TLV(tag_=0xe4, value_=[
+            (0x1f40, b'Dev'), (0x1f42, b'\x12\x34'), (0x23, [(0x08, b'\x00\x01')])
+        ]).serialize()
+        out = io.BytesIO()
+        writer = TLVWriter(out)
+        for event in TLVReader(data):
+            if event.type is START:
+                writer.start(event.tag, event.length)
+            elif event.type is PRIMITIVE:
+                writer.primitive(event.tag, event.value)
+            else:
+                writer.end()
+        writer.close()
+
+        self.assertEqual(data, out.getvalue())
+
+    def test_errors(self):
+        writer = TLVWriter(io.BytesIO())
+        writer.start(0x20, 3)
+        writer.primitive(0x01, b'\x01\x02')
+        self.assertRaises(ValueError, writer.end)
+
+        writer = TLVWriter(io.BytesIO())
+        self.assertRaises(ValueError, writer.primitive_from, 0x1c, io.BytesIO(b'\x00'), 2)
+
+        writer = TLVWriter(io.BytesIO())
+        writer.start(None)
+        self.assertRaises(ValueError, writer.close)
+
+
+if __name__ == '__main__':
+    main()
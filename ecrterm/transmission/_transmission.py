@@ -61,8 +61,9 @@ class Transmission(object):
         try:
             history += [(False, packet)]
             logger.debug("> %r", packet)
+            hints = packet.parse_hints()
             success, response = self.transport.send(packet.serialize())
-            response = Packet.parse(response)
+            response = Packet.parse(response, hints)
             logger.debug("< %r", response)
             history += [(True, response)]
 
@@ -73,7 +74,7 @@ class Transmission(object):
                     break
                 try:
                     success, response = self.transport.receive(self.actual_timeout)
-                    response = Packet.parse(response)
+                    response = Packet.parse(response, hints)
                     logger.debug("< %r", response)
                     history += [(True, response)]
                 except TransportLayerException:
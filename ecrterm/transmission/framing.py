@@ -0,0 +1,288 @@
+"""
+Sans-IO decoders for the ZVT framing.
+
+The decoders don't do any I/O themselves. Feed them the received bytes in
+chunks of any size, as they arrive, and they return the events that the data
+completed: whole frames, and on the serial line ACK/NAK bytes. Anything that
+does not fit the framing is reported as a FramingError event, after which the
+decoder resynchronizes on the next frame.
+
+The serial framing is DLE STX <APDU with DLE doubled> DLE ETX CRC-L CRC-H, the
+TCP/IP framing is the plain APDU, whose length field delimits it.
+
+The serial_* functions write the serial framing of complete data:
+serial_frame() and serial_frame_into() write the frame of an APDU, and
+serial_crc() computes its CRC. Frames are only taken apart by
+SerialFrameDecoder, also when all of the data is at hand.
+"""
+from typing import List, Optional, Union
+
+from ecrterm.crc import CRC16
+from ecrterm.transmission.signals import ACK, DLE, ETX, NAK, STX
+
+_DLE = bytes([DLE])
+_DLE_DLE = bytes([DLE, DLE])
+_ETX = bytes([ETX])
+_DLE_ETX = bytes([DLE, ETX])
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def _as_bytes(data: BytesLike) -> Union[bytes, bytearray]:
+    return data.tobytes() if isinstance(data, memoryview) else data
+
+
+def stuff_dle(data: BytesLike) -> bytes:
+    """Return data with every DLE doubled."""
+    return bytes(_as_bytes(data).replace(_DLE, _DLE_DLE))
+
+
+def serial_crc(apdu: BytesLike) -> bytes:
+    """Return the CRC-L CRC-H bytes of the serial frame for apdu."""
+    return CRC16(apdu).update(_ETX).digest()
+
+
+def serial_frame_size(apdu: BytesLike) -> int:
+    """Return the size of the serial frame for apdu."""
+    return len(apdu) + _as_bytes(apdu).count(DLE) + 6
+
+
+def serial_frame_into(buffer: Union[bytearray, memoryview], offset: int, apdu: BytesLike) -> int:
+    """
+    Write the serial frame for apdu to buffer at offset and return the offset after it.
+    The buffer must have serial_frame_size(apdu) bytes of room at offset.
+    """
+    apdu = _as_bytes(apdu)
+    crc = serial_crc(apdu)
+    buffer[offset] = DLE
+    buffer[offset + 1] = STX
+    offset += 2
+
+    # Copy the segments between DLEs, each DLE is written twice
+    pos = 0
+    while True:
+        dle = apdu.find(DLE, pos)
+        end = len(apdu) if dle < 0 else dle + 1
+        buffer[offset:offset + end - pos] = apdu[pos:end]
+        offset += end - pos
+        if dle < 0:
+            break
+        buffer[offset] = DLE
+        offset += 1
+        pos = end
+
+    buffer[offset:offset + 2] = _DLE_ETX
+    buffer[offset + 2:offset + 4] = crc
+    return offset + 4
+
+
+def serial_frame(apdu: BytesLike) -> bytearray:
+    """Return the serial frame for apdu, see serial_frame_into()."""
+    frame = bytearray(serial_frame_size(apdu))
+    serial_frame_into(frame, 0, apdu)
+    return frame
+
+
+class Event:
+    """Base class of the events returned by the decoders."""
+    __slots__ = ()
+    #: The attributes that are compared and shown
+    _fields = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, s) == getattr(other, s) for s in self._fields)
+
+    def __hash__(self):
+        return hash((type(self),) + tuple(getattr(self, s) for s in self._fields))
+
+    def __repr__(self):
+        return "{}({})".format(
+            self.__class__.__name__, ", ".join("{}={!r}".format(s, getattr(self, s)) for s in self._fields))
+
+
+class Frame(Event):
+    """
+    A complete APDU. For serial frames crc_ok tells whether the checksum
+    matched, and crc holds the CRC-L CRC-H bytes that were received.
+    """
+    __slots__ = ('apdu', 'crc_ok', 'crc')
+    _fields = ('apdu', 'crc_ok')
+
+    def __init__(self, apdu: bytes, crc_ok: bool = True, crc: Optional[bytes] = None):
+        self.apdu = apdu
+        self.crc_ok = crc_ok
+        self.crc = crc
+
+
+class Ack(Event):
+    """The other side acknowledged the last serial frame."""
+    __slots__ = ()
+
+
+class Nak(Event):
+    """The other side rejected the last serial frame."""
+    __slots__ = ()
+
+
+class FramingError(Event):
+    """Data that does not fit the framing and was dropped."""
+    __slots__ = _fields = ('message', 'data')
+
+    def __init__(self, message: str, data: bytes = b''):
+        self.message = message
+        self.data = data
+
+
+class SerialFrameDecoder:
+    """Incremental decoder for DLE/STX framed messages and ACK/NAK bytes."""
+    _IDLE, _HEADER, _BODY, _BODY_DLE, _CRC = range(5)
+
+    def __init__(self):
+        self._state = self._IDLE
+        self._apdu = bytearray()
+        self._checksum = CRC16()  # Of the APDU received so far
+        self._crc = bytearray()
+        self._garbage = bytearray()
+
+    def reset(self):
+        """Drop a partially received frame."""
+        self._state = self._IDLE
+        self._apdu = bytearray()
+        self._crc.clear()
+        self._garbage.clear()
+
+    @property
+    def in_frame(self) -> bool:
+        """True while a frame has been started but not completed."""
+        return self._state != self._IDLE
+
+    @property
+    def awaiting_crc(self) -> bool:
+        """True once DLE ETX of a frame was received, but not all of the CRC."""
+        return self._state == self._CRC
+
+    def _flush_garbage(self, events: List[Event]):
+        if self._garbage:
+            events.append(FramingError('Unexpected data outside of frame', bytes(self._garbage)))
+            self._garbage.clear()
+
+    def _start_frame(self):
+        self._state = self._BODY
+        self._apdu = bytearray()
+        self._checksum = CRC16()
+        self._crc.clear()
+
+    def feed(self, data: bytes) -> List[Event]:
+        """Process a chunk of received data and return the events it completed."""
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+        events = []
+        pos, end = 0, len(data)
+
+        while pos < end:
+            state = self._state
+
+            if state == self._BODY:
+                # Copy everything up to the next DLE in one go
+                dle = data.find(DLE, pos)
+                chunk = data[pos:] if dle < 0 else data[pos:dle]
+                self._apdu += chunk
+                self._checksum.update(chunk)
+                if dle < 0:
+                    break
+                self._state = self._BODY_DLE
+                pos = dle + 1
+                continue
+
+            b = data[pos]
+            pos += 1
+
+            if state == self._IDLE:
+                if b == DLE:
+                    self._flush_garbage(events)
+                    self._state = self._HEADER
+                elif b == ACK or b == NAK:
+                    self._flush_garbage(events)
+                    events.append(Ack() if b == ACK else Nak())
+                else:
+                    self._garbage.append(b)
+            elif state == self._HEADER:
+                if b == STX:
+                    self._start_frame()
+                else:
+                    events.append(FramingError('Header Error: {:02x}{:02x}'.format(DLE, b)))
+                    self._state = self._IDLE
+                    pos -= 1  # The byte may start something valid
+            elif state == self._BODY_DLE:
+                if b == DLE:
+                    self._apdu.append(DLE)
+                    self._checksum.update(_DLE)
+                    self._state = self._BODY
+                elif b == ETX:
+                    self._checksum.update(_ETX)
+                    self._state = self._CRC
+                else:
+                    events.append(FramingError('DLE without sense detected.', bytes(self._apdu)))
+                    if b == STX:
+                        self._start_frame()
+                    else:
+                        self._state = self._IDLE
+            else:  # _CRC
+                self._crc.append(b)
+                if len(self._crc) == 2:
+                    crc = bytes(self._crc)
+                    events.append(Frame(bytes(self._apdu), crc_ok=crc == self._checksum.digest(), crc=crc))
+                    self._state = self._IDLE
+                    self._apdu = bytearray()
+
+        self._flush_garbage(events)
+        return events
+
+
+class TCPFrameDecoder:
+    """Incremental decoder for APDUs delimited by their own length field."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def reset(self):
+        """Drop a partially received frame."""
+        self._buffer.clear()
+
+    @property
+    def in_frame(self) -> bool:
+        """True while a frame has been started but not completed."""
+        return bool(self._buffer)
+
+    @property
+    def bytes_needed(self) -> int:
+        """The number of bytes that are at least missing to complete the next frame."""
+        buffer = self._buffer
+        if len(buffer) < 3:
+            return 3 - len(buffer)
+        if buffer[2] != 0xff:
+            return 3 + buffer[2] - len(buffer)
+        if len(buffer) < 5:
+            return 5 - len(buffer)
+        return 5 + (buffer[3] | (buffer[4] << 8)) - len(buffer)
+
+    def feed(self, data: bytes) -> List[Event]:
+        """Process a chunk of received data and return the frames it completed."""
+        buffer = self._buffer
+        buffer += data
+        events = []
+        pos, end = 0, len(buffer)
+
+        while end - pos >= 3:
+            length, header = buffer[pos + 2], 3
+            if length == 0xff:
+                if end - pos < 5:
+                    break
+                length, header = buffer[pos + 3] | (buffer[pos + 4] << 8), 5
+            if end - pos < header + length:
+                break
+            events.append(Frame(bytes(buffer[pos:pos + header + length])))
+            pos += header + length
+
+        del buffer[:pos]
+        return events
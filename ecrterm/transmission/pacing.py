@@ -0,0 +1,147 @@
+"""
+Pacing of the commands the ECR sends to the PT.
+
+Some PTs need a moment after a transaction before they accept the next
+command, and refuse frames that come too early with a NAK, or not at all.
+The ECR asks its pacing before every command, after resetting the terminal
+and between status polls.
+
+Pacing doesn't wait at all, which suits TCP/IP. FixedPacing sleeps fixed
+delays, the conservative behaviour of former versions. AdaptivePacing learns
+the gap the PT needs after a command: it starts at the delays of FixedPacing,
+grows when commands fail and shrinks while they succeed, and only the part of
+it that hasn't passed yet is waited.
+
+All of them count commands, failures and the time waited, and log their
+waits and changes of the gap on the 'ecrterm.transmission.pacing' logger.
+"""
+import logging
+from time import monotonic, sleep
+
+logger = logging.getLogger('ecrterm.transmission.pacing')
+
+
+class Pacing:
+    """No waits, see the module docstring."""
+
+    def __init__(self):
+        self.commands = 0
+        self.failures = 0
+        self.waited = 0.0  # Seconds in total
+        self.last_wait = 0.0
+
+    def _sleep(self, seconds: float, reason: str):
+        self.last_wait = seconds = max(0.0, seconds)
+        if seconds > 0:
+            logger.debug('Waiting %.3fs %s', seconds, reason)
+            self.waited += seconds
+            sleep(seconds)
+
+    def before_command(self):
+        """Wait until the PT can take the next command."""
+        self.last_wait = 0.0
+
+    def after_command(self, ok: bool):
+        """Record whether the PT accepted and answered the command."""
+        self.commands += 1
+        if not ok:
+            self.failures += 1
+
+    def after_reset(self):
+        """The transport or the PT was reset."""
+
+    def between_polls(self):
+        """Space out repeated status enquiries."""
+
+    def stats(self) -> dict:
+        return {'commands': self.commands, 'failures': self.failures, 'waited': self.waited,
+                'last_wait': self.last_wait}
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, ', '.join(
+            '{}={!r}'.format(k, round(v, 3) if isinstance(v, float) else v) for k, v in self.stats().items()))
+
+
+class FixedPacing(Pacing):
+    """Sleep delay before every command, reset_delay after resets and poll_interval between polls."""
+
+    def __init__(self, delay: float = 0.2, reset_delay: float = 1.0, poll_interval: float = 2.0):
+        super().__init__()
+        self.delay = delay
+        self.reset_delay = reset_delay
+        self.poll_interval = poll_interval
+
+    def before_command(self):
+        self._sleep(self.delay, 'before command')
+
+    def after_reset(self):
+        self._sleep(self.reset_delay, 'after reset')
+
+    def between_polls(self):
+        self._sleep(self.poll_interval, 'between polls')
+
+
+class AdaptivePacing(Pacing):
+    """
+    Keep gap seconds between the end of a command and the start of the next.
+
+    A failed command (NAK, missing ACK or timeout) that got less than maximum
+    seconds after the previous one shows that the PT needed more than that:
+    the gap becomes the time it got times backoff, at least step and at most
+    maximum. Every accepted command shrinks the gap by decay, down to
+    minimum. The defaults start out with the delays of FixedPacing, so that
+    PTs which need them don't fail commands first. After a reset and between polls the next command is held back
+    by reset_delay and poll_interval.
+    """
+
+    def __init__(self, initial: float = 0.2, minimum: float = 0.0, maximum: float = 1.0, backoff: float = 2.0,
+                 step: float = 0.05, decay: float = 0.9, reset_delay: float = 1.0, poll_interval: float = 0.5):
+        super().__init__()
+        self.gap = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.step = step
+        self.decay = decay
+        self.reset_delay = reset_delay
+        self.poll_interval = poll_interval
+        self._last_end = None  # End of the last command
+        self._not_before = 0.0
+        self._given = None  # The gap the current command got
+
+    def before_command(self):
+        now = monotonic()
+        start = self._not_before
+        if self._last_end is not None:
+            start = max(start, self._last_end + self.gap)
+        self._sleep(start - now, 'before command')
+        if self._last_end is not None:
+            self._given = max(start, now) - self._last_end
+
+    def after_command(self, ok: bool):
+        super().after_command(ok)
+        gap = self.gap
+        if not ok:
+            if self._given is not None and self._given < self.maximum:
+                gap = min(self.maximum, max(self.step, self._given * self.backoff))
+        else:
+            gap = max(self.minimum, gap * self.decay)
+        if gap != self.gap:
+            logger.log(logging.DEBUG if ok else logging.INFO, 'Gap between commands %.3fs -> %.3fs', self.gap, gap)
+            self.gap = gap
+        self._last_end = monotonic()
+        self._given = None
+
+    def _hold(self, seconds: float):
+        self._not_before = max(self._not_before, monotonic() + seconds)
+
+    def after_reset(self):
+        self._hold(self.reset_delay)
+
+    def between_polls(self):
+        self._hold(self.poll_interval)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats['gap'] = self.gap
+        return stats
@@ -8,18 +8,25 @@ The Serial Layer is a transport used for
 
 import serial
 import logging
-from typing import Tuple
+from collections import deque
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
 from ecrterm.common import Transport
 from ecrterm.conv import toHexString
-from ecrterm.crc import crc_xmodem16
+from ecrterm.crc import CRC16
 from ecrterm.exceptions import (
     TransportLayerException, TransportTimeoutException)
+from ecrterm.transmission.framing import (
+    Ack, Event, Frame, FramingError, Nak, SerialFrameDecoder, serial_frame_into, serial_frame_size)
 from ecrterm.transmission.signals import (
-    ACK, DLE, ETX, NAK, STX, TIMEOUT_T1, TIMEOUT_T2)
+    ACK, ETX, NAK, TIMEOUT_T1, TIMEOUT_T2)
 from time import time
 
 SERIAL_DEBUG = False
 
+#: The baud rate of the ZVT serial line unless another one is negotiated
+DEFAULT_BAUDRATE = 9600
+
 logger = logging.getLogger('ecrterm.transport.serial')
 
 
@@ -28,19 +35,32 @@ class SerialMessage(object):
     Converts a Packet into a serial message by serializing the packet
     and inserting it into the final Serial Packet
     CRC and double-DLEs included.
+
+    The CRC is computed once, and again after apdu changes. Received frames
+    don't need it, SerialFrameDecoder checks theirs while receiving.
     """
-    apdu: bytes = None
 
     def __init__(self, data=None):
-        self.apdu = data
+        self._apdu = data
+        self._crc = None
+
+    @property
+    def apdu(self) -> bytes:
+        return self._apdu
+
+    @apdu.setter
+    def apdu(self, value: bytes):
+        self._apdu = value
+        self._crc = None
 
     def _get_crc(self):
-        data = self.apdu + bytes([ETX])
-        try:
-            return crc_xmodem16(data)
-        except Exception:
-            print(self.apdu)
-            raise
+        if self._crc is None:
+            try:
+                self._crc = CRC16(self._apdu).update(bytes([ETX])).value
+            except Exception:
+                print(self._apdu)
+                raise
+        return self._crc
 
     def _get_crc_l(self):
         return self._get_crc() & 0x00FF
@@ -61,16 +81,31 @@ class SerialMessage(object):
 
 
 class SerialTransport(Transport):
+    """
+    Transport for RS-232. The device can carry the baud rate to open the port
+    with, e.g. `/dev/ttyUSB0?baudrate=115200`, the default is 9600. See
+    ECR.change_baudrate() to negotiate another rate with the PT.
+
+    The port is read in chunks of whatever it has available, which are fed
+    to a SerialFrameDecoder. Its events that a read doesn't use yet, e.g. a
+    frame that arrived together with an ACK, are kept for the next read.
+    While a frame is being received, TIMEOUT_T1 limits the gap between bytes.
+    """
     SerialCls = serial.Serial
     insert_delays = True
 
-    def __init__(self, device):
-        self.device = device
+    def __init__(self, device, baudrate: Optional[int] = None):
+        self.device, _, query = device.partition('?')
+        if baudrate is None:
+            baudrate = parse_qs(query).get('baudrate', [DEFAULT_BAUDRATE])[-1]
+        self.baudrate = int(baudrate)
         self.connection = None
+        self._decoder = SerialFrameDecoder()
+        self._events = deque()
 
     def connect(self, timeout=30):
         ser = self.SerialCls(
-            port=self.device, baudrate=9600, parity=serial.PARITY_NONE,
+            port=self.device, baudrate=self.baudrate, parity=serial.PARITY_NONE,
             stopbits=serial.STOPBITS_TWO, bytesize=serial.EIGHTBITS,
             timeout=timeout,  # set a timeout value, None for waiting forever
             xonxoff=0,  # disable software flow control
@@ -89,15 +124,29 @@ class SerialTransport(Transport):
             return True
         return False
 
+    def _drop_received(self):
+        self._decoder.reset()
+        self._events.clear()
+
     def close(self):
+        self._drop_received()
         if self.connection:
             self.connection.close()
 
     def reset(self):
+        self._drop_received()
         if self.connection:
             self.connection.flushInput()
             self.connection.flushOutput()
 
+    def set_baudrate(self, baudrate: int):
+        """Switch the port to baudrate, once everything written so far has been sent."""
+        self.baudrate = baudrate
+        self._drop_received()
+        if self.connection:
+            self.connection.flush()
+            self.connection.baudrate = baudrate
+
     def write(self, data: bytes):
         if len(data) < 3:
             logger.debug('>> %s', data.hex())
@@ -110,75 +159,74 @@ class SerialTransport(Transport):
     def write_nak(self):
         self.write(bytes([NAK]))
 
+    def _receive_chunk(self, timeout) -> bytes:
+        """Wait up to timeout for data, and return everything that is available."""
+        connection = self.connection
+        # Setting the timeout reconfigures the port, so only do it if it changes
+        if connection.timeout != timeout:
+            connection.timeout = timeout
+        data = connection.read(max(1, connection.in_waiting))
+        if data:
+            waiting = connection.in_waiting
+            if waiting:
+                data += connection.read(waiting)
+        return data
+
+    def _next_event(self, timeout) -> Optional[Event]:
+        """
+        Return the next event of the decoder, or None on timeout. The wait for
+        the first byte is limited by timeout, within a frame by TIMEOUT_T1.
+        """
+        events = self._events
+        while not events:
+            chunk = self._receive_chunk(TIMEOUT_T1 if self._decoder.in_frame else timeout)
+            if not chunk:
+                return None
+            events.extend(self._decoder.feed(chunk))
+        return events.popleft()
+
     def read(self, timeout=TIMEOUT_T2) -> Tuple[bytes, bytes]:
         """Reads a message packet. any errors are raised directly."""
+        frame = self._read_frame(timeout)
+        return frame.crc, frame.apdu
+
+    def _read_frame(self, timeout=TIMEOUT_T2) -> Frame:
+        """Like read(), but return the Frame event, which tells whether the CRC matched."""
         # if in 5 seconds no message appears, we respond with a nak and
         # raise an error.
-        self.connection.timeout = timeout
-
-        header = self.connection.read(2)
-
-        if len(header) < 2:
-            raise TransportLayerException('Reading Header Timeout')
-        if header != bytes([DLE, STX]):
-            raise TransportLayerException('Header Error: %s' % header.hex())
-
-        data = bytearray()
-
-        crc = None
-
-        # read until DLE, ETX is reached.
-        dle = False
-
-        # timeout to T1 after header.
-        self.connection.timeout = TIMEOUT_T1
-
-        while not crc:
-            inb = self.connection.read(1)  # read a byte.
-            if inb is None or len(inb) == 0:
-                # timeout
-                raise TransportLayerException('Timeout T1 reading stream.')
-            b = inb[0]
-            if b == ETX and dle:
-                # dle was set, and this is ETX, so we are at the end.
-                # we read the CRC now.
-                crc = self.connection.read(2)
-                if not crc or len(crc) < 2:
-                    raise TransportLayerException('Timeout T1 reading CRC')
-                # and break
-                break
-            elif b == DLE:
-                if not dle:
-                    # this is a dle
-                    dle = True
-                    continue
-                else:
-                    # this is the second dle. we take it.
-                    dle = False
-            elif dle:
-                # dle was set, but we got no etx here.
-                # this seems to be an error.
-                raise TransportLayerException('DLE without sense detected.')
-            # we add this byte to our apdu.
-            data.append(b)
-        logger.debug("<< %s", data.hex())
-        return crc, data
+        event = self._next_event(timeout)
+        if event is None:
+            decoder = self._decoder
+            if decoder.awaiting_crc:
+                message = 'Timeout T1 reading CRC'
+            elif decoder.in_frame:
+                message = 'Timeout T1 reading stream.'
+            else:
+                message = 'Reading Header Timeout'
+            decoder.reset()
+            raise TransportLayerException(message)
+        if isinstance(event, FramingError):
+            raise TransportLayerException(event.message)
+        if not isinstance(event, Frame):
+            signal = 'ACK' if isinstance(event, Ack) else 'NAK'
+            raise TransportLayerException('Unexpected {} instead of a frame'.format(signal))
+        logger.debug("<< %s", event.apdu.hex())
+        return event
 
     def read_message(self, timeout=TIMEOUT_T2) -> Tuple[bool, bytes]:
         try:
-            crc, data = self.read(timeout)
-            msg = SerialMessage(data)
+            frame = self._read_frame(timeout)
         except Exception:
             # this is a NAK - re-raise for further investigation.
             self.write_nak()
             raise
-        # test the CRC:
-        if msg.crc() == crc:
+        # the decoder tested the CRC while receiving:
+        if frame.crc_ok:
             self.write_ack()
-            return True, data
+            return True, frame.apdu
         else:
             # self.write_nak()
-            return False, data
+            return False, frame.apdu
 
     def receive(self, timeout=TIMEOUT_T2, *args, **kwargs) -> Tuple[bool, bytes]:
         crc_ok = False
@@ -205,35 +253,34 @@ class SerialTransport(Transport):
         yourself.
         """
         if data:
-            message = SerialMessage(data)
-            self.write(bytes([DLE, STX]) + data.replace(bytes([DLE]), bytes([DLE, DLE]))
-                       + bytes([DLE, ETX, message.crc_l, message.crc_h]))
-            acknowledge = b''
+            frame = bytearray(serial_frame_size(data))
+            serial_frame_into(frame, 0, data)
+            self.write(frame)
+            acknowledge = None
             ts_start = time()
-            while len(acknowledge) < 1:
-                acknowledge = self.connection.read(1)
+            while acknowledge is None:
+                acknowledge = self._next_event(TIMEOUT_T1)
                 # With ingenico devices, acknowledge is often empty.
                 # Just retrying seems to help.
                 if time() - ts_start > 1:
                     break
-            logger.debug('<< %s', acknowledge.hex())
+            logger.debug('<< %r', acknowledge)
             # if nak, we retry, if ack, we read, if other, we raise.
-            if acknowledge[0] == ACK:
+            if acknowledge is None:
+                raise TransportTimeoutException('No Answer, Possible Timeout')
+            elif isinstance(acknowledge, Ack):
                 # everything alright.
                 if no_wait:
                     return True
                 return self.receive()
-            elif acknowledge[0] == NAK:
+            elif isinstance(acknowledge, Nak):
                 # not everything allright.
                 # if tries < 3:
                 #    return self.send_message(message, tries + 1, no_answer)
                 # else:
                 raise TransportLayerException('Could not send message')
-            elif not len(acknowledge) < 1:
-                raise TransportTimeoutException('No Answer, Possible Timeout')
             else:
-                raise TransportLayerException(
-                    'Unknown Acknowledgment Byte %s' % acknowledge.hex())
+                raise TransportLayerException('Unknown Acknowledgment %r' % acknowledge)
 
     def send(self, data: bytes, tries=0, no_wait=False):
         """Automatically converts an apdu into a message."""
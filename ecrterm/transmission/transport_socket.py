@@ -1,9 +1,9 @@
 import logging
 from binascii import hexlify
+from collections import deque
 from socket import (
     IPPROTO_TCP, SHUT_RDWR, SO_KEEPALIVE, SOL_SOCKET, create_connection)
 from socket import timeout as SocketTimeout
-from struct import unpack
 from sys import platform
 from typing import Tuple
 from urllib.parse import parse_qs, urlsplit
@@ -12,6 +12,7 @@ from ecrterm.common import Transport
 from ecrterm.exceptions import (
     TransportConnectionFailed, TransportLayerException,
     TransportTimeoutException)
+from ecrterm.transmission.framing import TCPFrameDecoder
 
 if platform == 'linux':
     from socket import TCP_KEEPIDLE, TCP_KEEPINTVL
@@ -43,6 +44,8 @@ class SocketTransport(Transport):
     flags details.
     """
     insert_delays = False
+    #: Bytes to read from the socket at once, a single read may contain several frames.
+    receive_size = 4096
     defaults = dict(
         connect_timeout=5, so_keepalive=0, tcp_keepidle=1, tcp_keepintvl=3,
         tcp_keepcnt=5, debug='false', packetdebug='false')
@@ -69,6 +72,8 @@ class SocketTransport(Transport):
             'debug', [self.defaults['debug']])[0] == 'true'
         self._packetdebug = qs_parsed.get(
             'packetdebug', [self.defaults['packetdebug']])[0] == 'true'
+        self._decoder = TCPFrameDecoder()
+        self._frames = deque()
 
     def connect(self, timeout: int = None) -> bool:
         """
@@ -77,6 +82,8 @@ class SocketTransport(Transport):
         """
         if timeout is None:
             timeout = self.connect_timeout
+        self._decoder.reset()
+        self._frames.clear()
         try:
             self.sock = create_connection(
                 address=(self.ip, self.port), timeout=timeout)
@@ -113,48 +120,27 @@ class SocketTransport(Transport):
             return True
         return self.receive()
 
-    def _receive_bytes(self, length: int) -> bytes:
-        """Receive and return a fixed amount of bytes."""
-        recv_bytes = 0
-        result = b''
+    def _receive_chunk(self) -> bytes:
+        """Receive whatever the socket has, at least one byte."""
         if self._packetdebug:
-            print('\nwaiting for', length, 'bytes')
-        while recv_bytes < length:
-            try:
-                chunk = self.sock.recv(length - recv_bytes)
-            except SocketTimeout:
-                raise TransportTimeoutException('Timed out.')
-            if self._packetdebug:
-                print('received', len(chunk), 'bytes:', hexformat(data=chunk))
-            if chunk == b'':
-                raise TransportLayerException('TCP Stream disconnected.')
-            result += chunk
-            recv_bytes += len(chunk)
-        return result
-
-    def _receive_length(self) -> Tuple[bytes, int]:
-        """
-        Receive the 4 bytes on the socket which indicates the message
-        length, and return the packed and the `int` converted length.
-        """
-        data = self._receive_bytes(length=3)
-        length = data[2]
-        if length != 0xff:
-            return data, length
-        # Need to get 2 more bytes
-        length = self._receive_bytes(length=2)
-        data += length
-        return data, unpack('<H', length)[0]
+            print('\nwaiting for', self._decoder.bytes_needed, 'bytes')
+        try:
+            chunk = self.sock.recv(max(self._decoder.bytes_needed, self.receive_size))
+        except SocketTimeout:
+            raise TransportTimeoutException('Timed out.')
+        if self._packetdebug:
+            print('received', len(chunk), 'bytes:', hexformat(data=chunk))
+        if chunk == b'':
+            raise TransportLayerException('TCP Stream disconnected.')
+        return chunk
 
     def _receive(self) -> bytes:
         """
         Receive the response from the terminal and return is as `bytes`.
         """
-        data, length = self._receive_length()
-        if not length:  # Length is 0
-            return data
-        new_data = self._receive_bytes(length=length)
-        return data + new_data
+        while not self._frames:
+            self._frames.extend(self._decoder.feed(self._receive_chunk()))
+        return self._frames.popleft().apdu
 
     def receive(
             self, timeout=None, *args, **kwargs) -> Tuple[bool, bytes]: